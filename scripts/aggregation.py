@@ -0,0 +1,384 @@
+import numpy as np
+import pandas as pd
+
+import warnings
+
+from data_cache import BILLING_COLUMNS, MISSING_ID, count_bad_lines, load_profile, read_args, save_profile
+from schema_profile import MONTH_NA, billing_months, month_labels, month_years
+
+# Shared aggregation stage: row-level extract -> compact monthly fact table.
+# Boolean billing flags are derived once per country frame and every month
+# (and optionally every account) is aggregated in a single grouped sum.
+#
+# `cantidad_llamadas` repeats on every row of an asistencia / expediente that
+# spans several rows, so besides the plain sum the calls are also counted
+# deduplicated: the max per id within each (month, cuenta), computed with a
+# hash factorization of the integer ids (no object groupby). Every strategy
+# is a pair of fact columns, so picking one is a column lookup.
+
+APP_TYPES = ['APP', 'ANCLAJE APP SOA', 'ANCLAJE', 'ANCLAJE_APP', 'ANCLAJE_APP_SOA']
+
+# `cuenta` label of rows without account in per-account facts (kept, so the
+# accounts always add up to the country total)
+MISSING_ACCOUNT = 'SIN CUENTA'
+
+# Call-counting strategy -> (row id column, calls column, concluded-services calls column)
+CALL_STRATEGIES = {
+    'sum': (None, 'Llamadas Brutas', 'Llamadas Brutas SC'),
+    'max_asistencia': ('id_asistencia', 'Llamadas Asistencia', 'Llamadas Asistencia SC'),
+    'max_expediente': ('id_expediente', 'Llamadas Expediente', 'Llamadas Expediente SC')
+}
+DEDUP_COLUMNS = [col for id_col, *cols in CALL_STRATEGIES.values() if id_col for col in cols]
+
+FACT_COLUMNS = ['SC Total', 'SC App', 'Llamadas Brutas', 'Llamadas Brutas SC',
+                'Cancelado Posterior', 'Cancelado Momento', 'Registros'] + DEDUP_COLUMNS
+
+
+# Account groupings: name -> (label, substring, group when it appears in the
+# upper-cased cuenta, group otherwise). Applied to the distinct cuenta values
+# only and broadcast back through their codes (no row-wise apply).
+ACCOUNT_GROUPINGS = {
+    'mcs': ('MCS vs OTROS', 'MCS', 'MCS', 'OTROS')
+}
+
+
+def call_columns(strategy='sum'):
+    """(calls, concluded-services calls) fact columns of a call-counting strategy."""
+    if strategy not in CALL_STRATEGIES:
+        raise ValueError(f"Unknown call-counting strategy '{strategy}' (expected {list(CALL_STRATEGIES)})")
+    return CALL_STRATEGIES[strategy][1:]
+
+
+def _flag(series, predicate):
+    """
+    Evaluates `predicate` on the string form of `series`. Categorical columns
+    (the cached layout) are evaluated once per category instead of per row.
+    Missing values are never flagged, whatever the column's dtype.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        per_category = predicate(pd.Series(series.cat.categories.astype(str))).to_numpy(dtype=bool)
+        # Missing values: code -1, the appended False
+        return np.append(per_category, False)[series.cat.codes.to_numpy()]
+    missing = series.isna().to_numpy()
+    # Blank out missing values before astype(str) (which may or may not keep NaN)
+    text = series.astype(object).where(~missing, '').astype(str)
+    return predicate(text).to_numpy(dtype=bool) & ~missing
+
+
+def account_labels(cuenta):
+    """`cuenta` as text with missing accounts labelled MISSING_ACCOUNT (on any pandas version)."""
+    if isinstance(cuenta.dtype, pd.CategoricalDtype):
+        if MISSING_ACCOUNT not in cuenta.cat.categories:
+            cuenta = cuenta.cat.add_categories([MISSING_ACCOUNT])
+        return cuenta.fillna(MISSING_ACCOUNT).astype(str)
+    return cuenta.astype(object).where(cuenta.notna(), MISSING_ACCOUNT).astype(str)
+
+
+def row_ids(df, col):
+    """int64 ids of `col` (MISSING_ID where missing / non-numeric), None if absent."""
+    if col not in df.columns:
+        return None
+    ids = df[col]
+    if ids.dtype != np.int64:
+        ids = pd.to_numeric(ids, errors='coerce').fillna(MISSING_ID)
+    return ids.to_numpy(dtype=np.int64)
+
+
+def dedup_scope(df):
+    """Integer code of every row's (month, cuenta) pair: ids are deduplicated within it."""
+    month = df['month'].to_numpy(dtype=np.int64) - MONTH_NA
+    if 'cuenta' not in df.columns:
+        return month
+    cuenta = df['cuenta']
+    if isinstance(cuenta.dtype, pd.CategoricalDtype):
+        codes, n = cuenta.cat.codes.to_numpy(dtype=np.int64) + 1, len(cuenta.cat.categories) + 1
+    else:
+        # Missing accounts get a code of their own (no -1 sentinel colliding with the previous month)
+        codes, uniques = pd.factorize(account_labels(cuenta))
+        codes, n = codes.astype(np.int64), len(uniques)
+    return month * n + codes
+
+
+def dedup_calls(calls, ids, scope, mask=None):
+    """
+    Per-row calls where every (scope, id) group contributes its max once, on
+    its first row. Rows without id keep their own calls; rows outside `mask`
+    count 0. Summing the result by any grouping coarser than `scope` gives
+    the deduplicated call count.
+    """
+    keep = np.ones(len(calls), dtype=bool) if mask is None else mask
+    out = np.where(keep & (ids == MISSING_ID), calls, 0.0)
+    sel = np.flatnonzero(keep & (ids != MISSING_ID))
+    if sel.size == 0:
+        return out
+    # Dense id codes (hash), then one hash factorization of the (id, scope) pair
+    id_codes = pd.factorize(ids[sel])[0].astype(np.int64)
+    scope_sel = scope[sel]
+    codes, uniques = pd.factorize(id_codes * (int(scope_sel.max()) + 1) + scope_sel)
+    maxes = np.full(len(uniques), -np.inf)
+    np.maximum.at(maxes, codes, calls[sel])
+    # factorize numbers groups by first appearance: a row starts its group when
+    # its code exceeds every code before it
+    first = codes > np.maximum.accumulate(np.concatenate(([-1], codes[:-1])))
+    out[sel[first]] = maxes
+    return out
+
+
+def billing_flags(df, dedup=True):
+    """
+    Per-row numeric flags used by every billing aggregation. With `dedup`,
+    also the per-row deduplicated calls of every id-based call strategy.
+    """
+    n = len(df)
+    if 'estado_asistencia' in df.columns:
+        is_sc = _flag(df['estado_asistencia'], lambda s: s == 'CONCLUIDA')
+        is_cancel = _flag(df['estado_asistencia'], lambda s: s.str.upper().str.contains('CANCEL'))
+    else:
+        # No status column: every row counts as a concluded service
+        is_sc = np.ones(n, dtype=bool)
+        is_cancel = np.zeros(n, dtype=bool)
+
+    if 'tipo_asignacion' in df.columns:
+        is_app = _flag(df['tipo_asignacion'], lambda s: s.str.strip().isin(APP_TYPES))
+    else:
+        is_app = np.zeros(n, dtype=bool)
+
+    if 'usuario_que_asigna' in df.columns:
+        # Missing, blank and 'nan' / 'None' text users count as unassigned
+        is_assigned = _flag(df['usuario_que_asigna'], lambda s: ~s.str.strip().isin(['', 'nan', 'None']))
+    else:
+        is_assigned = np.zeros(n, dtype=bool)
+
+    if 'cantidad_llamadas' in df.columns:
+        calls = pd.to_numeric(df['cantidad_llamadas'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    else:
+        calls = np.zeros(n)
+
+    flags = pd.DataFrame({
+        'SC Total': is_sc.astype(np.int64),
+        'SC App': (is_sc & is_app).astype(np.int64),
+        'Llamadas Brutas': calls,
+        'Llamadas Brutas SC': np.where(is_sc, calls, 0.0),
+        'Cancelado Posterior': (is_cancel & is_assigned).astype(np.int64),
+        'Cancelado Momento': (is_cancel & ~is_assigned).astype(np.int64),
+        'Registros': np.ones(n, dtype=np.int64)
+    }, index=df.index)
+
+    if dedup:
+        scope = dedup_scope(df) if 'month' in df.columns else np.zeros(n, dtype=np.int64)
+        for id_col, col, col_sc in CALL_STRATEGIES.values():
+            if id_col is None:
+                continue
+            ids = row_ids(df, id_col)
+            if ids is None:
+                # No id column: every row is its own asistencia / expediente
+                flags[col], flags[col_sc] = flags['Llamadas Brutas'], flags['Llamadas Brutas SC']
+            else:
+                flags[col] = dedup_calls(calls, ids, scope)
+                flags[col_sc] = dedup_calls(calls, ids, scope, mask=is_sc)
+    return flags
+
+
+def monthly_facts(df, country=None, year=None, by_account=False, dedup=True):
+    """
+    Aggregates a typed country frame (see data_cache.load_extract) into one row
+    per month (or per month and `cuenta` when `by_account`) with the columns
+    in FACT_COLUMNS (without DEDUP_COLUMNS unless `dedup`). `Mes` is the
+    'YYYY-MM' string used across the reports. Rows without a billing month
+    are left out.
+    """
+    if year is not None:
+        df = df[month_years(df['month']) == year]
+    else:
+        df = df[df['month'].to_numpy() != MONTH_NA]
+
+    keys = ['month'] + (['cuenta'] if by_account else [])
+    flags = billing_flags(df, dedup)
+    columns = [c for c in FACT_COLUMNS if c in flags.columns]
+    for k in keys:
+        flags[k] = df[k]
+
+    facts = flags.groupby(keys, observed=True, sort=True, dropna=False)[columns].sum().reset_index()
+    facts.insert(0, 'Mes', pd.Series(month_labels(facts.pop('month')), index=facts.index).astype(str))
+    if by_account:
+        facts['cuenta'] = account_labels(facts['cuenta'])
+    if country is not None:
+        facts.insert(0, 'Pais', country)
+    return facts
+
+
+def account_groups(cuentas, grouping):
+    """Group label of every value of `cuentas` under an ACCOUNT_GROUPINGS rule."""
+    if grouping not in ACCOUNT_GROUPINGS:
+        raise ValueError(f"Unknown account grouping '{grouping}' (expected {list(ACCOUNT_GROUPINGS)})")
+    _, pattern, matched, other = ACCOUNT_GROUPINGS[grouping]
+    # Missing accounts (MISSING_ACCOUNT) fall in the `other` group
+    codes, uniques = pd.factorize(account_labels(pd.Series(cuentas)))
+    hit = pd.Series(uniques).str.upper().str.contains(pattern, regex=False).to_numpy(dtype=bool)
+    return pd.Series(np.where(hit, matched, other)[codes], index=getattr(cuentas, 'index', None))
+
+
+def group_accounts(facts, grouping):
+    """
+    Per-account facts (`monthly_facts(by_account=True)` layout) re-aggregated
+    per account group; the group label replaces `cuenta`.
+    """
+    keys = [c for c in ('Pais', 'Mes') if c in facts.columns] + ['cuenta']
+    columns = [c for c in FACT_COLUMNS if c in facts.columns]
+    grouped = facts.assign(cuenta=account_groups(facts['cuenta'], grouping).to_numpy())
+    return grouped.groupby(keys, sort=True)[columns].sum().reset_index()
+
+
+def _max_by_key(scope, ids, calls, calls_sc):
+    """Rows reduced to one per distinct (scope, id), sorted by it, keeping the max calls."""
+    order = np.lexsort((ids, scope))
+    scope, ids = scope[order], ids[order]
+    start = np.flatnonzero(np.concatenate(([True], (scope[1:] != scope[:-1]) | (ids[1:] != ids[:-1]))))
+    return (scope[start], ids[start],
+            np.maximum.reduceat(calls[order], start), np.maximum.reduceat(calls_sc[order], start))
+
+
+class _CallKeyFold:
+    """
+    Running max calls per (month, cuenta, id) of one id-based call strategy
+    across chunks, so ids spanning several chunks are still counted once.
+    Keys are integers only: the month and a stable `cuenta` code packed into
+    one int64 scope, plus the int64 id, held as plain sorted arrays. Each
+    chunk is reduced to its distinct keys and buffered; the buffer is merged
+    into the running table in one pass whenever it outgrows the table, so
+    every key is merged a bounded number of times. Rows without id never
+    enter the table: their calls are summed per scope directly.
+    """
+
+    def __init__(self, id_col):
+        self.id_col = id_col
+        self.accounts = {}
+        self.table = None
+        self.pending, self.pending_rows = [], 0
+        self.loose = []
+
+    def _scopes(self, chunk):
+        month = (chunk['month'].to_numpy(dtype=np.int64) - MONTH_NA) << 32
+        if 'cuenta' not in chunk.columns:
+            return month
+        cuenta = chunk['cuenta']
+        if not isinstance(cuenta.dtype, pd.CategoricalDtype):
+            cuenta = cuenta.astype('category')
+        # Chunk category codes -> stable codes (missing accounts: last slot)
+        lookup = np.array([self.accounts.setdefault(c, len(self.accounts))
+                           for c in list(cuenta.cat.categories.astype(str)) + [MISSING_ACCOUNT]], dtype=np.int64)
+        return month | lookup[cuenta.cat.codes.to_numpy()]
+
+    def add(self, chunk, calls, calls_sc):
+        ids = row_ids(chunk, self.id_col)
+        scope = self._scopes(chunk)
+        has_id = ids != MISSING_ID
+        loose = ~has_id
+        if loose.any():
+            self.loose.append(pd.DataFrame({'calls': calls[loose], 'calls_sc': calls_sc[loose]}, index=scope[loose])
+                              .groupby(level=0).sum())
+        if has_id.any():
+            # Call counts are small integers: float32 is exact and halves the table
+            part = _max_by_key(scope[has_id], ids[has_id], calls[has_id].astype(np.float32),
+                               calls_sc[has_id].astype(np.float32))
+            self.pending.append(part)
+            self.pending_rows += len(part[0])
+            if self.table is None or self.pending_rows >= len(self.table[0]):
+                self._merge()
+
+    def _merge(self):
+        parts = ([] if self.table is None else [self.table]) + self.pending
+        self.table = _max_by_key(*(np.concatenate(arrays) for arrays in zip(*parts)))
+        self.pending, self.pending_rows = [], 0
+
+    def totals(self, by_account):
+        """Deduplicated (calls, concluded-services calls) per month (and `cuenta`), or None."""
+        if self.pending:
+            self._merge()
+        parts = list(self.loose)
+        if self.table is not None:
+            scope, _, calls, calls_sc = self.table
+            parts.append(pd.DataFrame({'calls': calls.astype(float), 'calls_sc': calls_sc.astype(float)}, index=scope)
+                         .groupby(level=0).sum())
+        if not parts:
+            return None
+        sums = pd.concat(parts).groupby(level=0).sum()
+        scope = sums.index.to_numpy(dtype=np.int64)
+        out = pd.DataFrame({'month': (scope >> 32) + MONTH_NA,
+                            'calls': sums['calls'].to_numpy(), 'calls_sc': sums['calls_sc'].to_numpy()})
+        keys = ['month']
+        if by_account:
+            names = np.array(list(self.accounts) or [MISSING_ACCOUNT], dtype=object)
+            out['cuenta'] = names[scope & 0xFFFFFFFF]
+            keys.append('cuenta')
+        return out.groupby(keys, sort=True)[['calls', 'calls_sc']].sum().reset_index()
+
+
+def stream_monthly_facts(source_path, country=None, year=None, by_account=False, account=None,
+                         chunksize=200_000, call_strategy='sum'):
+    """
+    Streaming variant of `monthly_facts` for extracts that do not fit in memory.
+    Reads only BILLING_COLUMNS in chunks of `chunksize` rows and folds each
+    chunk into running per-month counters. Besides the summed FACT_COLUMNS
+    only the deduplicated columns of `call_strategy` are produced.
+
+    With the 'sum' strategy peak memory is bounded by the chunk size. An
+    id-based strategy also keeps one integer row (scope, id, two maxima) per
+    distinct id, so its memory grows with the number of distinct ids in the
+    extract (still far below the raw rows). The result matches `monthly_facts`
+    on the fully loaded frame.
+    """
+    id_col, dedup_col, dedup_col_sc = CALL_STRATEGIES[call_strategy]
+    profile = load_profile(source_path)
+    # Billing columns plus the profiled date column only, under their raw header names
+    args, canonical = read_args(profile, BILLING_COLUMNS)
+    present = set(canonical.values())
+    filter_account = account is not None and 'cuenta' in present
+    # Path picked up front: without ids (or calls) every row is its own asistencia / expediente
+    fold = _CallKeyFold(id_col) if id_col in present and 'cantidad_llamadas' in present else None
+
+    keys = ['Mes', 'cuenta'] if by_account else ['Mes']
+    summed = [c for c in FACT_COLUMNS if c not in DEDUP_COLUMNS]
+    running = None
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        for chunk in pd.read_csv(source_path, chunksize=chunksize, **args):
+            chunk = chunk.rename(columns=canonical)
+            if filter_account:
+                chunk = chunk[chunk['cuenta'].astype(str) == account]
+            chunk['month'] = billing_months(chunk, profile)
+            if year is not None:
+                chunk = chunk[month_years(chunk['month']) == year]
+            else:
+                chunk = chunk[chunk['month'].to_numpy() != MONTH_NA]
+            facts = monthly_facts(chunk, by_account=by_account, dedup=False)
+            if running is None:
+                running = facts
+            else:
+                running = pd.concat([running, facts]).groupby(keys, sort=True)[summed].sum().reset_index()
+            if fold is not None:
+                flags = billing_flags(chunk, dedup=False)
+                fold.add(chunk, flags['Llamadas Brutas'].to_numpy(), flags['Llamadas Brutas SC'].to_numpy())
+    if profile.get('bad_lines') is None:
+        # First full pass over this extract
+        profile['bad_lines'] = count_bad_lines(caught)
+        save_profile(source_path, profile)
+
+    columns = summed + ([dedup_col, dedup_col_sc] if id_col else [])
+    if running is None:
+        running = monthly_facts(pd.DataFrame({'month': pd.Series(dtype='int16'),
+                                              'cuenta': pd.Series(dtype=str)}), by_account=by_account)
+    elif id_col and fold is None:
+        running[dedup_col], running[dedup_col_sc] = running['Llamadas Brutas'], running['Llamadas Brutas SC']
+    elif id_col:
+        # Deduplicated calls: per-id maxima summed per month (and account)
+        sums = fold.totals(by_account)
+        if sums is not None:
+            sums.insert(0, 'Mes', pd.Series(month_labels(sums.pop('month')), index=sums.index).astype(str))
+            running = running.merge(sums.rename(columns={'calls': dedup_col, 'calls_sc': dedup_col_sc}),
+                                    on=keys, how='left')
+        running[[dedup_col, dedup_col_sc]] = running.reindex(columns=[dedup_col, dedup_col_sc]).fillna(0.0).astype(float)
+    running = running[keys + columns]
+    if country is not None:
+        running.insert(0, 'Pais', country)
+    return running
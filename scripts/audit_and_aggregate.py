@@ -3,8 +3,14 @@ import glob
 import os
 import re
 import json
+import sys
 import numpy as np
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import monthly_facts
+from data_cache import discover_extracts, load_extract
+
 def get_country_name(filename):
     base = os.path.basename(filename)
     name_part = base.replace('.csv', '')
@@ -17,69 +23,29 @@ def get_country_name(filename):
 
 def audit_file(file_path):
     try:
-        df = pd.read_csv(file_path, sep=';', on_bad_lines='skip', low_memory=False)
-        
-        date_col = 'creacion_asistencia'
-        if date_col not in df.columns:
-            if 'fecha_finalizacion_asistencia' in df.columns:
-                date_col = 'fecha_finalizacion_asistencia'
-            else:
-                return None
-
-        df['date_obj'] = pd.to_datetime(df[date_col], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-        if df['date_obj'].isnull().all():
-             df['date_obj'] = pd.to_datetime(df[date_col], dayfirst=True, errors='coerce')
-        
-        df = df[df['date_obj'].dt.year == 2025].copy()
-        if len(df) == 0: return None
+        # Cached typed frame; date column fallback and dayfirst retry happen at cache build
+        df = load_extract(file_path)
         
-        df['month'] = df['date_obj'].dt.to_period('M')
-        
-        app_types = ['APP', 'ANCLAJE APP SOA', 'ANCLAJE', 'ANCLAJE_APP', 'ANCLAJE_APP_SOA']
+        # All 2025 months aggregated in a single grouped pass
+        facts = monthly_facts(df, year=2025)
+        if facts.empty: return None
         
         monthly_results = {}
         
-        for month, group in df.groupby('month'):
-            # Metrics for the month
-            total_sc = 0
-            sc_app = 0
-            sc_voice = 0
-            total_lv = 0
-            cancelled_posterior = 0
-            cancelled_moment = 0
-            
-            if 'estado_asistencia' in group.columns:
-                sc_df = group[group['estado_asistencia'] == 'CONCLUIDA']
-                cancelled_df = group[group['estado_asistencia'].astype(str).str.upper().str.contains('CANCEL')]
-            else:
-                sc_df = group
-                cancelled_df = pd.DataFrame()
-
-            total_sc = len(sc_df)
-            sc_app = sc_df[sc_df['tipo_asignacion'].astype(str).str.strip().isin(app_types)].shape[0]
-            sc_voice = total_sc - sc_app
+        for row in facts.to_dict('records'):
+            total_sc = row['SC Total']
+            sc_app = row['SC App']
             
             # 2. Valid Calls (from Concluded Services only, then apply factor)
-            raw_calls_sc = 0
-            if 'cantidad_llamadas' in sc_df.columns:
-                raw_calls_sc = sc_df['cantidad_llamadas'].sum()
-            total_lv = int(raw_calls_sc * 0.90)
-            
-            if not cancelled_df.empty:
-                if 'usuario_que_asigna' in cancelled_df.columns:
-                    assigned = cancelled_df['usuario_que_asigna'].replace('', np.nan).notna()
-                    cancelled_posterior = assigned.sum()
-                    cancelled_moment = len(cancelled_df) - cancelled_posterior
-                else:
-                    cancelled_moment = len(cancelled_df)
+            total_lv = int(row['Llamadas Brutas SC'] * 0.90)
             
-            monthly_results[str(month)] = {
+            monthly_results[row['Mes']] = {
                 'sc_total': int(total_sc),
                 'sc_app': int(sc_app),
-                'sc_voice': int(sc_voice),
+                'sc_voice': int(total_sc - sc_app),
                 'lv_total': int(total_lv),
-                'cp': int(cancelled_posterior),
-                'cm': int(cancelled_moment),
+                'cp': int(row['Cancelado Posterior']),
+                'cm': int(row['Cancelado Momento']),
                 'adoption_pct': (sc_app / total_sc * 100) if total_sc > 0 else 0.0
             }
             
@@ -90,11 +56,9 @@ def audit_file(file_path):
         return None
 
 def main():
-    files = glob.glob('Paises/Client*.csv')
     results = {}
     
-    for file in files:
-        country = get_country_name(file)
+    for country, file in discover_extracts('Paises').items():
         data = audit_file(file)
         if data:
             results[country] = data
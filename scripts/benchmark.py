@@ -0,0 +1,311 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import platform
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import monthly_facts
+from compare_policies import GlobalPolicyReport
+from data_cache import CATEGORICAL_COLUMNS, NUMERIC_COLUMNS, canonical_name
+from schema_profile import PROFILE_SAMPLE_ROWS, billing_months, profile_frame
+
+# Hot-path benchmark suite.
+# Generates synthetic extracts with the real column schema (scaled from the
+# largest current extract, ~56k rows), times every stage of the billing
+# pipeline and the end-to-end entry points, and saves the results as JSON in
+# reports/benchmarks/ so runs can be compared across commits:
+#
+#   python scripts/benchmark.py --scales 1 10
+#   python scripts/benchmark.py --compare reports/benchmarks/a.json reports/benchmarks/b.json
+
+BASE_ROWS = 56_000
+OUTPUT_DIR = os.path.join('reports', 'benchmarks')
+
+# Value distributions observed in the real extracts
+ESTADOS = (['CONCLUIDA', 'CANCELADA', 'PROCESO'], [0.71, 0.287, 0.003])
+TIPOS = (['MANUAL', 'ANCLAJE BASE', 'ANCLAJE APP SOA', 'ANCLAJE', 'ANCLAJE APP', 'APP', 'BASE AUTOMATICO'],
+         [0.619, 0.273, 0.076, 0.015, 0.01, 0.006, 0.001])
+CALLS = ([0, 1, 2, 3, 4, 5, 6, 7, 8, 10], [0.506, 0.115, 0.083, 0.086, 0.063, 0.045, 0.031, 0.02, 0.021, 0.03])
+CUENTAS = ['TPC SEGUROS', 'CALEDONIA SEGUROS', 'MERCANTIL ANDINA', 'SAN CRISTOBAL', 'RIVADAVIA',
+           'FEDERACION PATRONAL', 'ALLIANZ', 'ZURICH', 'SANCOR', 'LA SEGUNDA']
+
+
+def synthetic_extract(path, rows, seed=0, start='2023-01-01', end='2025-10-31'):
+    """Writes a zipped ';'-separated extract with the real 22-column schema."""
+    rng = np.random.default_rng(seed)
+    pick = lambda values_probs: rng.choice(values_probs[0], size=rows, p=values_probs[1])
+
+    lo, hi = pd.Timestamp(start).value // 10**9, pd.Timestamp(end).value // 10**9
+    created = pd.to_datetime(np.sort(rng.integers(lo, hi, size=rows)), unit='s')
+    estado = pick(ESTADOS)
+    finished = (created + pd.to_timedelta(rng.integers(600, 14400, size=rows), unit='s')).strftime('%Y-%m-%d %H:%M:%S')
+    users = np.array([f"USER{i:03d}" for i in range(60)] + [''])
+    ids = np.arange(1, rows + 1)
+
+    df = pd.DataFrame({
+        'id_expediente': ids // 2 + 1,
+        'estado_expediente': rng.choice(['CERRADO', 'ABIERTO'], size=rows, p=[0.997, 0.003]),
+        'id_asistencia': ids,
+        'nombre_titular': 'TITULAR',
+        'nombre_contacto': 'CONTACTO',
+        'usuario_que_apertura': rng.choice(users[:-1], size=rows),
+        'creacion_asistencia': created.strftime('%Y-%m-%d %H:%M:%S'),
+        'condicion_servicio': rng.choice(['En cobertura', 'En conexión', 'En Adicional'], size=rows, p=[0.993, 0.005, 0.002]),
+        'prioridad_atention': rng.choice(['EMERGENCIA', 'PROGRAMADA'], size=rows, p=[0.915, 0.085]),
+        'estado_asistencia': estado,
+        'plan_servicio': 'REMOLQUE',
+        'servicio': 'VEHICULAR - REMOLQUE VEHICULAR',
+        'plan': 'PROGRAMA DE ASISTENCIAS AUTOS',
+        'cuenta': rng.choice(CUENTAS, size=rows),
+        'etapa': rng.integers(1, 11, size=rows),
+        'usuario_que_asigna': np.where(rng.random(rows) < 0.2, '', rng.choice(users[:-1], size=rows)),
+        'tipo_asignacion': pick(TIPOS),
+        'fecha_finalizacion_proveedor': np.where(estado == 'CONCLUIDA', finished, ''),
+        'fecha_finalizacion_asistencia': np.where(estado == 'CONCLUIDA', finished, ''),
+        'fecha_cancelacion_asistencia': np.where(estado == 'CANCELADA', finished, ''),
+        'justificacion_cancelacion': np.where(estado == 'CANCELADA', 'CLIENTE DESISTE', ''),
+        'cantidad_llamadas': pick(CALLS)
+    })
+    archive = os.path.splitext(os.path.basename(path))[0] + '.csv'
+    df.to_csv(path, sep=';', index=False, compression={'method': 'zip', 'archive_name': archive})
+    return path
+
+
+def quiet(func):
+    """Wraps an entry point so its progress prints do not flood the benchmark output."""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return run
+
+
+def measure(name, func, rows, repeat=1):
+    """Best wall time of `repeat` untraced runs, then one traced run for peak memory."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = min(seconds)
+    return result, {
+        'stage': name,
+        'rows': rows,
+        'seconds': round(best, 6),
+        'rows_per_sec': round(rows / best, 1) if best > 0 else None,
+        'peak_mb': round(peak / 1e6, 3)
+    }
+
+
+def bench_stages(path, rows, repeat=1):
+    """Times decompress -> parse -> date parse -> aggregate -> price -> render for one extract."""
+    report = GlobalPolicyReport()
+    country = 'Benchmark'
+    results = []
+
+    def decompress():
+        with zipfile.ZipFile(path) as zf:
+            return zf.read(zf.namelist()[0])
+    raw, r = measure('decompress', decompress, rows, repeat)
+    results.append(r)
+
+    parse = lambda: pd.read_csv(io.BytesIO(raw), sep=';', on_bad_lines='skip', low_memory=False)
+    df, r = measure('parse', parse, rows, repeat)
+    results.append(r)
+
+    df = df.rename(columns=canonical_name)
+    profile = profile_frame(df.head(PROFILE_SAMPLE_ROWS))
+    df['month'], r = measure('date_parse', lambda: billing_months(df, profile), rows, repeat)
+    results.append(r)
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype('category')
+
+    facts, r = measure('aggregate', lambda: monthly_facts(df, country, year=2025), rows, repeat)
+    results.append(r)
+
+    price = lambda: report.price_table(report.volume_table(facts, country), label='2026')
+    priced, r = measure('price', price, rows, repeat)
+    results.append(r)
+
+    def render():
+        # What the data tab does before st.dataframe serializes the frame to Arrow
+        import pyarrow as pa
+        view = priced.copy()
+        view['Total Anual 2024'] = view.groupby('Pais')['Factura 2024'].transform('sum')
+        view['Total Anual 2026'] = view.groupby('Pais')['Factura 2026'].transform('sum')
+        return pa.Table.from_pandas(view)
+    _, r = measure('render_table', render, rows, repeat)
+    results.append(r)
+    return results
+
+
+def bench_entry_points(input_dir, rows, repeat=1):
+    """End-to-end timings of the public entry points on a directory of extracts."""
+    from data_cache import discover_extracts
+    from generate_final_excel import GlobalReportGenerator
+
+    results = []
+    report = GlobalPolicyReport()
+    extracts = discover_extracts(input_dir)
+    cache_dir = os.path.join(input_dir, '.cache')
+
+    def process_cold():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return [report.process_country(f, c) for c, f in extracts.items()]
+    _, r = measure('process_country (cold cache)', process_cold, rows, 1)
+    results.append(r)
+
+    process_warm = lambda: [report.process_country(f, c) for c, f in extracts.items()]
+    _, r = measure('process_country (warm cache)', process_warm, rows, repeat)
+    results.append(r)
+
+    volumes = pd.concat([report.country_volumes(f, c) for c, f in extracts.items()], ignore_index=True)
+
+    def simulate():
+        # Dashboard pricing layer (run_simulation) for a slider change
+        sim = GlobalPolicyReport(app_discount_pct=25, app_fee=0.30)
+        return sim.price_table(volumes, volumes['Pais'].map(sim.get_price_adjust), label='2026')
+    _, r = measure('run_simulation (pricing layer)', simulate, rows, repeat)
+    results.append(r)
+
+    # Sensitivity tab: 50 discounts x 20 app fees x 2 base fees in one broadcast
+    sweep = lambda: report.sweep(volumes, np.arange(50), np.linspace(0.0, 0.95, 20), [0.0, 3150.0])
+    _, r = measure('GlobalPolicyReport.sweep (50x20x2)', sweep, rows, repeat)
+    results.append(r)
+
+    def final_excel():
+        cwd = os.getcwd()
+        out = tempfile.mkdtemp()
+        try:
+            os.chdir(out)
+            quiet(lambda: GlobalReportGenerator().process_all(os.path.abspath(os.path.join(cwd, input_dir)),
+                                                              use_store=False))()
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(out, ignore_errors=True)
+    _, r = measure('GlobalReportGenerator.process_all', final_excel, rows, repeat)
+    results.append(r)
+    return results
+
+
+def bench_billing_workbooks(repeat=1):
+    """Real-billing extractors; they read the workbooks under Facturacion/."""
+    from extract_billing_ar import extract_ar_billing
+    from extract_billing_do import extract_do_billing
+    from extract_billing_pr import extract_pr_billing
+
+    results = []
+    for name, func in (('extract_billing_pr', extract_pr_billing), ('extract_billing_ar', extract_ar_billing),
+                       ('extract_billing_do', extract_do_billing)):
+        _, r = measure(name, quiet(func), 0, repeat)
+        r['rows_per_sec'] = None
+        results.append(r)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def run_suite(scales, repeat=1, countries=3, with_workbooks=False, output_dir=OUTPUT_DIR):
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'base_rows': BASE_ROWS,
+        'results': []
+    }
+    for scale in scales:
+        rows = int(BASE_ROWS * scale)
+        work = tempfile.mkdtemp(prefix='voccare_bench_')
+        try:
+            print(f"\n== scale {scale}x ({rows:,} rows per extract) ==")
+            paths = [synthetic_extract(os.path.join(work, f"Client9{i}_Bench{i}_20251027.zip"), rows, seed=i)
+                     for i in range(countries)]
+            results = bench_stages(paths[0], rows, repeat)
+            results += bench_entry_points(work, rows * countries, repeat)
+            for r in results:
+                r['scale'] = scale
+                print(f"{r['stage']:<36} {r['seconds']:>9.3f}s  {r['rows_per_sec'] or 0:>13,.0f} rows/s  "
+                      f"{r['peak_mb']:>9.1f} MB")
+            run['results'] += results
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+    if with_workbooks:
+        for r in bench_billing_workbooks(repeat):
+            r['scale'] = None
+            print(f"{r['stage']:<36} {r['seconds']:>9.3f}s  {'':>19}  {r['peak_mb']:>9.1f} MB")
+            run['results'].append(r)
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"{datetime.now():%Y%m%d_%H%M%S}_{run['commit'] or 'nogit'}.json"
+    out = os.path.join(output_dir, name)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults saved to {out}")
+    return run
+
+
+def compare(baseline_path, candidate_path):
+    """Side-by-side of two saved runs (ratio > 1 means the candidate is slower)."""
+    with open(baseline_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(candidate_path, encoding='utf-8') as f:
+        cand = json.load(f)
+    key = lambda r: (r['stage'], r['scale'])
+    base_by_key = {key(r): r for r in base['results']}
+    print(f"{'Stage':<36} {'Scale':>5} | {'Base s':>9} {'New s':>9} {'Ratio':>6} | {'Base MB':>8} {'New MB':>8}")
+    print("-" * 95)
+    for r in cand['results']:
+        b = base_by_key.get(key(r))
+        if b is None:
+            continue
+        ratio = r['seconds'] / b['seconds'] if b['seconds'] else float('nan')
+        print(f"{r['stage']:<36} {str(r['scale']):>5} | {b['seconds']:>9.3f} {r['seconds']:>9.3f} {ratio:>6.2f} | "
+              f"{b['peak_mb']:>8.1f} {r['peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the ingestion / aggregation / pricing hot paths.")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+                        help=f"Extract sizes as multiples of {BASE_ROWS:,} rows (e.g. 1 10 100)")
+    parser.add_argument('--repeat', type=int, default=1, help="Timed runs per stage (best is kept)")
+    parser.add_argument('--countries', type=int, default=3, help="Synthetic extracts for the end-to-end runs")
+    parser.add_argument('--with-workbooks', action='store_true',
+                        help="Also time the Facturacion/ workbook extractors")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'),
+                        help="Compare two saved JSON runs instead of benchmarking")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run_suite(args.scales, args.repeat, args.countries, args.with_workbooks, args.output_dir)
@@ -0,0 +1,372 @@
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+# Shared extraction layer for the real-billing workbooks (Facturacion/*.xlsx)
+# and the monthly index workbook (valid-call targets used for calibration).
+# Each workbook is opened once in openpyxl read-only (streaming) mode; label
+# and date-header rows are located while streaming and the scan stops as soon
+# as everything needed was found. Extracted monthly totals are memoized in
+# Facturacion/.cache/<workbook>.billing.json, keyed on the workbook's mtime
+# and size with a content hash as fallback (a touched but unchanged file is
+# not re-extracted).
+
+BILLING_DIR = 'Facturacion'
+CACHE_DIR_NAME = '.cache'
+# Bump when an extractor changes so memoized results are recomputed
+MEMO_VERSION = 2
+
+MONTHS_ES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto',
+             'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+# facturacion_real_<code>.csv -> country name used by the extracts / dashboard
+REAL_BILLING_COUNTRIES = {
+    'pr': 'Puerto Rico', 'ar': 'Argentina', 'do': 'Dominicana', 'bo': 'Bolivia', 'pe': 'Peru',
+    'cl': 'Chile', 'mx': 'Mexico', 'ec': 'Ecuador', 'cr': 'Costa Rica'
+}
+
+WORKBOOKS = {
+    'pr': "01. Calculadora PR Nov Cabina.xlsx",
+    'do': "08. Calculadora DO Nov Cabina.xlsx",
+    'ar': "12. Calculadora AR Nov Cabina.xlsx"
+}
+
+# Monthly index workbook: one sheet per operation, 'Total de llamadas Validas' per month
+INDEX_WORKBOOK = os.path.join('reports', 'REPORTE ACUMULADO INDICES SEPTIEMBRE 2025 (1).xlsx')
+VALID_CALLS_LABEL = 'Total de llamadas Validas'
+
+# Country -> index sheets whose valid calls add up to the country's extract
+INDEX_SHEETS = {
+    'Argentina': ['AR'],
+    'Chile': ['CL'],
+    'Colombia': ['CO', 'VOCCARE CO'],
+    'Costa Rica': ['CR', 'CR-CR'],
+    'Dominicana': ['DO'],
+    'Ecuador': ['EC'],
+    'Guatemala': ['GU', 'VOCCARE GU'],
+    'Honduras': ['HN'],
+    'Mexico': ['MX', 'VOCCARE MX'],
+    'Nicaragua': ['NI'],
+    'Paraguay': ['PY'],
+    'Peru': ['PE'],
+    'Puerto Rico': ['PR'],
+    'Salvador': ['SV'],
+    'Uruguay': ['ROU'],
+    'Bolivia': ['BO']
+}
+
+
+def open_workbook(file_path):
+    import openpyxl
+    # data_only: cached formula results, as pandas.read_excel returns them
+    return openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+
+
+def _number(value):
+    """Numeric cell value or None ('#REF!', text and blanks are skipped)."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return None if pd.isna(value) else float(value)
+    num = pd.to_numeric(value, errors='coerce')
+    return None if pd.isna(num) else float(num)
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return pd.to_datetime(value)
+        except (ValueError, TypeError):
+            return None
+    return None
+
+
+def _cell(row, idx):
+    return row[idx] if idx < len(row) else None
+
+
+def label_values(ws, labels, label_col=1, value_col=4):
+    """
+    {label: value} for the first row whose `label_col` text contains each
+    label (case-insensitive) and whose `value_col` is numeric. Stops reading
+    the sheet once every label was found.
+    """
+    wanted = {label.upper(): label for label in labels}
+    found = {}
+    for row in ws.iter_rows(values_only=True):
+        text = str(_cell(row, label_col)).strip().upper()
+        for key, label in wanted.items():
+            if label not in found and key in text:
+                value = _number(_cell(row, value_col))
+                if value is not None:
+                    found[label] = value
+        if len(found) == len(wanted):
+            break
+    return found
+
+
+def monthly_values(ws, label, year=2025, label_cols=(1, 2), date_cols=None):
+    """
+    {'YYYY-MM': value} of the `label` row for the months of `year` that hold
+    a number, using the first row with `year` dates as header. None if the
+    label or the header row is missing.
+    """
+    totals = monthly_totals(ws, label, year, label_cols, date_cols, numeric_only=True)
+    return None if totals is None else {month: value for month, value in totals.items() if value is not None}
+
+
+def monthly_totals(ws, total_label='TOTAL USD', year=2025, label_cols=(1, 2), date_cols=None, numeric_only=False):
+    """
+    Sums the `total_label` row per month of `year`, using the first row that
+    holds `year` dates (in `date_cols`, all columns by default) as header.
+    Stops reading the sheet once both rows were found. Returns
+    {'YYYY-MM': total} for the twelve months, or None if a row is missing.
+    With `numeric_only`, months without any number are None instead of 0.
+    """
+    date_row = total_row = None
+    for row in ws.iter_rows(values_only=True):
+        if total_row is None:
+            text = " ".join(str(_cell(row, c)).strip().upper() for c in label_cols)
+            if total_label.upper() in text:
+                total_row = row
+        if date_row is None:
+            cols = range(len(row)) if date_cols is None else [c for c in date_cols if c < len(row)]
+            for c in cols:
+                value = row[c]
+                if (isinstance(value, datetime) and value.year == year) or (isinstance(value, str) and str(year) in value):
+                    date_row = row
+                    break
+        if date_row is not None and total_row is not None:
+            break
+    if date_row is None or total_row is None:
+        return None
+
+    totals = {f"{year}-{m:02d}": None if numeric_only else 0.0 for m in range(1, 13)}
+    for c, value in enumerate(date_row):
+        dt = _date(value)
+        if dt is None or dt.year != year:
+            continue
+        amount = _number(_cell(total_row, c))
+        if amount is not None:
+            month = f"{year}-{dt.month:02d}"
+            totals[month] = (totals[month] or 0.0) + amount
+    return totals
+
+
+# --- Per-workbook extractors: workbook -> {'YYYY-MM': total} plus display detail ---
+
+def extract_pr(wb):
+    """
+    PR: 'Consolidado <Mes>' sheets, CABINA + Fee Corporativo (column E).
+    Sheets without a CABINA row are listed in 'missing' (Fee Corporativo is
+    not billed every month).
+    """
+    totals, detail, missing = {}, [], []
+    for month_num, month in enumerate(MONTHS_ES, start=1):
+        sheet_name = f"Consolidado {month}"
+        cabina = fee = 0.0
+        source = "N/A"
+        if sheet_name in wb.sheetnames:
+            source = sheet_name
+            found = label_values(wb[sheet_name], ['CABINA', 'FEE CORPORATIVO'])
+            if 'CABINA' not in found:
+                missing.append(sheet_name)
+            cabina = found.get('CABINA', 0.0)
+            fee = found.get('FEE CORPORATIVO', 0.0)
+        elif f"Calculadora Cabina {month}" in wb.sheetnames:
+            # Partial month sheets: layout unknown, skipped to avoid bad data
+            source = f"Calculadora Cabina {month} (Partial?)"
+        total = cabina + fee
+        if total > 0:
+            totals[f"2025-{month_num:02d}"] = total
+        detail.append({'Mes': month, 'Fuente': source, 'Cabina': cabina, 'Fee Corp': fee, 'Total Real': total})
+    return {'totals': totals, 'detail': detail, 'missing': missing}
+
+
+def _sum_sheets(wb, sheet_names, year=2025, date_cols=None):
+    totals = {f"{year}-{m:02d}": 0.0 for m in range(1, 13)}
+    missing = []
+    for sheet_name in sheet_names:
+        if sheet_name not in wb.sheetnames:
+            missing.append(sheet_name)
+            continue
+        sheet_totals = monthly_totals(wb[sheet_name], year=year, date_cols=date_cols)
+        if sheet_totals is None:
+            missing.append(sheet_name)
+            continue
+        for month, value in sheet_totals.items():
+            totals[month] += value
+    return {'totals': totals, 'missing': missing}
+
+
+def extract_ar(wb):
+    """AR: 'TOTAL USD' row under the 2025 date header of both cabina sheets."""
+    # Date header searched in columns K..AD
+    return _sum_sheets(wb, ["Servicios Cabina Addiuva 2025", "Servicios Cabina AON 2025"], date_cols=range(10, 30))
+
+
+def extract_do(wb):
+    """DO: 'Total usd' row under the 2025 date header of 'Servicios Cabina'."""
+    return _sum_sheets(wb, ["Servicios Cabina"])
+
+
+EXTRACTORS = {'pr': extract_pr, 'ar': extract_ar, 'do': extract_do}
+
+
+def extract_index(wb, year=2025):
+    """
+    Index workbook: valid calls per country and month of `year` (sum of the
+    country's INDEX_SHEETS), from the label row under each sheet's date header.
+    Months without a number in any sheet are left out.
+    """
+    targets, missing = {}, []
+    for country, sheet_names in INDEX_SHEETS.items():
+        months = {}
+        for sheet_name in sheet_names:
+            if sheet_name not in wb.sheetnames:
+                missing.append(sheet_name)
+                continue
+            # Date header searched from column C on (column B holds the report title)
+            sheet_totals = monthly_values(wb[sheet_name], VALID_CALLS_LABEL, year=year, date_cols=range(2, 40))
+            if sheet_totals is None:
+                missing.append(sheet_name)
+                continue
+            for month, value in sheet_totals.items():
+                months[month] = months.get(month, 0.0) + value
+        targets[country] = dict(sorted(months.items()))
+    return {'targets': targets, 'missing': missing}
+
+
+# --- Memoization keyed on mtime / size, content hash as fallback ---
+
+def _file_hash(file_path):
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _memo_path(file_path):
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME,
+                        os.path.basename(file_path) + '.billing.json')
+
+
+def extract_workbook(code, billing_dir=BILLING_DIR):
+    """Memoized extraction result of one country workbook ('pr', 'ar', 'do')."""
+    return memoized_extract(os.path.join(billing_dir, WORKBOOKS[code]), code, EXTRACTORS[code])
+
+
+def extract_index_targets(file_path=INDEX_WORKBOOK, year=2025):
+    """Memoized valid-call targets of the index workbook (see `extract_index`)."""
+    return memoized_extract(file_path, f"index-{year}", lambda wb: extract_index(wb, year))
+
+
+def workbook_signature(file_path):
+    """sha1 of a workbook's content."""
+    return _file_hash(file_path)
+
+
+def memoized_extract(file_path, key, extractor):
+    """`extractor(workbook)` result memoized under `key` next to the workbook."""
+    memo_path = _memo_path(file_path)
+    stat = os.stat(file_path)
+    memo = None
+    if os.path.exists(memo_path):
+        try:
+            with open(memo_path, encoding='utf-8') as f:
+                memo = json.load(f)
+            if memo.get('version') != MEMO_VERSION:
+                memo = None
+        except Exception:
+            memo = None
+
+    dirty = False
+    if memo is not None and (memo['mtime_ns'], memo['size']) != (stat.st_mtime_ns, stat.st_size):
+        # Touched or copied: only re-extract if the content actually changed
+        digest = _file_hash(file_path)
+        if memo.get('sha1') != digest:
+            memo = None
+        else:
+            memo.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            dirty = True
+    if memo is None:
+        memo = {'version': MEMO_VERSION, 'sha1': _file_hash(file_path),
+                'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'results': {}}
+
+    if key not in memo['results']:
+        wb = open_workbook(file_path)
+        try:
+            memo['results'][key] = extractor(wb)
+        finally:
+            wb.close()
+        dirty = True
+
+    if dirty:
+        try:
+            os.makedirs(os.path.dirname(memo_path), exist_ok=True)
+            tmp = memo_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(memo, f, indent=2)
+            os.replace(tmp, memo_path)
+        except Exception as e:
+            print(f"Could not write billing cache for {file_path}: {e}")
+    return memo['results'][key]
+
+
+def billing_frame(totals):
+    """{'YYYY-MM': total} -> the facturacion_real_*.csv layout (Mes, Facturacion Real)."""
+    return pd.DataFrame({'Mes': list(totals.keys()), 'Facturacion Real': list(totals.values())})
+
+
+def real_billing_files(billing_dir=BILLING_DIR):
+    """{code: path} of the facturacion_real_<code>.csv files present for known countries."""
+    files = {}
+    for code in REAL_BILLING_COUNTRIES:
+        path = os.path.join(billing_dir, f"facturacion_real_{code}.csv")
+        if os.path.exists(path):
+            files[code] = path
+    return files
+
+
+def load_real_billing(billing_dir=BILLING_DIR):
+    """All facturacion_real_*.csv files as one (Pais, Mes, Facturacion Real) table."""
+    frames = []
+    for code, path in real_billing_files(billing_dir).items():
+        df = pd.read_csv(path, dtype={'Mes': str})
+        df['Facturacion Real'] = pd.to_numeric(df['Facturacion Real'], errors='coerce').fillna(0)
+        df.insert(0, 'Pais', REAL_BILLING_COUNTRIES[code])
+        frames.append(df[['Pais', 'Mes', 'Facturacion Real']])
+    if not frames:
+        return pd.DataFrame({'Pais': pd.Series(dtype=str), 'Mes': pd.Series(dtype=str),
+                             'Facturacion Real': pd.Series(dtype=float)})
+    # One row per (Pais, Mes)
+    return pd.concat(frames, ignore_index=True).groupby(['Pais', 'Mes'], as_index=False, sort=True)['Facturacion Real'].sum()
+
+
+def regenerate(output_dir, codes=None, billing_dir=BILLING_DIR):
+    """Writes facturacion_real_<code>.csv for every workbook in one pass."""
+    os.makedirs(output_dir, exist_ok=True)
+    for code in codes or WORKBOOKS:
+        result = extract_workbook(code, billing_dir)
+        for sheet_name in result.get('missing', []):
+            print(f"WARNING {code}: header or total rows not found in '{sheet_name}'")
+        target = os.path.join(output_dir, f"facturacion_real_{code}.csv")
+        billing_frame(result['totals']).to_csv(target, index=False, float_format='%.2f')
+        print(f"{code}: {len(result['totals'])} months -> {target}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerates facturacion_real_*.csv from the billing workbooks.")
+    parser.add_argument('--output-dir', default=os.path.join('reports', 'facturacion_real'),
+                        help="Target folder (pass Facturacion to replace the committed CSVs)")
+    parser.add_argument('--countries', nargs='+', choices=sorted(WORKBOOKS), help="Workbook codes (default: all)")
+    parser.add_argument('--billing-dir', default=BILLING_DIR)
+    args = parser.parse_args()
+    regenerate(args.output_dir, args.countries, args.billing_dir)
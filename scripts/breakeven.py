@@ -0,0 +1,84 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from compare_policies import GlobalPolicyReport
+from pricing import REFERENCE_APP_FEE, price_bills
+
+# Break-even solver for the 2026 policy.
+# Both policies share the base fee, the SC tiers and the valid-call tiers, so
+#   Ahorro = base_sc_cost * app_share * d / 100 - app_tier_cost * fee / 0.45
+# is linear in the app discount `d` and in the app fee. For every row (or
+# group of rows: the components add up) the discount that makes Factura 2026
+# equal Factura 2024, and the app fee that reaches a savings target, follow in
+# closed form from two per-row coefficients.
+
+
+def savings_components(report, volumes):
+    """
+    Per-row coefficients of the savings: `discount_per_pct` (USD of discount
+    per discount point) and `app_cost_ref` (App tier cost at the reference fee).
+    """
+    price_adj = volumes['Pais'].map(report.get_price_adjust).to_numpy(dtype=float)
+    p = price_bills(volumes['SC Total'].to_numpy(), volumes['SC App'].to_numpy(),
+                    volumes['Llamadas Validas'].to_numpy(), report.tiers_sc, report.tiers_lv, report.tiers_app,
+                    price_adj=price_adj, app_discount_pct=100, app_fee=REFERENCE_APP_FEE, base_fee=report.base_fee)
+    return pd.DataFrame({
+        'discount_per_pct': p['discount'] / 100.0,
+        'app_cost_ref': p['cost_app']
+    }, index=volumes.index)
+
+
+def solve(report, volumes, by=('Pais', 'Mes'), target_savings=0.0):
+    """
+    Thresholds per group of `by` (e.g. ('Pais',) for whole countries):
+    - 'Descuento Neutro (%)': app discount where Factura 2026 == Factura 2024
+      at the report's app fee.
+    - 'Fee Objetivo ($)': app fee where Ahorro == `target_savings` (per group)
+      at the report's app discount.
+    Groups without App services, or targets unreachable with a zero fee,
+    have no threshold (NaN).
+    """
+    by = list(by)
+    comp = savings_components(report, volumes)
+    for col in by:
+        comp[col] = volumes[col].to_numpy()
+    groups = comp.groupby(by, sort=True)[['discount_per_pct', 'app_cost_ref']].sum() if by else comp.sum().to_frame().T
+
+    per_pct = groups['discount_per_pct'].to_numpy()
+    app_ref = groups['app_cost_ref'].to_numpy()
+    app_cost = app_ref * (report.app_fee / REFERENCE_APP_FEE)
+    discount = per_pct * report.app_discount_pct
+
+    out = groups.reset_index()[by].copy() if by else pd.DataFrame(index=[0])
+    out['Descuento Neutro (%)'] = np.divide(app_cost, per_pct, out=np.full(len(out), np.nan), where=per_pct > 0)
+    fee = np.divide((discount - target_savings) * REFERENCE_APP_FEE, app_ref,
+                    out=np.full(len(out), np.nan), where=app_ref > 0)
+    # Target out of reach even with a zero fee
+    out['Fee Objetivo ($)'] = np.where(fee >= 0, fee, np.nan)
+    out['Ahorro Actual'] = np.round(discount - app_cost, 2)
+    return out
+
+
+if __name__ == "__main__":
+    from data_cache import discover_extracts
+
+    parser = argparse.ArgumentParser(description="Break-even app discount / app fee per country.")
+    parser.add_argument('--input-dir', default='Paises')
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--app-fee', type=float, default=None, help="Default: policy file")
+    parser.add_argument('--discount', type=float, default=None, help="Default: policy file")
+    parser.add_argument('--target-savings', type=float, default=0.0, help="Savings target per country (USD)")
+    parser.add_argument('--by-month', action='store_true')
+    args = parser.parse_args()
+
+    report = GlobalPolicyReport(app_discount_pct=args.discount, app_fee=args.app_fee)
+    volumes = pd.concat([report.country_volumes(f, c, args.year) for c, f in discover_extracts(args.input_dir).items()],
+                        ignore_index=True)
+    by = ('Pais', 'Mes') if args.by_month else ('Pais',)
+    print(solve(report, volumes, by, args.target_savings).to_string(index=False))
@@ -1,28 +1,24 @@
 import pandas as pd
 import numpy as np
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from compare_policies import GlobalPolicyReport
+from policy import load_policy
+from pricing import compile_tiers
+from scenarios import project_bills
 
 class VoccareCalculator:
     def __init__(self, country_config):
         self.config = country_config
-        self.tiers_sc = [
-            (50, 0.00),     # First 50 included in fee
-            (500, 10.51),   # 51-500
-            (1000, 9.28),   # 501-1000
-            (2000, 8.04),   # 1001-2000
-            (3000, 6.80),   # 2001-3000
-            (6000, 5.57),   # 3001-6000
-            (9000, 5.26),   # 6001-9000
-            (12000, 4.95),  # 9001-12000
-            (15000, 4.64),  # 12001-15000
-            (float('inf'), 4.33) # >15000
-        ]
-        self.tiers_calls = [
-            (4000, 0.80),
-            (20000, 0.37),
-            (float('inf'), 0.19)
-        ]
-        self.base_fee = 3150.00
-        self.cancel_fee = 2.47
+        # Tiers and fees from the shared policy file (first 50 SC included in the fee)
+        policy = load_policy()
+        self.tiers_sc = policy.tiers['sc']
+        self.tiers_calls = policy.tiers['lv']
+        self.base_fee = policy.base_fee
+        self.cancel_fee = policy.cancel_fee
         
         # "New Policy" parameters
         self.app_discount = 0.0 # Percentage discount for App services (0.0 to 1.0)
@@ -33,38 +29,13 @@ class VoccareCalculator:
         Calculates cost based on tiered pricing.
         App services might receive a discount if configured.
         """
-        remaining = total_services
-        total_cost = 0.0
-        current_tier_start = 0
-        
         # Baseline calculation (Standard Tiers)
         # Note: The fee covers the first 50 *regardless* of type.
-        # We calculate the 'Standard Cost' first, then apply discount to the App portion?
-        # Or do we apply the discount to the rate?
         # Interpretation: App Services are "cheaper" to process.
         # Let's calculate the average unit price for this volume, then discount the App portion.
-        
-        breakdown = []
-        
-        for limit, price in self.tiers_sc:
-            if remaining <= 0:
-                break
-            
-            tier_capacity = limit - current_tier_start
-            count_in_tier = min(remaining, tier_capacity)
-            
-            cost_segment = count_in_tier * price
-            total_cost += cost_segment
-            
-            breakdown.append({
-                'tier_limit': limit,
-                'price': price,
-                'count': count_in_tier,
-                'cost': cost_segment
-            })
-            
-            remaining -= count_in_tier
-            current_tier_start = limit
+        schedule = compile_tiers(self.tiers_sc)
+        total_cost = schedule.cost(total_services)
+        breakdown = schedule.breakdown(total_services)
             
         # Apply App Reward
         # Strategy: Calculate average cost per unit, then apply discount to App volume
@@ -96,30 +67,9 @@ class VoccareCalculator:
         }
 
     def calculate_call_cost(self, total_calls):
-        remaining = total_calls
-        total_cost = 0.0
-        current_tier_start = 0
-        
-        breakdown = []
-        
-        for limit, price in self.tiers_calls:
-            if remaining <= 0:
-                break
-            
-            tier_capacity = limit - current_tier_start
-            count_in_tier = min(remaining, tier_capacity)
-            
-            total_cost += count_in_tier * price
-            
-            breakdown.append({
-                'tier_limit': limit,
-                'price': price,
-                'count': count_in_tier,
-                'cost': count_in_tier * price
-            })
-            
-            remaining -= count_in_tier
-            current_tier_start = limit
+        schedule = compile_tiers(self.tiers_calls)
+        total_cost = schedule.cost(total_calls)
+        breakdown = schedule.breakdown(total_calls)
             
         return total_cost, breakdown
 
@@ -238,55 +188,20 @@ def run_mexico_simulation(file_path):
     # Actually, let's use a theoretical "0% App" baseline for cleaner comparison?
     # No, compare against Current Reality (Scenario 1).
     
-    for adoption in adoption_levels:
-        # We recalculate the whole year with this adoption rate
-        sim_total_bill = 0
-        sim_direct_savings = 0
-        sim_call_savings = 0
-        
-        for month, group in df_2025.groupby('month'):
-            # 1. Simulate Service Shift
-            total_sc = len(group[group['estado_asistencia'] == 'CONCLUIDA'])
-            sim_app_count = int(total_sc * adoption)
-            sim_global_count = total_sc - sim_app_count
-            
-            # 2. Simulate Call Reduction
-            # Logic: Global users generate X calls. App users generate X * (1 - 0.238) calls.
-            # First, assume current calls are mostly Global.
-            # Avg calls per service (Global) ~ Estimated from data
-            # Let's use the factor: 23.8% reduction for the *shifted* volume.
-            
-            # Current App % is negligible, so assume current calls are Baseline Global Volume.
-            raw_calls = group['cantidad_llamadas'].sum()
-            valid_calls_baseline = int(raw_calls * 0.45)
-            
-            # If we shift 'sim_app_count' services from Global to App:
-            # The calls associated with those services drop by 23.8%.
-            # How many calls per service?
-            calls_per_service = valid_calls_baseline / total_sc if total_sc > 0 else 0
-            
-            # Reduction = (Services Shifted to App) * (Calls per Service) * 0.238
-            # Shifted count = sim_app_count - actual_app_count (ignore actual, just assume 0->Target)
-            # Let's just calculate absolute:
-            # Total Calls = (Global_Count * Rate) + (App_Count * Rate * (1-0.238))
-            # Rate = calls_per_service (assuming baseline is all Global)
-            
-            projected_valid_calls = (sim_global_count * calls_per_service) + \
-                                    (sim_app_count * calls_per_service * (1 - 0.238))
-            
-            # 3. Calculate Costs
-            # Services
-            sc_cost_res = calc.calculate_service_cost(total_sc, sim_app_count)
-            
-            # Calls
-            call_cost_res, _ = calc.calculate_call_cost(projected_valid_calls)
-            
-            # Bill
-            monthly_bill = calc.base_fee + sc_cost_res['final_cost'] + call_cost_res + (0 * calc.cancel_fee)
-            
-            sim_total_bill += monthly_bill
-            sim_direct_savings += sc_cost_res['app_savings']
-            
+    # Monthly totals are computed once; every adoption level is priced in one
+    # broadcast by the scenario engine (scenarios.project_bills, app fee not charged here)
+    monthly = df_2025.assign(sc=df_2025['estado_asistencia'] == 'CONCLUIDA').groupby('month').agg(
+        sc_total=('sc', 'sum'), raw_calls=('cantidad_llamadas', 'sum'))
+    report = GlobalPolicyReport(app_discount_pct=calc.app_discount * 100, app_fee=0.0, base_fee=calc.base_fee)
+    bills = project_bills(report, monthly['sc_total'].to_numpy(), monthly['raw_calls'].to_numpy(),
+                          adoption=np.array(adoption_levels)[:, None],
+                          call_reduction=calc.app_call_reduction_factor, efficiency=0.45, growth=1.0)
+    # (Monte Carlo version for any country: scenarios.py)
+
+    for i, adoption in enumerate(adoption_levels):
+        sim_total_bill = bills['Factura 2026'][i].sum()
+        sim_direct_savings = bills['Descuento App'][i].sum()
+
         total_savings = total_bill_current - sim_total_bill
         call_savings = total_savings - sim_direct_savings # Rough attribution
         
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import call_columns
+from billing_workbooks import INDEX_WORKBOOK, extract_index_targets, workbook_signature
+from data_cache import discover_extracts
+from fact_store import select_facts, update_facts
+from parallel import map_countries
+from policy import calibration_path, load_policy
+
+# Call-efficiency calibration in one pass: valid-call targets are read once
+# from the index workbook (memoized by billing_workbooks), raw calls come from
+# the fact store's per-month aggregates (no extract re-read), and each country
+# gets the least-squares factor f = sum(raw * target) / sum(raw^2) over the
+# months present on both sides (optionally one factor per month as well).
+# The fit is written to the policy's versioned calibration file, whose values
+# override the policy's factor sets wherever the calculators read them.
+
+# Fitted factors outside (0, MAX_FACTOR] are rejected (targets above the raw
+# calls mean the extract and the index do not cover the same operation)
+MAX_FACTOR = 1.0
+
+# Factor-set basis -> index into call_columns(strategy) (raw calls of all rows / concluded services)
+BASIS_COLUMNS = {'all_rows': 0, 'sc_only': 1}
+
+
+def raw_calls(file_path, country, year, basis, strategy):
+    """{'YYYY-MM': raw calls} of one extract from the fact store."""
+    _, months, accounts = update_facts(file_path)
+    facts = select_facts(months, accounts, year=year)
+    column = call_columns(strategy)[BASIS_COLUMNS[basis]]
+    return dict(zip(facts['Mes'], facts[column].astype(float)))
+
+
+def fit(raw, target):
+    """Least-squares factor through the origin plus the fit's RMSE (NaN without data)."""
+    raw = np.asarray(raw, dtype=float)
+    target = np.asarray(target, dtype=float)
+    denom = float(np.dot(raw, raw))
+    if denom == 0:
+        return np.nan, np.nan
+    factor = float(np.dot(raw, target)) / denom
+    return factor, float(np.sqrt(np.mean((target - factor * raw) ** 2)))
+
+
+def calibrate(input_dir='Paises', workbook=INDEX_WORKBOOK, year=2025, factor_set='call_efficiency',
+              per_month=False, policy=None, jobs=None):
+    """
+    Fitted factors of `factor_set` for every country with both an extract and
+    index targets. Returns ({'countries': ..., 'monthly': ...}, fit report frame).
+    """
+    policy = policy or load_policy()
+    if factor_set not in policy.factor_sets:
+        raise ValueError(f"Unknown factor set '{factor_set}'")
+    basis = policy.bases[factor_set]
+    if basis not in BASIS_COLUMNS:
+        raise ValueError(f"Factor set '{factor_set}' has basis '{basis}': not calibrated from call counts")
+    targets = extract_index_targets(workbook, year)['targets']
+    extracts = {c: f for c, f in discover_extracts(input_dir).items() if targets.get(c)}
+
+    raws, errors = map_countries(
+        raw_calls,
+        [(c, (f, c, year, basis, policy.call_strategy(c))) for c, f in extracts.items()],
+        jobs=jobs
+    )
+    for country, e in errors.items():
+        print(f"ERROR reading raw calls of {country}: {e}")
+
+    countries, monthly, report = {}, {}, []
+    for country in sorted(raws):
+        months = sorted(m for m in targets[country] if raws[country].get(m, 0) > 0 and targets[country][m] > 0)
+        raw = [raws[country][m] for m in months]
+        target = [targets[country][m] for m in months]
+        factor, rmse = fit(raw, target)
+        current = policy.factor(factor_set, country)
+        if not months:
+            status = 'no overlapping months'
+        elif not 0 < factor <= MAX_FACTOR:
+            status = f'rejected (> {MAX_FACTOR})' if factor > MAX_FACTOR else 'rejected (<= 0)'
+        else:
+            status = 'ok'
+            countries[country] = round(factor, 4)
+            if per_month:
+                per = {m: round(t / r, 4) for m, r, t in zip(months, raw, target) if 0 < t / r <= MAX_FACTOR}
+                if per:
+                    monthly[country] = per
+        report.append({'Pais': country, 'Meses': len(months), 'Llamadas Brutas': sum(raw),
+                       'Llamadas Validas (Excel)': sum(target), 'Factor Actual': current,
+                       'Factor Ajustado': round(factor, 4) if months else np.nan,
+                       'RMSE': round(rmse, 1) if months else np.nan, 'Estado': status})
+    fitted = {'basis': basis, 'countries': countries}
+    if per_month:
+        fitted['monthly'] = monthly
+    return fitted, pd.DataFrame(report)
+
+
+def write_calibration(path, factor_set, fitted, year, workbook):
+    """
+    Stores `fitted` under `factor_set` in the calibration file (other sets are
+    kept) with the next version number. Returns the new version.
+    """
+    current = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            current = json.load(f)
+    version = int(current.get('version', 0)) + 1
+    payload = {
+        'version': version,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'year': year,
+        'source': {'workbook': os.path.basename(workbook), 'sha1': workbook_signature(workbook)},
+        'factor_sets': {**current.get('factor_sets', {}), factor_set: fitted}
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fits calibration factors from the index workbook and the extracts.")
+    parser.add_argument('--input-dir', default='Paises')
+    parser.add_argument('--workbook', default=INDEX_WORKBOOK)
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--factor-set', default='call_efficiency', help="call_efficiency (all rows) or final_report (SC only)")
+    parser.add_argument('--per-month', action='store_true', help="Also store one factor per month")
+    parser.add_argument('--output', default=None, help="Calibration file (default: the policy's calibration_file)")
+    parser.add_argument('--dry-run', action='store_true', help="Print the fit without writing it")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    policy = load_policy()
+    fitted, report = calibrate(args.input_dir, args.workbook, args.year, args.factor_set, args.per_month, policy)
+    pd.set_option('display.float_format', '{:,.3f}'.format)
+    print(report.to_string(index=False))
+
+    if not args.dry_run:
+        output = args.output or calibration_path(policy.source, policy.calibration_file)
+        version = write_calibration(output, args.factor_set, fitted, args.year, args.workbook)
+        print(f"\nCalibration v{version} ({len(fitted['countries'])} countries) -> {output}")
+    print(f"Calibrated in {time.perf_counter() - start:.2f}s")
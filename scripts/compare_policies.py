@@ -1,65 +1,45 @@
 import pandas as pd
+import numpy as np
 import glob
 import os
 import sys
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import call_columns, group_accounts, monthly_facts, stream_monthly_facts
+from data_cache import load_profile
+from fact_store import select_facts, update_facts
+from policy import load_policy
+from pricing import price_bills, tier_cost
+from result_store import extract_signature
+
 class GlobalPolicyReport:
-    def __init__(self, app_discount_pct=10, app_fee=0.45, base_fee=None):
-        # Shared Pricing
-        self.app_discount_pct = app_discount_pct
-        self.app_fee = app_fee
-        self.base_fee = base_fee if base_fee is not None else 3150.0 # Make base_fee configurable
-
-        # Tiers for SC costs (2024 & 2025)
-        self.tiers_sc = [
-            (50, 0.00), (500, 10.51), (1000, 9.28), (2000, 8.04),
-            (3000, 6.80), (6000, 5.57), (9000, 5.26), (12000, 4.95),
-            (15000, 4.64), (float('inf'), 4.33)
-        ]
-        self.tiers_lv = [
-            (4000, 0.80), (20000, 0.37), (float('inf'), 0.19)
-        ]
-        self.tiers_app = [
-            (5000, 0.45), (20000, 0.35), (float('inf'), 0.20)
-        ]
+    def __init__(self, app_discount_pct=None, app_fee=None, base_fee=None, policy=None):
+        # Tiers, fees and factors from the shared policy file (config/policy.json)
+        policy = policy or load_policy()
+        self.app_discount_pct = policy.app_discount_pct if app_discount_pct is None else app_discount_pct
+        self.app_fee = policy.app_fee if app_fee is None else app_fee
+        self.base_fee = base_fee if base_fee is not None else policy.base_fee # Make base_fee configurable
+
+        # Tiers for SC costs (2024 & 2025), valid calls and App transactions
+        self.tiers_sc = policy.tiers['sc']
+        self.tiers_lv = policy.tiers['lv']
+        self.tiers_app = policy.tiers['app']
         
         # LV per SC Ratios (Derived from Excel: LV / SC)
-        self.country_ratios = {
-            "Dominicana": 1.02,   # Very efficient (MCS)
-            "Puerto Rico": 3.00,  # High coordination (PR)
-            "Guatemala": 2.12,    # High coordination (GU)
-            "Mexico": 1.50,
-            "Costa Rica": 3.12,   # Very high coordination (CR + CR-CR)
-            "default": 1.50
-        }
+        self.country_ratios = policy.factors('lv_per_sc_ratio')
         
         # Price Adjustment Factors (To match Excel Revenue Targets)
-        self.price_adjustment_factors = {
-            "Dominicana": 1.0,
-            "default": 1.0
-        }
+        self.price_adjustment_factors = policy.factors('price_adjustment')
         
-        # Call Efficiency Factors (Valid >15s / Total Raw Calls)
-        # Calibrated from 'REPORTE ACUMULADO INDICES SEPTIEMBRE 2025 (1).xlsx' vs CSV `cantidad_llamadas` (Jan-Sep 2025)
-        self.call_efficiency_factors = {
-            "Argentina": 0.49,  
-            "Chile": 0.50, # Factor 1.27 (Excel > CSV) - Using default 0.50 as a safeguard
-            "Colombia": 0.50, # CSV calls are 0. Using default 0.50
-            "Costa Rica": 0.41, 
-            "Dominicana": 0.47, 
-            "Ecuador": 0.23,    
-            "Guatemala": 0.32,  
-            "Honduras": 0.50, # CSV calls are 0. Using default 0.50
-            "Mexico": 0.47,     
-            "Nicaragua": 0.50, # CSV calls are 0. Using default 0.50
-            "Paraguay": 0.50, # CSV calls are 0. Using default 0.50
-            "Peru": 0.95,       
-            "Puerto Rico": 0.633, 
-            "Salvador": 0.50, # Factor 16.41 (Excel > CSV) - Using default 0.50 as a safeguard
-            "Uruguay": 0.45,    
-            "Bolivia": 0.46,    
-            "default": 0.50 # Fallback for any other country or zero cases if not caught above
-        }
+        # Call Efficiency Factors (Valid >15s / Total Raw Calls, all rows)
+        self.call_efficiency_factors = policy.factors('call_efficiency')
+        
+        # Call counting per country: 'sum' (all rows) or max per id_asistencia / id_expediente
+        self.call_counting = policy.call_counting()
+        
+        # Calibrated per-month efficiency factors (calibration file), where fitted
+        self.efficiency_monthly = policy.monthly.get('call_efficiency', {})
 
     def get_ratio(self, country):
         return self.country_ratios.get(country, self.country_ratios['default'])
@@ -70,133 +50,203 @@ class GlobalPolicyReport:
     def get_efficiency_factor(self, country):
         return self.call_efficiency_factors.get(country, self.call_efficiency_factors['default'])
 
+    def get_call_strategy(self, country):
+        return self.call_counting.get(country, self.call_counting['default'])
+
+    def calibration(self, country):
+        """Calibration inputs of one country (part of its result-store keys)."""
+        return {
+            'efficiency': self.get_efficiency_factor(country),
+            'efficiency_monthly': self.efficiency_monthly.get(country),
+            'ratio': self.get_ratio(country),
+            'price_adj': self.get_price_adjust(country),
+            'call_strategy': self.get_call_strategy(country)
+        }
+
+    def pricing_params(self):
+        """Tier tables and policy parameters (part of priced result-store keys)."""
+        return {
+            'tiers': [self.tiers_sc, self.tiers_lv, self.tiers_app],
+            'app_discount_pct': self.app_discount_pct,
+            'app_fee': self.app_fee,
+            'base_fee': self.base_fee
+        }
+
     def calculate_tier_cost(self, volume, tiers, adjustment_factor=1.0):
-        remaining = volume
-        total_cost = 0.0
-        current_tier_start = 0
-        for limit, price in tiers:
-            if remaining <= 0: break
-            
-            # Apply adjustment to price
-            effective_price = price * adjustment_factor
-            
-            tier_capacity = limit - current_tier_start
-            count = min(remaining, tier_capacity)
-            total_cost += count * effective_price
-            remaining -= count
-            current_tier_start = limit
-        return total_cost
-
-    def process_country(self, file_path, country_name, year_filter=2025):
+        # Compiled cumulative-cost schedule from the shared pricing engine
+        return tier_cost(volume, tiers, adjustment_factor)
+
+    def price_volumes(self, sc_total, sc_app, valid_calls, price_adj=1.0):
+        """Vectorized 2024 / 2025 pricing for arrays of monthly volumes."""
+        return price_bills(sc_total, sc_app, valid_calls,
+                           self.tiers_sc, self.tiers_lv, self.tiers_app,
+                           price_adj=price_adj, app_discount_pct=self.app_discount_pct,
+                           app_fee=self.app_fee, base_fee=self.base_fee)
+
+    def volume_table(self, facts, country_name, has_calls=True, call_strategy=None):
+        """
+        Monthly fact table (aggregation.monthly_facts) -> Dashboard volume columns.
+        Calls are counted with `call_strategy` (default: the country's policy).
+        Per-account facts keep their `cuenta` key: every account is priced on its own.
+        """
+        keys = ['Mes', 'cuenta'] if 'cuenta' in facts.columns else ['Mes']
+        total_sc = facts['SC Total'].to_numpy()
+        app_sc = facts['SC App'].to_numpy()
+        
+        if has_calls:
+            # Valid Calls from CSV + calibrated Efficiency Factor
+            raw_calls = facts[call_columns(call_strategy or self.get_call_strategy(country_name))[0]].to_numpy()
+            factor = self.get_efficiency_factor(country_name)
+            monthly = self.efficiency_monthly.get(country_name)
+            if monthly:
+                factor = facts['Mes'].map(monthly).fillna(factor).to_numpy(dtype=float)
+            valid_calls = raw_calls * factor
+        else:
+            valid_calls = total_sc * self.get_ratio(country_name) # Fallback
+        
+        vol = facts[keys].copy()
+        vol.insert(0, 'Pais', country_name)
+        vol['SC Total'] = total_sc
+        vol['SC App'] = app_sc
+        vol['SC Voz'] = total_sc - app_sc
+        adoption = np.divide(app_sc * 100.0, total_sc, out=np.zeros(len(total_sc)), where=total_sc > 0)
+        vol['Adopcion (%)'] = np.round(adoption, 1)
+        vol['Llamadas Validas'] = np.trunc(valid_calls).astype(np.int64)
+        vol['Cancelado Posterior'] = facts['Cancelado Posterior'].to_numpy()
+        vol['Cancelado Momento'] = facts['Cancelado Momento'].to_numpy()
+        return vol
+
+    def price_table(self, volumes, price_adj=1.0, label='2025'):
+        """Adds the billing columns (Dashboard naming) to a per-month volume table."""
+        p = self.price_volumes(volumes['SC Total'].to_numpy(), volumes['SC App'].to_numpy(),
+                               volumes['Llamadas Validas'].to_numpy(), price_adj)
+        out = volumes.copy()
+        
+        # Detalles 2024
+        out['2024 SC'] = np.round(p['cost_sc_24'], 2)
+        out['2024 LV'] = np.round(p['cost_lv_24'], 2)
+        out['Factura 2024'] = np.round(p['bill_2024'], 2)
+        
+        # Detalles 2025 / 2026
+        out[f'{label} SC Base'] = np.round(p['base_sc_cost'], 2)
+        out[f'{label} Desc.'] = np.round(p['discount'], 2)
+        out[f'{label} App Fee'] = np.round(p['cost_app'], 2)
+        out[f'{label} LV'] = np.round(p['cost_lv_26'], 2)
+        out[f'Factura {label}'] = np.round(p['bill_2026'], 2)
+        
+        out['Ahorro'] = np.round(p['savings'], 2)
+        return out
+
+    def rank_accounts(self, volumes):
+        """
+        Prices a per-account volume table (`country_volumes(by_account=True)`),
+        totals it per (Pais, cuenta) and ranks the accounts by savings.
+        """
+        price_adj = volumes['Pais'].map(self.get_price_adjust).to_numpy(dtype=float)
+        priced = self.price_table(volumes, price_adj, label='2026')
+        cols = ['SC Total', 'SC App', 'Llamadas Validas', 'Factura 2024', 'Factura 2026', 'Ahorro']
+        ranking = priced.groupby(['Pais', 'cuenta'], sort=True)[cols].sum().reset_index()
+        bill_2024 = ranking['Factura 2024'].to_numpy(dtype=float)
+        ranking['Ahorro (%)'] = np.round(np.divide(ranking['Ahorro'].to_numpy(dtype=float) * 100, bill_2024,
+                                                   out=np.zeros(len(ranking)), where=bill_2024 > 0), 2)
+        ranking = ranking.sort_values('Ahorro', ascending=False, kind='stable').reset_index(drop=True)
+        ranking.insert(0, 'Ranking', np.arange(1, len(ranking) + 1))
+        return ranking
+
+    def sweep(self, volumes, discounts, app_fees, base_fees=None, total=False):
+        """
+        Prices a per-month volume table (see `volume_table`) for every combination
+        of `discounts` x `app_fees` x `base_fees` in one broadcast evaluation.
+        Returns a tidy cube: one row per volume row and parameter combination with
+        both bills and the savings, or one row per combination when `total`.
+        """
+        d = np.asarray(discounts, dtype=float).ravel()
+        f = np.asarray(app_fees, dtype=float).ravel()
+        b = np.asarray([self.base_fee] if base_fees is None else base_fees, dtype=float).ravel()
+        price_adj = volumes['Pais'].map(self.get_price_adjust).to_numpy(dtype=float)
+
+        # Volume rows on axis 0, parameters on axes 1..3
+        rows = lambda a: np.asarray(a, dtype=float).reshape(-1, 1, 1, 1)
+        p = price_bills(rows(volumes['SC Total']), rows(volumes['SC App']), rows(volumes['Llamadas Validas']),
+                        self.tiers_sc, self.tiers_lv, self.tiers_app, price_adj=rows(price_adj),
+                        app_discount_pct=d.reshape(1, -1, 1, 1), app_fee=f.reshape(1, 1, -1, 1),
+                        base_fee=b.reshape(1, 1, 1, -1))
+        shape = (len(volumes), len(d), len(f), len(b))
+        bills = {col: np.broadcast_to(p[key], shape) for col, key in
+                 (('Factura 2024', 'bill_2024'), ('Factura 2026', 'bill_2026'), ('Ahorro', 'savings'))}
+
+        if total:
+            # Sum over volume rows before building the frame
+            shape = shape[1:]
+            bills = {col: values.sum(axis=0) for col, values in bills.items()}
+        idx = np.indices(shape).reshape(len(shape), -1)
+
+        keys = [c for c in ('Pais', 'Mes', 'cuenta') if c in volumes.columns]
+        cube = volumes[keys].iloc[idx[0]].reset_index(drop=True) if not total else pd.DataFrame(index=range(idx.shape[1]))
+        cube['app_discount_pct'] = d[idx[-3]]
+        cube['app_fee'] = f[idx[-2]]
+        cube['base_fee'] = b[idx[-1]]
+        for col, values in bills.items():
+            cube[col] = values.ravel()
+        return cube
+
+    def country_volumes(self, file_path, country_name, year_filter=2025, account=None, require_calls=False,
+                        chunksize=None, store=None, call_strategy=None, by_account=False, grouping=None):
+        """
+        Per-month volume table of one extract (optionally a single `cuenta`).
+        With `by_account` one row per month and `cuenta` (every account in one
+        grouped pass), or per account group of `grouping` (aggregation.ACCOUNT_GROUPINGS).
+        With `chunksize` the extract is streamed in chunks instead of loaded whole.
+        With a `store` (result_store.ResultStore) the table is served from it when
+        the extract content and the country's calibration are unchanged.
+        `call_strategy` overrides the country's call counting (see aggregation.CALL_STRATEGIES).
+        """
+        call_strategy = call_strategy or self.get_call_strategy(country_name)
+        if store is not None:
+            return store.fetch('volumes', country_name,
+                               lambda: self.country_volumes(file_path, country_name, year_filter, account,
+                                                            require_calls, chunksize, call_strategy=call_strategy,
+                                                            by_account=by_account, grouping=grouping),
+                               extract=extract_signature(file_path), calibration=self.calibration(country_name),
+                               year=year_filter, account=account, require_calls=require_calls,
+                               call_strategy=call_strategy, by_account=by_account, grouping=grouping)
+        # Column availability from the extract's cached schema profile: fail before any aggregation
+        profile = load_profile(file_path)
+        has_calls = profile['optional_columns']['cantidad_llamadas']
+        if require_calls and not has_calls:
+            raise ValueError(f"CRITICAL: 'cantidad_llamadas' missing for {country_name}. "
+                             f"Available: {list(profile['columns'].values())}")
+        if chunksize:
+            # Bounded-memory path: projected chunked read folded into monthly counters
+            facts = stream_monthly_facts(file_path, country_name, year=year_filter, account=account,
+                                         by_account=by_account, chunksize=chunksize, call_strategy=call_strategy)
+        else:
+            # Stored monthly facts, re-aggregated only for months changed since the last drop
+            _, months, accounts = update_facts(file_path)
+            facts = select_facts(months, accounts, country_name, year_filter, account, by_account=by_account)
+        if by_account and grouping:
+            facts = group_accounts(facts, grouping)
+        return self.volume_table(facts, country_name, has_calls=has_calls, call_strategy=call_strategy)
+
+    def _price_country(self, file_path, country_name, year_filter, chunksize):
+        # LV Logic: FORCE READING FROM CSV
+        # If this crashes, we know EXACTLY why (no silent ratio fallback).
+        volumes = self.country_volumes(file_path, country_name, year_filter, require_calls=True,
+                                       chunksize=chunksize)
+        if volumes.empty: return pd.DataFrame()
+        
+        # Price every month at once
+        return self.price_table(volumes, self.get_price_adjust(country_name), label='2025')
+
+    def process_country(self, file_path, country_name, year_filter=2025, chunksize=None, store=None):
         try:
-            lv_ratio = self.get_ratio(country_name)
-            price_adj = self.get_price_adjust(country_name)
-            
-            df = pd.read_csv(file_path, sep=';', on_bad_lines='skip')
-            # Clean column names to remove accidental whitespace
-            df.columns = df.columns.str.strip()
-            
-            df['date_obj'] = pd.to_datetime(df['creacion_asistencia'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-            
-            # Dynamic Year Filter
-            df = df[df['date_obj'].dt.year == year_filter].copy()
-            
-            if df.empty: return pd.DataFrame() 
-
-            df['month'] = df['date_obj'].dt.to_period('M')
-            
-            app_types = ['APP', 'ANCLAJE APP SOA', 'ANCLAJE', 'ANCLAJE_APP', 'ANCLAJE_APP_SOA']
-            results = []
-            
-            for month, group in df.groupby('month'):
-                sc_df = group[group['estado_asistencia'] == 'CONCLUIDA']
-                total_sc = len(sc_df)
-                app_sc = sc_df[sc_df['tipo_asignacion'].astype(str).str.strip().isin(app_types)].shape[0]
-                voice_sc = total_sc - app_sc
-                
-                valid_calls_total = int(total_sc * lv_ratio)
-
-                # DEBUG: Check LV Logic path
-                # print(f"DEBUG LV {country_name} - Month {month}: Starting LV calculation.")
-                
-                # LV Logic: FORCE READING FROM CSV
-                # We trust the column exists because debug_columns.py proved it.
-                # If this crashes, we know EXACTLY why.
-                
-                if 'cantidad_llamadas' not in group.columns:
-                    raise ValueError(f"CRITICAL: 'cantidad_llamadas' missing for {country_name}. Available: {group.columns.tolist()}")
-
-                raw_calls = pd.to_numeric(group['cantidad_llamadas'], errors='coerce').fillna(0).sum()
-                eff_factor = self.get_efficiency_factor(country_name)
-                valid_calls_total = int(raw_calls * eff_factor)
-                
-                # Remove Fallback logic to prevent silent failures
-                # valid_calls_total = int(total_sc * lv_ratio) <--- DELETED
-
-                # Calculate Cancelled
-                cancelled_df = group[group['estado_asistencia'].astype(str).str.upper().str.contains('CANCEL')]
-                cp = 0
-                cm = 0
-                if not cancelled_df.empty:
-                    if 'usuario_que_asigna' in cancelled_df.columns:
-                         vals = cancelled_df['usuario_que_asigna'].astype(str).str.strip()
-                         # Filter out common null string representations
-                         is_assigned = ~vals.isin(['', 'nan', 'None']) & cancelled_df['usuario_que_asigna'].notna()
-                         cp = is_assigned.sum()
-                         cm = len(cancelled_df) - cp
-                    else:
-                         cm = len(cancelled_df)
-                
-                # 2024 Calculation
-                cost_sc_24 = self.calculate_tier_cost(total_sc, self.tiers_sc, price_adj)
-                cost_lv_24 = self.calculate_tier_cost(valid_calls_total, self.tiers_lv, price_adj)
-                bill_2024 = (self.base_fee * price_adj) + cost_sc_24 + cost_lv_24
-                
-                # 2025 Calculation (Dynamic)
-                base_sc_cost = self.calculate_tier_cost(total_sc, self.tiers_sc, price_adj)
-                discount_amount = 0
-                if total_sc > 0:
-                    app_share = (base_sc_cost * (app_sc / total_sc))
-                    discount_amount = app_share * (self.app_discount_pct / 100.0)
-                
-                cost_sc_25 = base_sc_cost - discount_amount
-                cost_lv_25 = self.calculate_tier_cost(valid_calls_total, self.tiers_lv, price_adj)
-                
-                # Dynamic App Fee
-                ratio_fee = self.app_fee / 0.45 
-                scaled_app_tiers = [(l, p * ratio_fee) for l, p in self.tiers_app]
-                cost_app_25 = self.calculate_tier_cost(app_sc, scaled_app_tiers, 1.0) 
-
-                bill_2025 = (self.base_fee * price_adj) + cost_sc_25 + cost_lv_25 + cost_app_25
-                
-                # Dictionary keys match Dashboard requirements
-                results.append({
-                    'Pais': country_name,
-                    'Mes': str(month),
-                    'SC Total': int(total_sc),
-                    'SC App': int(app_sc),
-                    'SC Voz': int(voice_sc),
-                    'Adopcion (%)': round((app_sc/total_sc*100), 1) if total_sc else 0,
-                    'Llamadas Validas': int(valid_calls_total),
-                    'Cancelado Posterior': int(cp),
-                    'Cancelado Momento': int(cm),
-                    
-                    # Detalles 2024
-                    '2024 SC': round(cost_sc_24, 2),
-                    '2024 LV': round(cost_lv_24, 2),
-                    'Factura 2024': round(bill_2024, 2),
-                    
-                    # Detalles 2025
-                    '2025 SC Base': round(base_sc_cost, 2),
-                    '2025 Desc.': round(discount_amount, 2),
-                    '2025 App Fee': round(cost_app_25, 2),
-                    '2025 LV': round(cost_lv_25, 2),
-                    'Factura 2025': round(bill_2025, 2),
-                    
-                    'Ahorro': round(bill_2024 - bill_2025, 2)
-                })
-                
-            return pd.DataFrame(results)
+            if store is not None:
+                # Precomputed result unless the extract, calibration, tiers or parameters changed
+                return store.fetch('process_country', country_name,
+                                   lambda: self._price_country(file_path, country_name, year_filter, chunksize),
+                                   extract=extract_signature(file_path), calibration=self.calibration(country_name),
+                                   pricing=self.pricing_params(), year=year_filter)
+            return self._price_country(file_path, country_name, year_filter, chunksize)
         except Exception as e:
             print(f"ERROR in process_country for {country_name}: {e}")
             return pd.DataFrame()
@@ -0,0 +1,333 @@
+import glob
+import hashlib
+import json
+import os
+import warnings
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from schema_profile import (DATE_CANDIDATES, DATE_COLUMN, FALLBACK_DATE_COLUMN, MONTH_NA, PROFILE_HEAD_BYTES,
+                            PROFILE_SAMPLE_ROWS, billing_months, month_labels, profile_frame, sniff_dialect)
+
+# Columnar cache for the country extracts (Paises/ClientXX_<Pais>_YYYYMMDD.zip).
+# Each extract is parsed once into a compact Parquet file stored next to it in
+# `.cache/`: only the billing columns, text as categoricals, calls as int32
+# and the billing month as an int16 index (see schema_profile.py). The cache
+# file name embeds a key derived from the source path, size and mtime, so a
+# new or modified zip is re-parsed automatically.
+# Row ids (id_asistencia / id_expediente) are kept as int64 for dedup-aware
+# call counting (see aggregation.CALL_STRATEGIES).
+# Rows are stored sorted by month in row groups of CACHE_ROW_GROUP rows, so a
+# read of a few months (load_extract(months=...)) skips the other row groups.
+# Sidecars: the account index (accounts with their row counts), the month
+# summary (cached columns and a content signature per month, computed once
+# when the cache is built; see fact_store.py) and the schema profile (see
+# schema_profile.py), which records the extract's dialect and columns, so
+# every raw read projects and types exactly the columns it needs.
+
+CACHE_DIR_NAME = '.cache'
+# Bump when the cached layout changes so old cache files are rebuilt
+CACHE_VERSION = 8
+CACHE_ROW_GROUP = 65_536
+# Bump when the profile fields change so old profiles are re-detected
+PROFILE_VERSION = 2
+
+CATEGORICAL_COLUMNS = ['estado_asistencia', 'tipo_asignacion', 'cuenta', 'usuario_que_asigna']
+NUMERIC_COLUMNS = ['cantidad_llamadas']
+# Row identifiers; missing / non-numeric ids are stored as -1
+ID_COLUMNS = ['id_asistencia', 'id_expediente']
+MISSING_ID = -1
+
+# Columns the billing math needs (projection for raw / streaming reads)
+BILLING_COLUMNS = [DATE_COLUMN, FALLBACK_DATE_COLUMN, 'estado_asistencia', 'tipo_asignacion',
+                   'cantidad_llamadas', 'usuario_que_asigna', 'cuenta'] + ID_COLUMNS
+# Cached layout: billing columns with the dates reduced to the month index
+CACHED_COLUMNS = ['month'] + [c for c in BILLING_COLUMNS if c not in (DATE_COLUMN, FALLBACK_DATE_COLUMN)]
+# Billing columns an extract may lack (the calculators fall back without them)
+OPTIONAL_COLUMNS = [c for c in BILLING_COLUMNS if c not in DATE_CANDIDATES]
+
+
+def country_from_filename(file_path):
+    """'Client06_Argentina_20251027.zip' -> 'Argentina'."""
+    name_no_ext = os.path.splitext(os.path.basename(file_path))[0]
+    parts = name_no_ext.split('_')
+    # Skip 'ClientXX' and the 8-digit extract date
+    clean_parts = [p for p in parts[1:] if not (p.isdigit() and len(p) == 8)]
+    return " ".join(clean_parts)
+
+
+def discover_extracts(input_dir="Paises"):
+    """Maps country name -> extract path. Zipped extracts win over loose CSVs."""
+    country_map = {}
+    for pattern in ("Client*.csv", "Client*.zip"):
+        for f in sorted(glob.glob(os.path.join(input_dir, pattern))):
+            country_map[country_from_filename(f)] = f
+    return country_map
+
+
+def cache_key(source_path):
+    stat = os.stat(source_path)
+    raw = f"{os.path.abspath(source_path)}|{stat.st_size}|{stat.st_mtime_ns}|v{CACHE_VERSION}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_path(source_path, cache_dir=None, suffix='parquet'):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(source_path)), CACHE_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(cache_dir, f"{stem}.{cache_key(source_path)}.{suffix}")
+
+
+def canonical_name(column):
+    """Stripped header; any casing of 'cuenta' maps to 'cuenta'."""
+    name = str(column).strip()
+    return 'cuenta' if name.lower() == 'cuenta' else name
+
+
+def read_head(source_path, size=PROFILE_HEAD_BYTES):
+    """First `size` bytes of an extract (of the CSV inside a zipped extract)."""
+    if zipfile.is_zipfile(source_path):
+        with zipfile.ZipFile(source_path) as zf:
+            with zf.open(zf.namelist()[0]) as f:
+                return f.read(size)
+    with open(source_path, 'rb') as f:
+        return f.read(size)
+
+
+def read_profile_sample(source_path, delimiter=';', encoding='utf-8', nrows=PROFILE_SAMPLE_ROWS):
+    """Sample rows as text, with the raw header names (not canonicalized)."""
+    return pd.read_csv(source_path, sep=delimiter, encoding=encoding, on_bad_lines='skip',
+                       nrows=nrows, dtype=str)
+
+
+def profile_extract(source_path):
+    """Schema profile of an extract (see schema_profile.py); `bad_lines` is filled by the full parse."""
+    delimiter, encoding = sniff_dialect(read_head(source_path))
+    sample = read_profile_sample(source_path, delimiter, encoding)
+    columns = {str(raw): canonical_name(raw) for raw in sample.columns}
+    present = set(columns.values())
+    return {
+        'version': PROFILE_VERSION,
+        'delimiter': delimiter,
+        'encoding': encoding,
+        'columns': columns,
+        'optional_columns': {c: c in present for c in OPTIONAL_COLUMNS},
+        **profile_frame(sample.rename(columns=canonical_name)),
+        'bad_lines': None
+    }
+
+
+def _write_json(payload, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = target + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, target)
+
+
+def save_profile(source_path, profile, cache_dir=None):
+    try:
+        _write_json(profile, cache_path(source_path, cache_dir, 'profile.json'))
+    except Exception as e:
+        print(f"Could not write profile for {source_path}: {e}")
+
+
+def load_profile(source_path, cache_dir=None):
+    """Schema profile of an extract, detected once and cached as JSON next to the data."""
+    target = cache_path(source_path, cache_dir, 'profile.json')
+    if os.path.exists(target):
+        try:
+            with open(target, encoding='utf-8') as f:
+                profile = json.load(f)
+            if profile.get('version') == PROFILE_VERSION:
+                return profile
+        except Exception as e:
+            print(f"Profile unreadable for {source_path}, rebuilding: {e}")
+
+    profile = profile_extract(source_path)
+    save_profile(source_path, profile, cache_dir)
+    return profile
+
+
+def has_column(profile, name):
+    """Whether the profiled extract has the canonical column `name`."""
+    return name in profile['columns'].values()
+
+
+def read_args(profile, wanted):
+    """
+    pd.read_csv arguments reading only the `wanted` canonical columns of a
+    profiled extract (text columns as categoricals), plus the raw -> canonical
+    rename map. Of the date columns only the profiled billing date is read.
+    """
+    wanted = [c for c in wanted if c not in DATE_CANDIDATES or c == profile['date_column']]
+    names = {raw: name for raw, name in profile['columns'].items() if name in wanted}
+    args = {
+        'sep': profile['delimiter'],
+        'encoding': profile['encoding'],
+        # Bad lines are skipped with a warning so they can be counted (see count_bad_lines)
+        'on_bad_lines': 'warn',
+        'usecols': list(names),
+        'dtype': {raw: 'category' for raw, name in names.items() if name in CATEGORICAL_COLUMNS}
+    }
+    return args, names
+
+
+def count_bad_lines(caught):
+    """Lines skipped by the parser, from the warnings recorded while reading."""
+    return sum(str(w.message).count('Skipping line') for w in caught
+               if issubclass(w.category, pd.errors.ParserWarning))
+
+
+def read_extract(source_path, profile=None, cache_dir=None):
+    """Parses a raw extract (CSV or zipped CSV) into the compact cached layout."""
+    if profile is None:
+        profile = load_profile(source_path, cache_dir)
+    args, names = read_args(profile, BILLING_COLUMNS)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        df = pd.read_csv(source_path, low_memory=False, **args)
+    df = df.rename(columns=names)
+    bad_lines = count_bad_lines(caught)
+    if profile.get('bad_lines') != bad_lines:
+        profile['bad_lines'] = bad_lines
+        save_profile(source_path, profile, cache_dir)
+
+    # Billing month from the year-month prefix of the profiled date column
+    df['month'] = billing_months(df, profile)
+    df = df[[c for c in CACHED_COLUMNS if c in df.columns]]
+
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            # Missing / non-numeric counts bill as 0 calls
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(np.int32)
+    for col in ID_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(MISSING_ID).astype(np.int64)
+
+    # Contiguous rows per month (see CACHE_ROW_GROUP)
+    return df.sort_values('month', kind='stable').reset_index(drop=True)
+
+
+def build_account_index(df):
+    """Distinct accounts with their row count."""
+    if 'cuenta' not in df.columns or len(df) == 0:
+        return pd.DataFrame({'cuenta': pd.Series(dtype=str), 'rows': pd.Series(dtype='int64')})
+    codes = df['cuenta'].cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(df['cuenta'].cat.categories))
+    index = pd.DataFrame({
+        'cuenta': df['cuenta'].cat.categories.astype(str),
+        'rows': counts
+    })
+    return index[index['rows'] > 0].reset_index(drop=True)
+
+
+def _drop_stale(target):
+    # Remove cache files (data and sidecars) of previous versions of the same extract
+    stem, key = os.path.basename(target).split('.')[:2]
+    for f in glob.glob(os.path.join(os.path.dirname(target), stem + '.*')):
+        if os.path.basename(f).split('.')[1] != key:
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+
+def _write_parquet(df, target, **kwargs):
+    tmp = target + '.tmp'
+    df.to_parquet(tmp, index=False, **kwargs)
+    os.replace(tmp, target)
+
+
+def month_signatures(df):
+    """Row count and wrapping uint64 sum of the cached-column row hashes, per month."""
+    valid = df['month'].to_numpy() != MONTH_NA
+    if not valid.any():
+        return {}
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()[valid]
+    codes, months = pd.factorize(df['month'].to_numpy()[valid])
+
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(months))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    # Sum (not XOR) so duplicated rows still change the signature; uint64 wraps
+    sums = np.add.reduceat(hashes[order], starts)
+    return {m: [int(n), int(h)] for m, n, h in zip(month_labels(months), counts, sums)}
+
+
+def month_summary(df):
+    """Cached columns (without `month`) and the signature of every month of a cached frame."""
+    return {'columns': [c for c in df.columns if c != 'month'], 'months': month_signatures(df)}
+
+
+def load_extract(source_path, columns=None, cache_dir=None, months=None):
+    """
+    Returns the typed frame for an extract, reading the Parquet cache when it
+    is up to date and rebuilding it otherwise. `columns` projects the read;
+    `months` (month indexes) keeps only those months' rows.
+    """
+    target = cache_path(source_path, cache_dir)
+    filters = None if months is None else [('month', 'in', [int(m) for m in months])]
+    if os.path.exists(target):
+        try:
+            if columns is not None:
+                import pyarrow.parquet as pq
+                available = set(pq.read_schema(target).names)
+                columns = [c for c in columns if c in available]
+            return pd.read_parquet(target, columns=columns, filters=filters)
+        except Exception as e:
+            print(f"Cache unreadable for {source_path}, rebuilding: {e}")
+
+    df = read_extract(source_path, load_profile(source_path, cache_dir), cache_dir)
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write_parquet(build_account_index(df), cache_path(source_path, cache_dir, 'accounts.parquet'))
+        # The month signatures are computed here, while the frame is in memory
+        _write_json(month_summary(df), cache_path(source_path, cache_dir, 'months.json'))
+        _write_parquet(df, target, row_group_size=CACHE_ROW_GROUP)
+        _drop_stale(target)
+    except Exception as e:
+        # Read-only deploys or missing pyarrow: serve the parsed frame uncached
+        print(f"Could not write cache for {source_path}: {e}")
+
+    if months is not None:
+        df = df[df['month'].isin(months)]
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
+def load_account_index(source_path, cache_dir=None):
+    """Account index persisted alongside the cached extract (built on first use)."""
+    target = cache_path(source_path, cache_dir, 'accounts.parquet')
+    if os.path.exists(target):
+        try:
+            return pd.read_parquet(target)
+        except Exception as e:
+            print(f"Account index unreadable for {source_path}, rebuilding: {e}")
+    return build_account_index(load_extract(source_path, cache_dir=cache_dir))
+
+
+def load_month_summary(source_path, cache_dir=None):
+    """
+    `month_summary` of an extract, persisted next to its Parquet cache: read
+    without loading or hashing the cached rows (built with the cache).
+    """
+    target = cache_path(source_path, cache_dir, 'months.json')
+    df = None
+    if not os.path.exists(target):
+        # Rebuilding the Parquet cache writes the summary too
+        df = load_extract(source_path, cache_dir=cache_dir)
+    try:
+        with open(target, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Month summary unavailable for {source_path}, rebuilding: {e}")
+    summary = month_summary(load_extract(source_path, cache_dir=cache_dir) if df is None else df)
+    try:
+        _write_json(summary, target)
+    except Exception as e:
+        print(f"Could not write month summary for {source_path}: {e}")
+    return summary
@@ -0,0 +1,175 @@
+import io
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# Streaming .xlsx writer (xlsxwriter constant_memory mode).
+# Rows are flushed to a per-sheet temp file as they are written, so memory
+# stays flat however many rows a report has; the only rule is that rows of a
+# sheet are written top to bottom. Sheets are independent, so a summary sheet
+# can grow alongside its detail sheet. Cells can be native Excel formulas
+# (with the computed value cached, so readers that do not recalculate still
+# see it) and every column carries a number format instead of rounded floats.
+
+# Number formats by name (column specs refer to these)
+FORMATS = {
+    'header': {'bold': True, 'bg_color': '#DDEBF7', 'border': 1},
+    'int': {'num_format': '#,##0'},
+    'number': {'num_format': '#,##0.00'},
+    'money': {'num_format': '$#,##0.00'},
+    'pct': {'num_format': '0.00%'},
+    'factor': {'num_format': '0.000'},
+    'total_label': {'bold': True, 'top': 1},
+    'total_int': {'bold': True, 'top': 1, 'num_format': '#,##0'},
+    'total_money': {'bold': True, 'top': 1, 'num_format': '$#,##0.00'},
+    'total_pct': {'bold': True, 'top': 1, 'num_format': '0.00%'}
+}
+
+# A formula cell: Excel formula text plus the value cached in the file
+Formula = namedtuple('Formula', ['text', 'value'])
+
+
+def column_letter(index):
+    """0-based column index -> Excel letters (0 -> 'A', 27 -> 'AB')."""
+    return xlsxwriter.utility.xl_col_to_name(index)
+
+
+def infer_formats(df):
+    """Default format per column from its dtype (ints / floats / text)."""
+    formats = {}
+    for col in df.columns:
+        if pd.api.types.is_bool_dtype(df[col]):
+            formats[col] = None
+        elif pd.api.types.is_integer_dtype(df[col]):
+            formats[col] = 'int'
+        elif pd.api.types.is_float_dtype(df[col]):
+            formats[col] = 'number'
+        else:
+            formats[col] = None
+    return formats
+
+
+def _cell_values(series):
+    """Column -> list of plain Python values, missing values as None."""
+    values = series.astype(object).to_numpy()
+    missing = series.isna().to_numpy()
+    if missing.any():
+        values = values.copy()
+        values[missing] = None
+    return values.tolist()
+
+
+class ReportWriter:
+    def __init__(self, target):
+        """`target` is a file path or a binary buffer (e.g. io.BytesIO)."""
+        self.workbook = xlsxwriter.Workbook(target, {'constant_memory': True,
+                                                     'default_date_format': 'yyyy-mm-dd',
+                                                     # Text cells stay text (no '=...' formulas or URL limits)
+                                                     'strings_to_formulas': False,
+                                                     'strings_to_urls': False})
+        self.formats = {name: self.workbook.add_format(spec) for name, spec in FORMATS.items()}
+        self.sheets = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_sheet(self, name, columns, formats=None, widths=None):
+        """
+        New sheet with a header row. `formats` maps column -> FORMATS name
+        (None = general); `widths` maps column -> width in characters.
+        """
+        formats = formats or {}
+        widths = widths or {}
+        sheet = self.workbook.add_worksheet(name)
+        for j, col in enumerate(columns):
+            sheet.set_column(j, j, widths.get(col, max(12, len(str(col)) + 2)))
+            sheet.write_string(0, j, str(col), self.formats['header'])
+        sheet.freeze_panes(1, 0)
+        self.sheets[name] = {
+            'sheet': sheet,
+            'columns': list(columns),
+            'formats': [self.formats.get(formats.get(col)) for col in columns],
+            'row': 1
+        }
+        return sheet
+
+    def write_row(self, name, values, formats=None):
+        """Appends one row (a list aligned with the columns); returns its Excel row number."""
+        state = self.sheets[name]
+        sheet, row = state['sheet'], state['row']
+        cell_formats = [self.formats.get(f) for f in formats] if formats else state['formats']
+        for j, value in enumerate(values):
+            fmt = cell_formats[j]
+            if isinstance(value, Formula):
+                sheet.write_formula(row, j, value.text, fmt, value.value)
+            elif value is None or (isinstance(value, float) and not np.isfinite(value)):
+                sheet.write_blank(row, j, None, fmt)
+            else:
+                sheet.write(row, j, value, fmt)
+        state['row'] = row + 1
+        return row + 1
+
+    def write_frame(self, name, df, formulas=None):
+        """
+        Appends every row of `df` (columns in sheet order; missing ones are
+        blank). `formulas` maps column -> template using {r} for the Excel
+        row number (e.g. '=H{r}-I{r}'); the cached value is taken from `df`
+        when it has that column. Returns the (first, last) Excel rows written.
+        """
+        state = self.sheets[name]
+        sheet, formats = state['sheet'], state['formats']
+        formulas = formulas or {}
+        columns = state['columns']
+        n = len(df)
+        first = state['row'] + 1
+        # One typed writer per column instead of per-cell type dispatch
+        cells = []
+        for j, col in enumerate(columns):
+            values = _cell_values(df[col]) if col in df.columns else [None] * n
+            if formulas.get(col):
+                cells.append(('formula', values, formulas[col]))
+            elif col in df.columns and pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+                cells.append(('number', values, None))
+            elif col in df.columns and pd.api.types.is_string_dtype(df[col]):
+                cells.append(('string', values, None))
+            else:
+                cells.append(('any', values, None))
+        for i in range(n):
+            row = first - 1 + i
+            for j, (kind, values, template) in enumerate(cells):
+                value = values[i]
+                if kind == 'formula':
+                    sheet.write_formula(row, j, template.format(r=row + 1), formats[j], value)
+                elif value is None or (kind == 'number' and not np.isfinite(value)):
+                    sheet.write_blank(row, j, None, formats[j])
+                elif kind == 'number':
+                    sheet.write_number(row, j, value, formats[j])
+                elif kind == 'string':
+                    sheet.write_string(row, j, value, formats[j])
+                else:
+                    sheet.write(row, j, value, formats[j])
+        state['row'] += n
+        return first, first + n - 1
+
+    def close(self):
+        self.workbook.close()
+
+
+def frame_to_xlsx(df, sheet_name='Datos', formats=None, formulas=None, chunksize=None):
+    """
+    Single-sheet workbook of `df` as bytes (e.g. for a download button).
+    With `chunksize` rows are written in slices of that many rows, so only one
+    slice is converted to cell values at a time.
+    """
+    buf = io.BytesIO()
+    with ReportWriter(buf) as writer:
+        writer.add_sheet(sheet_name, list(df.columns), {**infer_formats(df), **(formats or {})})
+        step = chunksize or max(len(df), 1)
+        for start in range(0, max(len(df), 1), step):
+            writer.write_frame(sheet_name, df.iloc[start:start + step], formulas)
+    return buf.getvalue()
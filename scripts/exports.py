@@ -0,0 +1,52 @@
+import io
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from excel_report import frame_to_xlsx
+
+# In-memory exports of an already computed table (CSV, Parquet, XLSX).
+# The table is serialized in row chunks: CSV text is appended per chunk,
+# Parquet gets one row group per chunk and XLSX rows go through the
+# constant-memory ReportWriter (excel_report.frame_to_xlsx), so large views
+# never need a second full copy.
+
+# format -> (MIME type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+}
+
+EXPORT_CHUNKSIZE = 50_000
+
+
+def iter_chunks(df, chunksize=EXPORT_CHUNKSIZE):
+    for start in range(0, max(len(df), 1), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def export_frame(df, fmt, chunksize=EXPORT_CHUNKSIZE, sheet_name='Datos'):
+    """`df` serialized as `fmt` (see EXPORT_FORMATS), as bytes."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected {list(EXPORT_FORMATS)})")
+    if fmt == 'xlsx':
+        return frame_to_xlsx(df, sheet_name, chunksize=chunksize)
+    buf = io.BytesIO()
+    if fmt == 'csv':
+        # utf-8-sig: Excel opens accented names correctly
+        text = io.TextIOWrapper(buf, encoding='utf-8-sig', newline='')
+        for i, chunk in enumerate(iter_chunks(df, chunksize)):
+            chunk.to_csv(text, index=False, header=i == 0)
+        text.flush()
+        text.detach()
+    else:
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(buf, schema) as writer:
+            for chunk in iter_chunks(df, chunksize):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    return buf.getvalue()
@@ -0,0 +1,183 @@
+import json
+import os
+import re
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import monthly_facts
+from data_cache import (CACHE_DIR_NAME, CACHE_VERSION, CACHED_COLUMNS, cache_key,
+                        discover_extracts, load_extract, load_month_summary)
+from schema_profile import month_index
+
+# Incremental fact store.
+# Every extract drop (ClientXX_<Pais>_YYYYMMDD.zip) re-sends the full history,
+# but closed months rarely change. The store keeps the aggregated facts of the
+# last processed drop of each series (ClientXX_<Pais>) plus a signature per
+# month (row count + order-independent row hash). When a newer drop arrives
+# only months whose signature changed, new months and the open month of the
+# drop are re-aggregated; every other month is reused as is.
+# The signatures are computed once, when a drop is parsed into the Parquet
+# cache, and stored beside it (data_cache.load_month_summary): a new drop still
+# pays that one-time parse, but unchanged months are then neither read back
+# from the cache nor re-hashed here.
+
+FACT_STORE_DIR = 'facts'
+# Bump when the layout of the stored facts changes (stored series are rebuilt)
+FACTS_VERSION = 2
+
+_DATE_SUFFIX = re.compile(r'_(\d{8})$')
+
+
+def extract_date(file_path):
+    """'Client06_Argentina_20251027.zip' -> '20251027' (None if the name has no date)."""
+    match = _DATE_SUFFIX.search(os.path.splitext(os.path.basename(file_path))[0])
+    return match.group(1) if match else None
+
+
+def series_name(file_path):
+    """'Client06_Argentina_20251027.zip' -> 'Client06_Argentina' (same series across drops)."""
+    return _DATE_SUFFIX.sub('', os.path.splitext(os.path.basename(file_path))[0])
+
+
+def store_paths(source_path, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(source_path)), CACHE_DIR_NAME)
+    base = os.path.join(cache_dir, FACT_STORE_DIR, series_name(source_path))
+    return {
+        'state': base + '.state.json',
+        'months': base + '.months.parquet',
+        'accounts': base + '.accounts.parquet'
+    }
+
+
+def _load_state(paths):
+    try:
+        with open(paths['state'], encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('cache_version') != CACHE_VERSION or state.get('facts_version') != FACTS_VERSION:
+            return None
+        return state, pd.read_parquet(paths['months']), pd.read_parquet(paths['accounts'])
+    except Exception:
+        return None
+
+
+def _save_state(paths, state, months, accounts):
+    os.makedirs(os.path.dirname(paths['state']), exist_ok=True)
+    for key, df in (('months', months), ('accounts', accounts)):
+        tmp = paths[key] + '.tmp'
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, paths[key])
+    tmp = paths['state'] + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, paths['state'])
+
+
+def update_facts(source_path, cache_dir=None, verbose=False):
+    """
+    Brings the stored facts of `source_path`'s series up to date and returns
+    `(state, month_facts, account_facts)`. Facts cover every month of the
+    extract; `state['refreshed']` lists the months re-aggregated by this call.
+    """
+    paths = store_paths(source_path, cache_dir)
+    source_key = cache_key(source_path)
+    stored = _load_state(paths)
+    if stored is not None and stored[0]['source_key'] == source_key:
+        state, months, accounts = stored
+        state['refreshed'] = []
+        return state, months, accounts
+
+    summary = load_month_summary(source_path, cache_dir)
+    signatures = summary['months']
+    has_accounts = 'cuenta' in summary['columns']
+    date = extract_date(source_path)
+    # The month of the drop is still open: always re-aggregated
+    open_month = f"{date[:4]}-{date[4:6]}" if date else None
+
+    if stored is None:
+        refresh = set(signatures)
+        months = accounts = None
+    else:
+        prev_state, months, accounts = stored
+        prev = prev_state['months']
+        refresh = {m for m, sig in signatures.items() if prev.get(m) != sig}
+        if open_month in signatures:
+            refresh.add(open_month)
+        # Months no longer present in the drop are dropped from the store
+        keep = [m for m in signatures if m not in refresh]
+        months = months[months['Mes'].isin(keep)]
+        accounts = accounts[accounts['Mes'].isin(keep)]
+
+    # Only the refreshed months' row groups are read from the cache
+    subset = load_extract(source_path, columns=CACHED_COLUMNS, cache_dir=cache_dir,
+                          months=[month_index(m) for m in refresh])
+    if refresh:
+        new_months = monthly_facts(subset)
+        new_accounts = monthly_facts(subset, by_account=True) if has_accounts else None
+        months = new_months if months is None else pd.concat([months, new_months])
+        if new_accounts is not None:
+            accounts = new_accounts if accounts is None else pd.concat([accounts, new_accounts])
+    if months is None:
+        months = monthly_facts(subset.iloc[0:0])
+    if accounts is None:
+        accounts = monthly_facts(subset.iloc[0:0].assign(cuenta=pd.Series(dtype=str)), by_account=True)
+
+    months = months.sort_values('Mes', kind='stable').reset_index(drop=True)
+    accounts = accounts.sort_values(['Mes', 'cuenta'], kind='stable').reset_index(drop=True)
+    state = {
+        'cache_version': CACHE_VERSION,
+        'facts_version': FACTS_VERSION,
+        'series': series_name(source_path),
+        'extract_date': date,
+        'source_key': source_key,
+        'columns': summary['columns'],
+        'months': signatures,
+        'refreshed': sorted(refresh)
+    }
+    try:
+        _save_state(paths, state, months, accounts)
+    except Exception as e:
+        print(f"Could not write fact store for {source_path}: {e}")
+    if verbose:
+        print(f"{state['series']}: re-aggregated {len(refresh)}/{len(signatures)} months")
+    return state, months, accounts
+
+
+def select_facts(months, accounts, country=None, year=None, account=None, by_account=False):
+    """
+    Year / account slice of stored facts, in the `monthly_facts` layout
+    (every account, with its `cuenta` column, when `by_account`).
+    """
+    if by_account:
+        facts = accounts
+    elif account is not None:
+        facts = accounts[accounts['cuenta'] == account].drop(columns='cuenta')
+    else:
+        facts = months
+    if year is not None:
+        facts = facts[facts['Mes'].str[:4] == str(year)]
+    facts = facts.reset_index(drop=True)
+    if country is not None:
+        facts.insert(0, 'Pais', country)
+    return facts
+
+
+def refresh_all(input_dir='Paises'):
+    for country, f in discover_extracts(input_dir).items():
+        start = time.perf_counter()
+        state, months, _ = update_facts(f)
+        print(f"{country:<20} | drop {state['extract_date']} | "
+              f"{len(state['refreshed']):>3}/{len(months):<3} months re-aggregated | "
+              f"{time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refreshes the incremental monthly fact store.")
+    parser.add_argument('--input-dir', default='Paises')
+    args = parser.parse_args()
+    refresh_all(args.input_dir)
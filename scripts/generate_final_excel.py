@@ -1,165 +1,162 @@
 import pandas as pd
-import glob
+import numpy as np
 import os
-import datetime
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import call_columns, monthly_facts
+from data_cache import discover_extracts, load_extract
+from excel_report import Formula, ReportWriter, column_letter
+from policy import load_policy
+from pricing import price_bills
+from result_store import ResultStore, default_path, extract_signature
+
+DETAIL_COLUMNS = ['Pais', 'Mes', 'SC_Total', 'SC_App', 'Adopcion_App_%', 'Llamadas_Validas_Est', 'Factor_LV_Usado',
+                  'Facturacion_2024_USD', 'Facturacion_2025_USD', 'Diferencia_USD']
+# What country_details returns (and the result store keeps); the rest is derived when writing
+DETAIL_INPUTS = ['Pais', 'Mes', 'SC_Total', 'SC_App', 'Llamadas_Validas_Est', 'Factor_LV_Usado',
+                 'bill_2024', 'bill_2025']
+
+REPORT_PATH = 'Final_Global_Report_Voccare_2025.xlsx'
+
+# Workbook layout: number formats and native formulas per column
+SUMMARY_SHEET = 'Resumen Ejecutivo'
+DETAIL_SHEET = 'Detalle Mensual'
+SUMMARY_COLUMNS = ['Pais', 'Total_2024', 'Total_2025', 'Ahorro_Total', 'Ahorro_%']
+SUMMARY_FORMATS = {'Total_2024': 'money', 'Total_2025': 'money', 'Ahorro_Total': 'money', 'Ahorro_%': 'pct'}
+DETAIL_FORMATS = {'SC_Total': 'int', 'SC_App': 'int', 'Adopcion_App_%': 'pct', 'Llamadas_Validas_Est': 'int',
+                  'Factor_LV_Usado': 'factor', 'Facturacion_2024_USD': 'money', 'Facturacion_2025_USD': 'money',
+                  'Diferencia_USD': 'money'}
+DETAIL_LETTERS = {col: column_letter(j) for j, col in enumerate(DETAIL_COLUMNS)}
+DETAIL_FORMULAS = {
+    'Adopcion_App_%': "=IF({sc}{{r}}=0,0,{app}{{r}}/{sc}{{r}})".format(sc=DETAIL_LETTERS['SC_Total'],
+                                                                       app=DETAIL_LETTERS['SC_App']),
+    'Diferencia_USD': "={b24}{{r}}-{b25}{{r}}".format(b24=DETAIL_LETTERS['Facturacion_2024_USD'],
+                                                    b25=DETAIL_LETTERS['Facturacion_2025_USD'])
+}
 
 class GlobalReportGenerator:
-    def __init__(self):
-        self.tiers_sc = [
-            (50, 0.00), (500, 10.51), (1000, 9.28), (2000, 8.04),
-            (3000, 6.80), (6000, 5.57), (9000, 5.26), (12000, 4.95),
-            (15000, 4.64), (float('inf'), 4.33)
-        ]
-        self.tiers_lv = [
-            (4000, 0.80), (20000, 0.37), (float('inf'), 0.19)
-        ]
-        self.tiers_app = [
-            (5000, 0.45), (20000, 0.35), (float('inf'), 0.20)
-        ]
-        self.base_fee = 3150.00
+    def __init__(self, policy=None):
+        policy = policy or load_policy()
+        self.tiers_sc = policy.tiers['sc']
+        self.tiers_lv = policy.tiers['lv']
+        self.tiers_app = policy.tiers['app']
+        self.base_fee = policy.base_fee
         
         # Final Calibrated Factors (LV calculated from Concluded Services only)
-        self.country_factors = {
-            "Puerto Rico": 0.50,
-            "Dominicana": 0.57,
-            "Salvador": 1.00,
-            "Mexico": 0.29,
-            "Argentina": 0.64,
-            "Costa Rica": 0.30,
-            "Ecuador": 1.00,
-            "Chile": 0.74,
-            "Uruguay": 0.50,
-            "Bolivia": 0.43,
-            "Guatemala": 1.00,
-            "Peru": 1.00,
-            "default": 0.40
-        }
+        self.country_factors = policy.factors('final_report')
+        self.policy = policy
 
     def get_factor(self, country):
         return self.country_factors.get(country, self.country_factors['default'])
 
-    def calculate_tier_cost(self, volume, tiers):
-        remaining = volume
-        total_cost = 0.0
-        current_tier_start = 0
-        for limit, price in tiers:
-            if remaining <= 0: break
-            tier_capacity = limit - current_tier_start
-            count = min(remaining, tier_capacity)
-            total_cost += count * price
-            remaining -= count
-            current_tier_start = limit
-        return total_cost
-
-    def calculate_sc_cost_2025(self, total_volume, app_volume):
-        base_cost = self.calculate_tier_cost(total_volume, self.tiers_sc)
-        if total_volume == 0: return 0.0
-        app_ratio = app_volume / total_volume
-        app_base_cost = base_cost * app_ratio
-        discount = app_base_cost * 0.10
-        return base_cost - discount
-
-    def process_all(self, input_dir="Paises/"):
-        all_data = []
-        summary_data = []
+    def country_details(self, file_path, country_name):
+        """
+        Monthly inputs of one country's detail rows (DETAIL_INPUTS): volumes,
+        valid calls, the factor used and the unrounded bills.
+        """
+        df = load_extract(file_path)
+        
+        # Date Filter (Jan-Oct 2025) + monthly aggregation in one grouped pass
+        facts = monthly_facts(df, country_name, year=2025)
+        total_sc = facts['SC Total'].to_numpy()
+        app_sc = facts['SC App'].to_numpy()
         
-        files = glob.glob(os.path.join(input_dir, "*.csv"))
-        print(f"Found {len(files)} files to process.")
+        # LV Logic: Calls from Concluded Services ONLY * Factor
+        calls_sc = facts[call_columns(self.policy.call_strategy(country_name))[1]].to_numpy()
+        # Calibrated per-month factors where fitted, else the country factor
+        month_factors = np.asarray(self.policy.month_factors('final_report', country_name, facts['Mes']), dtype=float)
+        valid_calls = (calls_sc * month_factors).astype(int)
         
-        for file_path in files:
-            try:
-                # Extract Country Name
-                filename = os.path.basename(file_path)
-                parts = filename.split('_')
-                if len(parts) > 2:
-                    # Handles "Client01_Puerto_Rico_..." -> "Puerto Rico"
-                    # Handles "Client05_Mexico_..." -> "Mexico"
-                    # Logic: Join parts between Index 1 and Index of Year (usually starts with 20)
-                    country_parts = []
-                    for p in parts[1:]:
-                        if p.isdigit() and len(p) == 8: break # Date part
-                        country_parts.append(p)
-                    country_name = " ".join(country_parts)
-                else:
-                    country_name = "Unknown"
+        # 2024 / 2025 bills for every month at once (10% App discount, $0.45 App fee)
+        bills = price_bills(total_sc, app_sc, valid_calls, self.tiers_sc, self.tiers_lv, self.tiers_app,
+                            app_discount_pct=10, base_fee=self.base_fee)
+        
+        # Adoption, bill and difference columns are written by write_details (formulas where they have one)
+        return pd.DataFrame({
+            'Pais': country_name,
+            'Mes': facts['Mes'].to_numpy(),
+            'SC_Total': total_sc.astype(int),
+            'SC_App': app_sc.astype(int),
+            'Llamadas_Validas_Est': valid_calls,
+            'Factor_LV_Usado': month_factors,
+            'bill_2024': bills['bill_2024'],
+            'bill_2025': bills['bill_2026']
+        }, columns=DETAIL_INPUTS)
 
-                print(f"Processing {country_name}...")
-                
-                factor = self.get_factor(country_name)
-                df = pd.read_csv(file_path, sep=';', on_bad_lines='skip')
-                
-                # Date Filter (Jan-Oct 2025)
-                df['date_obj'] = pd.to_datetime(df['creacion_asistencia'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-                df = df[df['date_obj'].dt.year == 2025].copy()
-                df['month'] = df['date_obj'].dt.to_period('M')
-                
-                app_types = ['APP', 'ANCLAJE APP SOA', 'ANCLAJE', 'ANCLAJE_APP', 'ANCLAJE_APP_SOA']
-                
-                country_total_2024 = 0
-                country_total_2025 = 0
-                
-                for month, group in df.groupby('month'):
-                    sc_df = group[group['estado_asistencia'] == 'CONCLUIDA']
-                    total_sc = len(sc_df)
-                    app_sc = sc_df[sc_df['tipo_asignacion'].astype(str).str.strip().isin(app_types)].shape[0]
-                    
-                    # LV Logic: Calls from Concluded Services ONLY * Factor
-                    raw_calls_sc = sc_df['cantidad_llamadas'].sum() if 'cantidad_llamadas' in sc_df.columns else 0
-                    valid_calls = int(raw_calls_sc * factor)
-                    
-                    # 2024 Bill
-                    cost_sc_24 = self.calculate_tier_cost(total_sc, self.tiers_sc)
-                    cost_lv_24 = self.calculate_tier_cost(valid_calls, self.tiers_lv)
-                    bill_2024 = self.base_fee + cost_sc_24 + cost_lv_24
-                    
-                    # 2025 Bill
-                    cost_sc_25 = self.calculate_sc_cost_2025(total_sc, app_sc)
-                    cost_lv_25 = self.calculate_tier_cost(valid_calls, self.tiers_lv)
-                    cost_app_25 = self.calculate_tier_cost(app_sc, self.tiers_app)
-                    bill_2025 = self.base_fee + cost_sc_25 + cost_lv_25 + cost_app_25
+    def process_all(self, input_dir="Paises/", use_store=True, output_path=REPORT_PATH):
+        extracts = discover_extracts(input_dir)
+        print(f"Found {len(extracts)} files to process.")
+        # Precomputed country results are reused unless the extract, factor or tiers changed
+        store = ResultStore(default_path(input_dir)) if use_store else None
+        
+        # Rows are streamed to the workbook as each country finishes (constant memory)
+        with ReportWriter(output_path) as writer:
+            writer.add_sheet(SUMMARY_SHEET, SUMMARY_COLUMNS, SUMMARY_FORMATS, widths={'Pais': 18})
+            writer.add_sheet(DETAIL_SHEET, DETAIL_COLUMNS, DETAIL_FORMATS, widths={'Pais': 18})
+            total_2024 = total_2025 = 0.0
+            
+            for country_name, file_path in extracts.items():
+                try:
+                    print(f"Processing {country_name}...")
                     
-                    row = {
-                        'Pais': country_name,
-                        'Mes': str(month),
-                        'SC_Total': total_sc,
-                        'SC_App': app_sc,
-                        'Adopcion_App_%': round((app_sc/total_sc*100), 2) if total_sc else 0,
-                        'Llamadas_Validas_Est': valid_calls,
-                        'Factor_LV_Usado': factor,
-                        'Facturacion_2024_USD': round(bill_2024, 2),
-                        'Facturacion_2025_USD': round(bill_2025, 2),
-                        'Diferencia_USD': round(bill_2024 - bill_2025, 2)
-                    }
-                    all_data.append(row)
+                    compute = lambda: self.country_details(file_path, country_name)
+                    if store is not None:
+                        details = store.fetch('final_report', country_name, compute,
+                                              extract=extract_signature(file_path), factor=self.get_factor(country_name),
+                                              monthly=self.policy.monthly.get('final_report', {}).get(country_name),
+                                              call_strategy=self.policy.call_strategy(country_name),
+                                              tiers=[self.tiers_sc, self.tiers_lv, self.tiers_app],
+                                              base_fee=self.base_fee, app_discount_pct=10, year=2025)
+                    else:
+                        details = compute()
+                    first, last = self.write_details(writer, details)
                     
-                    country_total_2024 += bill_2024
-                    country_total_2025 += bill_2025
+                    country_total_2024 = float(details['bill_2024'].sum())
+                    country_total_2025 = float(details['bill_2025'].sum())
+                    total_2024 += country_total_2024
+                    total_2025 += country_total_2025
 
-                # Summary Row
-                summary_data.append({
-                    'Pais': country_name,
-                    'Total_2024': round(country_total_2024, 2),
-                    'Total_2025': round(country_total_2025, 2),
-                    'Ahorro_Total': round(country_total_2024 - country_total_2025, 2),
-                    'Ahorro_%': round(((country_total_2024 - country_total_2025)/country_total_2024 * 100), 2) if country_total_2024 else 0
-                })
+                    # Summary Row: totals are SUMs over the country's detail rows
+                    r = writer.sheets[SUMMARY_SHEET]['row'] + 1
+                    detail_sum = lambda col: (f"=SUM('{DETAIL_SHEET}'!{col}{first}:{col}{last})" if last >= first else "=0")
+                    writer.write_row(SUMMARY_SHEET, [
+                        country_name,
+                        Formula(detail_sum(DETAIL_LETTERS['Facturacion_2024_USD']), country_total_2024),
+                        Formula(detail_sum(DETAIL_LETTERS['Facturacion_2025_USD']), country_total_2025),
+                        Formula(f"=B{r}-C{r}", country_total_2024 - country_total_2025),
+                        Formula(f"=IF(B{r}=0,0,D{r}/B{r})",
+                                (country_total_2024 - country_total_2025) / country_total_2024 if country_total_2024 else 0)
+                    ])
 
-            except Exception as e:
-                print(f"Error processing {file_path}: {e}")
+                except Exception as e:
+                    print(f"Error processing {file_path}: {e}")
 
-        # Create Excel
-        print("Generating Excel...")
-        # Using default engine (openpyxl usually)
-        with pd.ExcelWriter('Final_Global_Report_Voccare_2025.xlsx') as writer:
-            # Sheet 1: Summary
-            df_summary = pd.DataFrame(summary_data)
-            df_summary.to_excel(writer, sheet_name='Resumen Ejecutivo', index=False)
+            # Grand total row
+            last = writer.sheets[SUMMARY_SHEET]['row']
+            r = last + 1
+            writer.write_row(SUMMARY_SHEET, [
+                'TOTAL',
+                Formula(f"=SUM(B2:B{last})", total_2024),
+                Formula(f"=SUM(C2:C{last})", total_2025),
+                Formula(f"=B{r}-C{r}", total_2024 - total_2025),
+                Formula(f"=IF(B{r}=0,0,D{r}/B{r})", (total_2024 - total_2025) / total_2024 if total_2024 else 0)
+            ], formats=['total_label', 'total_money', 'total_money', 'total_money', 'total_pct'])
             
-            # Sheet 2: Details
-            df_details = pd.DataFrame(all_data)
-            df_details.to_excel(writer, sheet_name='Detalle Mensual', index=False)
-            
-        print("Report generated: Final_Global_Report_Voccare_2025.xlsx")
+        print(f"Report generated: {output_path}")
+
+    def write_details(self, writer, details):
+        """Detail rows of one country: unrounded bills, adoption and difference as formulas."""
+        sc = details['SC_Total'].to_numpy(dtype=float)
+        app = details['SC_App'].to_numpy(dtype=float)
+        rows = details.assign(**{
+            'Adopcion_App_%': np.divide(app, sc, out=np.zeros(len(details)), where=sc > 0),
+            'Facturacion_2024_USD': details['bill_2024'],
+            'Facturacion_2025_USD': details['bill_2025'],
+            'Diferencia_USD': details['bill_2024'] - details['bill_2025']
+        })[DETAIL_COLUMNS]
+        return writer.write_frame(DETAIL_SHEET, rows, DETAIL_FORMULAS)
 
 if __name__ == "__main__":
     gen = GlobalReportGenerator()
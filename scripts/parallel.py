@@ -0,0 +1,36 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def map_countries(func, tasks, jobs=None, use_processes=False):
+    """
+    Runs `func(*args)` for every `(country, args)` in `tasks` on a worker pool.
+
+    Threads are the default: Parquet reads (pyarrow) and the pandas C parser
+    release the GIL for most of the work. `use_processes` switches to a process
+    pool, in which case `func` and its arguments must be picklable.
+
+    Returns `(results, errors)`, two dicts keyed by country in task order, so
+    merges are deterministic regardless of completion order.
+    """
+    tasks = list(tasks)
+    results, errors = {}, {}
+    workers = min(jobs or os.cpu_count() or 1, max(len(tasks), 1))
+
+    if workers <= 1:
+        for country, args in tasks:
+            try:
+                results[country] = func(*args)
+            except Exception as e:
+                errors[country] = str(e)
+        return results, errors
+
+    pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool_cls(max_workers=workers) as pool:
+        futures = [(country, pool.submit(func, *args)) for country, args in tasks]
+        for country, future in futures:
+            try:
+                results[country] = future.result()
+            except Exception as e:
+                errors[country] = str(e)
+    return results, errors
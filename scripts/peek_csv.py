@@ -1,8 +1,14 @@
 import pandas as pd
 import os
+import sys
 import glob
 import re
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from data_cache import read_head
+from schema_profile import sniff_dialect
+
 def get_country_name(filename):
     base = os.path.basename(filename)
     name_part = base.replace('.csv', '')
@@ -16,20 +22,11 @@ def get_country_name(filename):
 def peek_file_with_delimiter_detection(file_path, n_lines=10):
     print(f"--- Peeking at {file_path} ---")
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            first_line = f.readline()
-            f.seek(0) # Reset file pointer
-        
-        delimiters = [' ', ',', ';', '\t', '|']
-        detected_delimiter = ','
-        for delim in delimiters:
-            if first_line.count(delim) > 0:
-                 if len(first_line.split(delim)) > 1:
-                    detected_delimiter = delim
-                    break
-        print(f"Detected Delimiter: '{detected_delimiter}'")
+        # Same delimiter / encoding sniffing as the cached schema profile
+        detected_delimiter, encoding = sniff_dialect(read_head(file_path))
+        print(f"Detected Delimiter: '{detected_delimiter}' (encoding {encoding})")
         
-        df = pd.read_csv(file_path, sep=detected_delimiter, nrows=n_lines, encoding='utf-8', on_bad_lines='skip')
+        df = pd.read_csv(file_path, sep=detected_delimiter, nrows=n_lines, encoding=encoding, on_bad_lines='skip')
         print(df.head().to_string())
         
         potential_date_cols = ['creacion_asistencia', 'fecha_finalizacion_asistencia', 'fecha_cierre']
@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import math
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import CALL_STRATEGIES
+from pricing import compile_tiers
+
+# Billing policy definition (config/policy.json): tier tables, fees, the
+# call-counting strategy per country and the named calibration factor sets.
+# Loaded once per process, validated and compiled (tier schedules +
+# per-country resolved plans), so every calculator prices from the same
+# definition. VOCCARE_POLICY points to another file.
+#
+# Fitted factors (scripts/calibration.py) live in a separate, versioned
+# calibration file next to the policy ('calibration_file'); when present its
+# per-country (and per-month) values override the policy's factor sets.
+# VOCCARE_CALIBRATION points to another calibration file.
+
+POLICY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'policy.json')
+
+TIER_TABLES = ['sc', 'lv', 'app']
+FACTOR_BASES = ['all_rows', 'sc_only', 'per_sc', 'price']
+
+
+def _tiers(name, rows):
+    """[[limit, price], ..., [null, price]] -> [(limit, price), ..., (inf, price)]."""
+    if not isinstance(rows, list) or not rows:
+        raise ValueError(f"policy: tier table '{name}' must be a non-empty list")
+    tiers, previous = [], 0.0
+    for i, row in enumerate(rows):
+        if not isinstance(row, list) or len(row) != 2:
+            raise ValueError(f"policy: tier '{name}'[{i}] must be [limit, price]")
+        limit, price = row
+        last = i == len(rows) - 1
+        if limit is None:
+            if not last:
+                raise ValueError(f"policy: only the last tier of '{name}' can be open-ended (null limit)")
+            limit = math.inf
+        elif last:
+            raise ValueError(f"policy: the last tier of '{name}' must be open-ended (null limit)")
+        if not isinstance(price, (int, float)) or price < 0:
+            raise ValueError(f"policy: tier '{name}'[{i}] has an invalid price {price!r}")
+        if not isinstance(limit, (int, float)) or limit <= previous:
+            raise ValueError(f"policy: tier limits of '{name}' must be increasing ({limit!r} after {previous})")
+        tiers.append((float(limit), float(price)))
+        previous = limit
+    return tiers
+
+
+def _factor_set(name, spec):
+    for key in ('basis', 'default', 'countries'):
+        if key not in spec:
+            raise ValueError(f"policy: factor set '{name}' is missing '{key}'")
+    if spec['basis'] not in FACTOR_BASES:
+        raise ValueError(f"policy: factor set '{name}' has unknown basis '{spec['basis']}' (expected {FACTOR_BASES})")
+    values = {'default': spec['default'], **spec['countries']}
+    for country, value in values.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"policy: factor '{name}'/{country} must be a non-negative number, got {value!r}")
+    return {country: float(value) for country, value in spec['countries'].items()}, float(spec['default'])
+
+
+def _calibration(spec, factor_sets):
+    """Validated overrides of a calibration file: {set: (countries, {country: {month: value}})}."""
+    overrides = {}
+    for name, fitted in spec.get('factor_sets', {}).items():
+        if name not in factor_sets:
+            raise ValueError(f"calibration: unknown factor set '{name}'")
+        countries = fitted.get('countries', {})
+        monthly = fitted.get('monthly', {})
+        values = [(c, v) for c, v in countries.items()] + [(f"{c}/{m}", v) for c, months in monthly.items()
+                                                           for m, v in months.items()]
+        for key, value in values:
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"calibration: factor '{name}'/{key} must be a non-negative number, got {value!r}")
+        overrides[name] = ({c: float(v) for c, v in countries.items()},
+                           {c: {m: float(v) for m, v in months.items()} for c, months in monthly.items()})
+    return overrides
+
+
+class Policy:
+    def __init__(self, definition, source=None, calibration=None):
+        self.source = source
+        self.version = definition.get('version')
+        for key in ('base_fee', 'cancel_fee', 'app_discount_pct', 'app_fee'):
+            value = definition.get(key)
+            if not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"policy: '{key}' must be a non-negative number, got {value!r}")
+        self.base_fee = float(definition['base_fee'])
+        self.cancel_fee = float(definition['cancel_fee'])
+        self.app_discount_pct = definition['app_discount_pct']
+        self.app_fee = float(definition['app_fee'])
+
+        tables = definition.get('tiers', {})
+        missing = [t for t in TIER_TABLES if t not in tables]
+        if missing:
+            raise ValueError(f"policy: missing tier tables {missing}")
+        self.tiers = {name: _tiers(name, tables[name]) for name in TIER_TABLES}
+        # Compiled once: cumulative-cost arrays shared by every calculator
+        self.schedules = {name: compile_tiers(tiers) for name, tiers in self.tiers.items()}
+
+        counting = definition.get('call_counting', {'default': 'sum', 'countries': {}})
+        for country, strategy in {'default': counting.get('default'), **counting.get('countries', {})}.items():
+            if strategy not in CALL_STRATEGIES:
+                raise ValueError(f"policy: call_counting '{country}' must be one of {list(CALL_STRATEGIES)}, got {strategy!r}")
+        self.call_counting_default = counting['default']
+        self.call_counting_countries = dict(counting.get('countries', {}))
+
+        self.factor_sets = {}
+        self.descriptions = {}
+        self.bases = {}
+        for name, spec in definition.get('factor_sets', {}).items():
+            self.factor_sets[name] = _factor_set(name, spec)
+            self.descriptions[name] = spec.get('description', '')
+            self.bases[name] = spec['basis']
+        self.calibration_file = definition.get('calibration_file')
+
+        # Fitted overrides (calibration file): country values plus optional per-month values
+        self.monthly = {}
+        self.calibration = None
+        if calibration is not None:
+            for name, (countries, monthly) in _calibration(calibration, self.factor_sets).items():
+                fixed, default = self.factor_sets[name]
+                self.factor_sets[name] = ({**fixed, **countries}, default)
+                self.monthly[name] = monthly
+            self.calibration = {key: calibration.get(key) for key in ('version', 'created', 'year', 'source')}
+        self._plans = {}
+
+    def factors(self, name):
+        """Factor set as a {country: value, 'default': value} dict (a fresh copy)."""
+        countries, default = self.factor_sets[name]
+        return {**countries, 'default': default}
+
+    def factor(self, name, country=None):
+        countries, default = self.factor_sets[name]
+        return countries.get(country, default)
+
+    def month_factors(self, name, country, months):
+        """Factor per month label: the calibrated month value where fitted, else the country factor."""
+        base = self.factor(name, country)
+        monthly = self.monthly.get(name, {}).get(country, {})
+        return [monthly.get(month, base) for month in months]
+
+    def call_counting(self):
+        """Call-counting strategies as a {country: strategy, 'default': strategy} dict."""
+        return {**self.call_counting_countries, 'default': self.call_counting_default}
+
+    def call_strategy(self, country=None):
+        return self.call_counting_countries.get(country, self.call_counting_default)
+
+    def plan(self, country):
+        """Resolved pricing inputs of one country (every factor set), cached."""
+        if country not in self._plans:
+            self._plans[country] = {
+                'country': country,
+                'base_fee': self.base_fee,
+                'call_strategy': self.call_strategy(country),
+                'schedules': self.schedules,
+                'factors': {name: self.factor(name, country) for name in self.factor_sets}
+            }
+        return self._plans[country]
+
+
+_POLICIES = {}
+
+
+def calibration_path(policy_path, calibration_file=None):
+    """Calibration file of a policy (VOCCARE_CALIBRATION, else its 'calibration_file' next to it)."""
+    if os.environ.get('VOCCARE_CALIBRATION'):
+        return os.path.abspath(os.environ['VOCCARE_CALIBRATION'])
+    if calibration_file:
+        return os.path.join(os.path.dirname(policy_path), calibration_file)
+    return None
+
+
+def file_stamp(path):
+    """mtime (ns) of `path`, None when it does not exist."""
+    return os.stat(path).st_mtime_ns if path and os.path.exists(path) else None
+
+
+def load_policy(path=None):
+    """
+    Validated, compiled policy (defaults to config/policy.json). Memoized per
+    path until the policy or its calibration file changes on disk.
+    """
+    path = os.path.abspath(path or os.environ.get('VOCCARE_POLICY') or POLICY_PATH)
+    cached = _POLICIES.get(path)
+    if cached is not None:
+        stamp, policy = cached
+        if stamp == (file_stamp(path), file_stamp(calibration_path(path, policy.calibration_file))):
+            return policy
+    with open(path, encoding='utf-8') as f:
+        definition = json.load(f)
+    calibration = None
+    cal_path = calibration_path(path, definition.get('calibration_file'))
+    if cal_path and os.path.exists(cal_path):
+        with open(cal_path, encoding='utf-8') as f:
+            calibration = json.load(f)
+    policy = Policy(definition, source=path, calibration=calibration)
+    _POLICIES[path] = ((file_stamp(path), file_stamp(cal_path)), policy)
+    return policy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validates the policy file and prints a country's resolved plan.")
+    parser.add_argument('--policy', default=None)
+    parser.add_argument('--country', default=None)
+    args = parser.parse_args()
+
+    policy = load_policy(args.policy)
+    print(f"Policy v{policy.version} OK: {policy.source}")
+    for name in TIER_TABLES:
+        print(f"  tiers {name:<4} {len(policy.tiers[name])} levels")
+    for name, (countries, default) in policy.factor_sets.items():
+        print(f"  factors {name:<18} default {default:<5} {len(countries)} countries")
+    print(f"  call counting default '{policy.call_counting_default}', {len(policy.call_counting_countries)} overrides")
+    if policy.calibration:
+        print(f"  calibration v{policy.calibration['version']} ({policy.calibration['created']}), "
+              f"sets {sorted(policy.monthly)}")
+    if args.country:
+        plan = policy.plan(args.country)
+        print(json.dumps({'call_strategy': plan['call_strategy'], **plan['factors']}, indent=2))
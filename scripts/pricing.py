@@ -0,0 +1,97 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Shared tier-pricing engine.
+# A tier table [(limit, price), ...] is billed progressively (marginal rate
+# style): units up to the first limit at the first price, the next slice at
+# the second price, etc. Each table is compiled once into cumulative arrays so
+# whole arrays of volumes are priced with a single `searchsorted` pass.
+
+# App transaction tiers are quoted at this reference fee; other fees scale them.
+REFERENCE_APP_FEE = 0.45
+
+
+class TierSchedule:
+    def __init__(self, tiers):
+        self.tiers = tuple((float(limit), float(price)) for limit, price in tiers)
+        self.limits = np.array([limit for limit, _ in self.tiers])
+        self.prices = np.array([price for _, price in self.tiers])
+        self.starts = np.concatenate(([0.0], self.limits[:-1]))
+        # Cost accumulated at the start of each tier
+        widths = self.limits[:-1] - self.starts[:-1]
+        self.cum_cost = np.concatenate(([0.0], np.cumsum(widths * self.prices[:-1])))
+
+    def cost(self, volume, adjustment=1.0):
+        """Tier cost of `volume` (scalar or array); `adjustment` scales every price."""
+        v = np.clip(np.asarray(volume, dtype=float), 0.0, self.limits[-1])
+        idx = np.minimum(np.searchsorted(self.limits, v, side='left'), len(self.limits) - 1)
+        total = (self.cum_cost[idx] + (v - self.starts[idx]) * self.prices[idx]) * adjustment
+        if total.ndim == 0:
+            return float(total)
+        return total
+
+    def breakdown(self, volume, adjustment=1.0):
+        """Per-tier detail (limit, price, count, cost) for a single volume."""
+        rows = []
+        v = max(float(volume), 0.0)
+        for start, limit, price in zip(self.starts, self.limits, self.prices):
+            if v <= start:
+                break
+            count = float(min(v, limit) - start)
+            rows.append({
+                'tier_limit': float(limit),
+                'price': float(price * adjustment),
+                'count': count,
+                'cost': float(count * price * adjustment)
+            })
+        return rows
+
+
+@lru_cache(maxsize=None)
+def _compile(tiers_key):
+    return TierSchedule(tiers_key)
+
+
+def compile_tiers(tiers):
+    """Returns the (memoized) compiled schedule for a tier list."""
+    return _compile(tuple((limit, price) for limit, price in tiers))
+
+
+def tier_cost(volume, tiers, adjustment_factor=1.0):
+    return compile_tiers(tiers).cost(volume, adjustment_factor)
+
+
+def price_bills(sc_total, sc_app, valid_calls, tiers_sc, tiers_lv, tiers_app,
+                price_adj=1.0, app_discount_pct=10, app_fee=REFERENCE_APP_FEE, base_fee=3150.0):
+    """
+    Prices monthly volumes under the 2024 and 2026 policies in one pass.
+    Every argument may be a scalar or a NumPy-broadcastable array; returns a
+    dict of arrays with the cost components of both bills.
+    """
+    sc_total = np.asarray(sc_total, dtype=float)
+    sc_app = np.asarray(sc_app, dtype=float)
+    price_adj = np.asarray(price_adj, dtype=float)
+
+    base_sc_cost = compile_tiers(tiers_sc).cost(sc_total, price_adj)
+    cost_lv = compile_tiers(tiers_lv).cost(valid_calls, price_adj)
+    fixed = np.asarray(base_fee, dtype=float) * price_adj
+
+    # 2026: discount on the App share of the SC cost + scaled App transaction tiers
+    app_share = np.divide(sc_app, sc_total, out=np.zeros(np.broadcast(sc_app, sc_total).shape), where=sc_total > 0)
+    discount = base_sc_cost * app_share * (np.asarray(app_discount_pct, dtype=float) / 100.0)
+    cost_app = compile_tiers(tiers_app).cost(sc_app) * (np.asarray(app_fee, dtype=float) / REFERENCE_APP_FEE)
+
+    bill_2024 = fixed + base_sc_cost + cost_lv
+    bill_2026 = fixed + (base_sc_cost - discount) + cost_lv + cost_app
+    return {
+        'cost_sc_24': base_sc_cost,
+        'cost_lv_24': cost_lv,
+        'bill_2024': bill_2024,
+        'base_sc_cost': base_sc_cost,
+        'discount': discount,
+        'cost_app': cost_app,
+        'cost_lv_26': cost_lv,
+        'bill_2026': bill_2026,
+        'savings': bill_2024 - bill_2026
+    }
@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from contextlib import closing, contextmanager
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from data_cache import CACHE_DIR_NAME, CACHE_VERSION
+from fact_store import update_facts
+
+# Persisted simulation results (SQLite, one Parquet payload per entry).
+# Entries are content-addressed: the key hashes the extract's content (the
+# fact store's per-month signatures, so a touched or copied zip still hits),
+# the tier tables, the calibration factors of that one country and the policy
+# parameters. Identical requests are served from the store; changing a factor
+# only invalidates the entries of the country it belongs to.
+
+STORE_FILE = 'results.sqlite'
+# Bump when the layout of stored results changes
+STORE_VERSION = 3
+
+
+def default_path(input_dir='Paises'):
+    return os.path.join(input_dir, CACHE_DIR_NAME, STORE_FILE)
+
+
+def extract_signature(source_path):
+    """Content hash of an extract: loaded columns + per-month row signatures."""
+    state, _, _ = update_facts(source_path)
+    payload = json.dumps([state['columns'], state['months']], sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def result_key(kind, **parts):
+    """sha1 of the entry kind plus every input that determines the result."""
+    payload = json.dumps({'kind': kind, 'store_version': STORE_VERSION, 'cache_version': CACHE_VERSION, **parts},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ResultStore:
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY, kind TEXT, country TEXT, created REAL, payload BLOB)""")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call: safe from the dashboard's worker threads.
+        # The connection's own context manager only commits; closing() releases it.
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            yield conn
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+        return None if row is None else pd.read_parquet(io.BytesIO(row[0]))
+
+    def put(self, key, kind, country, df):
+        buf = io.BytesIO()
+        df.to_parquet(buf, index=False)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                         (key, kind, country, time.time(), buf.getvalue()))
+
+    def fetch(self, kind, country, compute, **parts):
+        """Stored result for (`kind`, `country`, `parts`), computed and stored on a miss."""
+        key = result_key(kind, country=country, **parts)
+        df = self.get(key)
+        if df is None:
+            df = compute()
+            try:
+                self.put(key, kind, country, df)
+            except Exception as e:
+                print(f"Could not store {kind} result for {country}: {e}")
+        return df
+
+    def stats(self):
+        with self._connect() as conn:
+            return pd.read_sql_query("""SELECT kind, country, COUNT(*) AS entries, SUM(LENGTH(payload)) AS bytes
+                                        FROM results GROUP BY kind, country ORDER BY kind, country""", conn)
+
+    def clear(self, country=None):
+        with self._connect() as conn:
+            if country is None:
+                conn.execute("DELETE FROM results")
+            else:
+                conn.execute("DELETE FROM results WHERE country = ?", (country,))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspects / clears the simulation result store.")
+    parser.add_argument('--input-dir', default='Paises')
+    parser.add_argument('--clear', action='store_true')
+    parser.add_argument('--country', help="Only this country (with --clear)")
+    args = parser.parse_args()
+
+    store = ResultStore(default_path(args.input_dir))
+    if args.clear:
+        store.clear(args.country)
+    print(store.stats().to_string(index=False))
@@ -1,56 +1,81 @@
 import os
-import subprocess
 import sys
-import glob
-import re
-
-def get_country_name(filename):
-    # Patterns to try:
-    # Client05_Mexico.csv -> Mexico
-    # Client01_Puerto_Rico_20251027.csv -> Puerto Rico
-    
-    base = os.path.basename(filename)
-    name_part = base.replace('.csv', '')
-    
-    # Remove "ClientXX_" prefix if present
-    match = re.match(r'Client\d+_(.+)', name_part)
-    if match:
-        raw_name = match.group(1)
-        # Remove date suffix if present (e.g., _20251027)
-        raw_name = re.sub(r'_\d{8}$', '', raw_name)
-        # Replace underscores with spaces for display
-        return raw_name.replace('_', ' ')
-    
-    return name_part
-
-def run_all_countries():
-    # Find all CSV files matching the pattern
-    # Assuming script is running from root or we look in root
-    # The script is in 'scripts/', but execution is usually from root.
-    # We'll look in the current working directory (root).
-    csv_files = glob.glob('Paises/Client*.csv')
-    
-    if not csv_files:
-        print("No 'Client*.csv' files found in the current directory.")
-        return
-
-    # Get absolute path to the calculator script
-    script_path = os.path.join(os.path.dirname(__file__), 'calculadora_nueva_politica.py')
-    
-    print(f"Found {len(csv_files)} files to process.")
-
-    for filename in csv_files:
-        country = get_country_name(filename)
-            
-        print(f"\n{'='*20} {country.upper()} {'='*20}")
-        
-        # Construct command
-        cmd = [sys.executable, script_path, "--file", filename, "--country", country]
-        
-        try:
-            subprocess.run(cmd, check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error running for {country}: {e}")
+import time
+import argparse
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from calculadora_nueva_politica import VoccareCalculator
+from data_cache import discover_extracts
+from parallel import map_countries
+
+def run_country(country, file_path, year):
+    """Worker: runs the calculator in-process and returns (monthly results, seconds)."""
+    start = time.perf_counter()
+    result = VoccareCalculator(country).run(file_path, year=year, verbose=False)
+    if result is None:
+        raise ValueError(f"Could not process {file_path}")
+    return result, time.perf_counter() - start
+
+def save_results(df, output_path):
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    if output_path.endswith('.parquet'):
+        df.to_parquet(output_path, index=False)
+    elif output_path.endswith('.csv'):
+        df.to_csv(output_path, index=False)
+    else:
+        df.to_json(output_path, orient='records', indent=2)
+
+def run_all_countries(input_dir='Paises', countries=None, year=2025, jobs=None, output=None):
+    extracts = discover_extracts(input_dir)
+    if countries:
+        missing = [c for c in countries if c not in extracts]
+        if missing:
+            print(f"No extract found for: {', '.join(missing)}")
+        extracts = {c: f for c, f in extracts.items() if c in countries}
+
+    if not extracts:
+        print(f"No 'Client*' extracts found in '{input_dir}'.")
+        return pd.DataFrame()
+
+    print(f"Found {len(extracts)} files to process.")
+
+    start = time.perf_counter()
+    # Process pool: each worker imports pandas / the calculator once and handles several countries
+    results, errors = map_countries(
+        run_country,
+        [(country, (country, f, year)) for country, f in extracts.items()],
+        jobs=jobs, use_processes=True
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'Country':<20} | {'Months':<6} | {'Total Bill':<15} | {'Seconds':<8}")
+    print("-" * 60)
+    for country, (df, seconds) in results.items():
+        print(f"{country:<20} | {len(df):<6} | ${df['Total Bill'].sum():<14,.2f} | {seconds:<8.2f}")
+    for country, e in errors.items():
+        print(f"Error running for {country}: {e}")
+    print("-" * 60)
+    print(f"Wall time: {elapsed:.2f}s")
+
+    frames = [df for df, _ in results.values() if not df.empty]
+    all_results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    if output and not all_results.empty:
+        save_results(all_results, output)
+        print(f"Results saved to {output}")
+    return all_results
 
 if __name__ == "__main__":
-    run_all_countries()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Runs the v2.1 calculator for every country extract.")
+    parser.add_argument('--input-dir', default='Paises')
+    parser.add_argument('--countries', nargs='+', help="Country names, e.g. --countries Argentina 'Costa Rica'")
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--jobs', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--output', default='reports/run_all_countries.json',
+                        help="Output artifact (.json, .csv or .parquet)")
+    args = parser.parse_args()
+
+    run_all_countries(args.input_dir, args.countries, args.year, args.jobs, args.output)
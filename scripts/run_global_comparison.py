@@ -2,40 +2,27 @@ import pandas as pd
 import glob
 import os
 import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import call_columns, monthly_facts
+from data_cache import discover_extracts, load_extract
+from policy import load_policy
+from pricing import price_bills, tier_cost
 
 class GlobalPolicyComparator:
-    def __init__(self):
-        self.base_fee = 3150.00
-        
-        self.tiers_sc = [
-            (50, 0.00), (500, 10.51), (1000, 9.28), (2000, 8.04),
-            (3000, 6.80), (6000, 5.57), (9000, 5.26), (12000, 4.95),
-            (15000, 4.64), (float('inf'), 4.33)
-        ]
-        self.tiers_lv = [
-            (4000, 0.80), (20000, 0.37), (float('inf'), 0.19)
-        ]
-        self.tiers_app = [
-            (5000, 0.45), (20000, 0.35), (float('inf'), 0.20)
-        ]
+    def __init__(self, policy=None):
+        self.policy = policy or load_policy()
+        self.base_fee = self.policy.base_fee
         
-        self.valid_call_factor = 0.90
+        self.tiers_sc = self.policy.tiers['sc']
+        self.tiers_lv = self.policy.tiers['lv']
+        self.tiers_app = self.policy.tiers['app']
 
     def calculate_tier_cost(self, volume, tiers):
-        remaining = volume
-        total_cost = 0.0
-        current_tier_start = 0
-        for limit, price in tiers:
-            if remaining <= 0: break
-            tier_capacity = limit - current_tier_start
-            # Fix for first 50 free in SC:
-            # The pricing tiers provided usually imply the price applies to that slice.
-            # If the first tier is (50, 0.00), it handles the deduction naturally.
-            count = min(remaining, tier_capacity)
-            total_cost += count * price
-            remaining -= count
-            current_tier_start = limit
-        return total_cost
+        # The first SC tier (50, 0.00) handles the free services included in the fee
+        return tier_cost(volume, tiers)
 
     def calculate_sc_cost_2025(self, total_volume, app_volume):
         # Policy v2.1 + Commercial Negotiation:
@@ -59,80 +46,33 @@ class GlobalPolicyComparator:
         
         return base_cost - discount
 
-    def process_file(self, file_path):
+    def process_file(self, file_path, country=None):
         try:
-            df = pd.read_csv(file_path, sep=';', on_bad_lines='skip')
-            
-            # Date parsing
-            date_col = 'creacion_asistencia'
-            if date_col not in df.columns:
-                # Fallback for some files
-                if 'fecha_finalizacion_asistencia' in df.columns:
-                    date_col = 'fecha_finalizacion_asistencia'
-                else:
-                    return None
-
-            df['date_obj'] = pd.to_datetime(df[date_col], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-            # Fallback for dayfirst
-            if df['date_obj'].isnull().all():
-                 df['date_obj'] = pd.to_datetime(df[date_col], dayfirst=True, errors='coerce')
+            # Cached typed frame (date column fallback and dayfirst retry applied at cache build)
+            df = load_extract(file_path)
 
-            df = df[df['date_obj'].dt.year == 2025].copy()
-            if len(df) == 0:
+            # Monthly SC / App / raw calls for 2025 in one grouped pass (fees apply monthly)
+            facts = monthly_facts(df, year=2025)
+            if facts.empty:
                 return None # No 2025 data
-                
-            df['month'] = df['date_obj'].dt.to_period('M')
-            
-            app_types = ['APP', 'ANCLAJE APP SOA', 'ANCLAJE', 'ANCLAJE_APP', 'ANCLAJE_APP_SOA']
             
-            total_bill_2024 = 0
-            total_bill_2025 = 0
-            total_sc_vol = 0
-            total_app_vol = 0
+            month_sc = facts['SC Total'].to_numpy()
+            month_app = facts['SC App'].to_numpy()
+            valid_call_factor = self.policy.factor('global_comparison', country)
+            raw_calls = facts[call_columns(self.policy.call_strategy(country))[0]].to_numpy()
+            month_valid_calls = (raw_calls * valid_call_factor).astype(int)
             
-            # Iterate months to calculate monthly bills (fees apply monthly)
-            for month, group in df.groupby('month'):
-                # Filter Concluded
-                if 'estado_asistencia' in group.columns:
-                    sc_df = group[group['estado_asistencia'] == 'CONCLUIDA']
-                else:
-                    sc_df = group # Fallback
-                
-                month_sc = len(sc_df)
-                month_app = sc_df[sc_df['tipo_asignacion'].astype(str).str.strip().isin(app_types)].shape[0]
-                
-                raw_calls = 0
-                if 'cantidad_llamadas' in group.columns:
-                    raw_calls = group['cantidad_llamadas'].sum()
-                month_valid_calls = int(raw_calls * self.valid_call_factor)
-                
-                # --- 2024 Calculation ---
-                # SC: Paid on Total (after 50)
-                cost_sc_24 = self.calculate_tier_cost(month_sc, self.tiers_sc)
-                # LV: Paid on Total
-                cost_lv_24 = self.calculate_tier_cost(month_valid_calls, self.tiers_lv)
-                bill_24 = self.base_fee + cost_sc_24 + cost_lv_24
-                
-                # --- 2025 Calculation (Strict Policy v2.1 + 10% App Disc) ---
-                # SC: Paid on Total (Voice + App) with discount on App portion
-                cost_sc_25 = self.calculate_sc_cost_2025(month_sc, month_app)
-                # LV: Paid on Total (Assuming NO call reduction for App users yet)
-                cost_lv_25 = self.calculate_tier_cost(month_valid_calls, self.tiers_lv)
-                # APP: Transaction Fee
-                cost_app_25 = self.calculate_tier_cost(month_app, self.tiers_app)
-                
-                bill_25 = self.base_fee + cost_sc_25 + cost_lv_25 + cost_app_25
-                
-                total_bill_2024 += bill_24
-                total_bill_2025 += bill_25
-                total_sc_vol += month_sc
-                total_app_vol += month_app
+            # 2024: SC + LV on Total. 2025 (Strict Policy v2.1 + 10% App Disc): SC on Total
+            # with discount on App portion, LV on Total (no call reduction yet), App transaction fee.
+            bills = price_bills(month_sc, month_app, month_valid_calls,
+                                self.tiers_sc, self.tiers_lv, self.tiers_app,
+                                app_discount_pct=10, base_fee=self.base_fee)
             
             return {
-                'sc_vol': total_sc_vol,
-                'app_vol': total_app_vol,
-                'bill_2024': total_bill_2024,
-                'bill_2025': total_bill_2025
+                'sc_vol': int(month_sc.sum()),
+                'app_vol': int(month_app.sum()),
+                'bill_2024': float(bills['bill_2024'].sum()),
+                'bill_2025': float(bills['bill_2026'].sum())
             }
 
         except Exception as e:
@@ -150,16 +90,14 @@ def get_country_name(filename):
 
 def run_all():
     comparator = GlobalPolicyComparator()
-    files = glob.glob('Paises/Client*.csv')
     
     print(f"{'Country':<20} | {'Adoption':<8} | {'Bill 2024':<12} | {'Bill 2025':<12} | {'Diff $':<12} | {'Diff %':<8}")
     print("-" * 85)
     
     total_global_savings = 0
     
-    for file in files:
-        country = get_country_name(file)
-        res = comparator.process_file(file)
+    for country, file in discover_extracts('Paises').items():
+        res = comparator.process_file(file, country)
         
         if res and res['sc_vol'] > 0:
             adoption = (res['app_vol'] / res['sc_vol']) * 100
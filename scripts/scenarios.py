@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import zlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aggregation import call_columns
+from compare_policies import GlobalPolicyReport
+from fact_store import select_facts, update_facts
+from parallel import map_countries
+from pricing import price_bills
+
+# Monte Carlo adoption-scenario engine (generalizes calculadora_mexico's
+# Scenario 3 to every country). Each trial draws an App adoption rate, a call
+# reduction for App services, a call-efficiency factor and a volume growth
+# factor; all trials x months are priced at once from the country's monthly
+# fact table (loaded once from the fact store), so thousands of trials take
+# well under a second per country.
+#
+# Scenario model, per month:
+#   SC        = SC Total * growth
+#   SC App    = floor(SC * adoption)
+#   calls     = trunc(raw calls * growth * efficiency)  (baseline, all Voz; policy call counting)
+#   projected = calls - SC App * calls / SC * call_reduction
+# Factura 2024 prices SC and baseline calls under the 2024 policy; Factura 2026
+# prices the shifted volumes under the 2026 policy.
+
+# Distribution per sampled parameter: ('fixed', v), ('uniform', lo, hi),
+# ('triangular', lo, mode, hi) or ('normal', mean, sd). A None mean / value for
+# 'efficiency' stands for the country's calibrated call-efficiency factor.
+DEFAULT_SPEC = {
+    'adoption': ('uniform', 0.05, 0.50),
+    'call_reduction': ('triangular', 0.15, 0.238, 0.30),
+    'efficiency': ('normal', None, 0.05),
+    'growth': ('normal', 1.0, 0.05)
+}
+
+# Valid range of each parameter (samples are clipped)
+BOUNDS = {'adoption': (0.0, 1.0), 'call_reduction': (0.0, 1.0), 'efficiency': (0.0, 1.0), 'growth': (0.0, None)}
+
+PERCENTILES = [10, 50, 90]
+
+
+def sample(rng, dist, n, default=None):
+    """`n` draws of a distribution spec (see DEFAULT_SPEC)."""
+    kind, *args = dist
+    args = [default if a is None else a for a in args]
+    if kind == 'fixed':
+        return np.full(n, float(args[0]))
+    if kind == 'uniform':
+        return rng.uniform(args[0], args[1], n)
+    if kind == 'triangular':
+        return rng.triangular(args[0], args[1], args[2], n)
+    if kind == 'normal':
+        return rng.normal(args[0], args[1], n)
+    raise ValueError(f"Unknown distribution '{kind}'")
+
+
+def project_bills(report, sc_total, raw_calls, adoption, call_reduction, efficiency, growth, price_adj=1.0):
+    """
+    Bills of the scenario model for broadcastable arrays (e.g. parameters as
+    (trials, 1) columns against (months,) volumes). Returns a dict of arrays.
+    """
+    sc = np.asarray(sc_total, dtype=float) * growth
+    app = np.floor(sc * adoption)
+    calls = np.trunc(np.asarray(raw_calls, dtype=float) * growth * efficiency)
+    calls_per_sc = np.divide(calls, sc, out=np.zeros(np.broadcast(calls, sc).shape), where=sc > 0)
+    projected = calls - app * calls_per_sc * call_reduction
+
+    kwargs = dict(price_adj=price_adj, app_discount_pct=report.app_discount_pct,
+                  app_fee=report.app_fee, base_fee=report.base_fee)
+    old = price_bills(sc, app, calls, report.tiers_sc, report.tiers_lv, report.tiers_app, **kwargs)
+    new = price_bills(sc, app, projected, report.tiers_sc, report.tiers_lv, report.tiers_app, **kwargs)
+    return {
+        'SC App': app,
+        'Llamadas Validas': projected,
+        'Factura 2024': old['bill_2024'],
+        'Factura 2026': new['bill_2026'],
+        'Descuento App': new['discount'],
+        'Ahorro': old['bill_2024'] - new['bill_2026']
+    }
+
+
+def run_trials(facts, country, trials=10_000, seed=0, spec=None, report=None):
+    """
+    Per-trial totals over the months of `facts` (aggregation.monthly_facts
+    layout): the sampled parameters plus both bills and the savings.
+    """
+    report = report or GlobalPolicyReport()
+    spec = {**DEFAULT_SPEC, **(spec or {})}
+    # Same seed and country -> same draws, whichever worker runs the country
+    rng = np.random.default_rng([seed, zlib.crc32(country.encode('utf-8'))])
+
+    params = {}
+    for name in ('adoption', 'call_reduction', 'efficiency', 'growth'):
+        default = report.get_efficiency_factor(country) if name == 'efficiency' else None
+        lo, hi = BOUNDS[name]
+        params[name] = np.clip(sample(rng, spec[name], trials, default), lo, hi)
+
+    column = {name: values[:, None] for name, values in params.items()}
+    raw_calls = facts[call_columns(report.get_call_strategy(country))[0]].to_numpy()
+    bills = project_bills(report, facts['SC Total'].to_numpy(), raw_calls,
+                          price_adj=report.get_price_adjust(country), **column)
+
+    out = pd.DataFrame(params)
+    for col in ('Factura 2024', 'Factura 2026', 'Descuento App', 'Ahorro'):
+        out[col] = np.broadcast_to(bills[col], (trials, len(facts))).sum(axis=1)
+    return out
+
+
+def summarize(trial_totals, country=None):
+    """P10 / P50 / P90 and mean of the billing columns of `run_trials`."""
+    cols = ['Factura 2024', 'Factura 2026', 'Descuento App', 'Ahorro']
+    values = trial_totals[cols].to_numpy()
+    summary = pd.DataFrame(np.percentile(values, PERCENTILES, axis=0).T,
+                           columns=[f"P{p}" for p in PERCENTILES])
+    summary['Media'] = values.mean(axis=0)
+    summary.insert(0, 'Metrica', cols)
+    if country is not None:
+        summary.insert(0, 'Pais', country)
+    return summary
+
+
+def simulate_country(file_path, country, year=2025, trials=10_000, seed=0, spec=None,
+                     app_discount_pct=None, app_fee=None, base_fee=None):
+    """Summary of `trials` scenarios for one extract (picklable for process pools)."""
+    report = GlobalPolicyReport(app_discount_pct=app_discount_pct, app_fee=app_fee, base_fee=base_fee)
+    _, months, accounts = update_facts(file_path)
+    facts = select_facts(months, accounts, year=year)
+    if facts.empty:
+        return pd.DataFrame()
+    return summarize(run_trials(facts, country, trials, seed, spec, report), country)
+
+
+def simulate_all(extracts, year=2025, trials=10_000, seed=0, spec=None, jobs=None, use_processes=False, **pricing):
+    """Scenario summaries for every `{country: path}`, one task per country."""
+    results, errors = map_countries(
+        simulate_country,
+        [(c, (f, c, year, trials, seed, spec, pricing.get('app_discount_pct'),
+              pricing.get('app_fee'), pricing.get('base_fee'))) for c, f in extracts.items()],
+        jobs=jobs, use_processes=use_processes
+    )
+    for country, e in errors.items():
+        print(f"ERROR simulating {country}: {e}")
+    frames = [r for r in results.values() if not r.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    from data_cache import discover_extracts
+
+    parser = argparse.ArgumentParser(description="Monte Carlo App-adoption scenarios per country.")
+    parser.add_argument('--input-dir', default='Paises')
+    parser.add_argument('--countries', nargs='+', help="Country names (default: all)")
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--trials', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--discount', type=float, default=None, help="Default: policy file")
+    parser.add_argument('--app-fee', type=float, default=None, help="Default: policy file")
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--processes', action='store_true', help="Process pool instead of threads")
+    args = parser.parse_args()
+
+    extracts = discover_extracts(args.input_dir)
+    if args.countries:
+        extracts = {c: f for c, f in extracts.items() if c in args.countries}
+    start = time.perf_counter()
+    summary = simulate_all(extracts, args.year, args.trials, args.seed, jobs=args.jobs,
+                           use_processes=args.processes, app_discount_pct=args.discount, app_fee=args.app_fee)
+    pd.set_option('display.float_format', '{:,.2f}'.format)
+    print(summary.to_string(index=False))
+    print(f"\n{args.trials:,} trials x {len(extracts)} countries in {time.perf_counter() - start:.2f}s")
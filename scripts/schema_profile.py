@@ -0,0 +1,180 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Schema profile of a country extract.
+# Detected once from the head of the file and a sample of rows and persisted
+# next to the cached data (see data_cache.load_profile): delimiter, encoding,
+# raw -> canonical header names, which optional billing columns exist, the
+# billing-date column and its format, and the bad-line count of the full
+# parse. Loaders build their usecols / dtype maps from it and calculators pick
+# their code paths up front instead of probing headers and trial-parsing.
+#
+# Month bucketing only needs the year-month prefix: for a known fixed-width
+# layout the digits are sliced straight out of the string buffer and turned
+# into a compact int16 month index (months since 1970-01, MONTH_NA when the
+# date is missing), skipping full timestamp parsing.
+
+# Billing date, in order of preference
+DATE_COLUMN = 'creacion_asistencia'
+FALLBACK_DATE_COLUMN = 'fecha_finalizacion_asistencia'
+DATE_CANDIDATES = [DATE_COLUMN, FALLBACK_DATE_COLUMN]
+
+# Fixed-width layouts seen in the extracts (first match wins on ties)
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+                '%d-%m-%Y %H:%M:%S', '%d-%m-%Y']
+
+PROFILE_SAMPLE_ROWS = 5000
+# Share of non-empty sample values a layout must match to be selected
+MIN_FORMAT_MATCH = 0.5
+# Bytes of the file head used to sniff the delimiter and encoding
+PROFILE_HEAD_BYTES = 64 * 1024
+
+# Candidate delimiters (first wins on ties) and encodings (first that decodes the head)
+DELIMITERS = [';', ',', '\t', '|']
+ENCODINGS = ['utf-8-sig', 'latin-1']
+
+_FIELD_WIDTH = {'Y': 4, 'm': 2, 'd': 2, 'H': 2, 'M': 2, 'S': 2}
+MONTH_NA = np.iinfo(np.int16).min
+
+
+def _layout(fmt):
+    """'%Y-%m-%d' -> width, {field: position}, [(position, literal)]."""
+    fields, literals, pos = {}, [], 0
+    for token in re.findall(r'%[YmdHMS]|.', fmt):
+        if token.startswith('%'):
+            fields[token[1]] = pos
+            pos += _FIELD_WIDTH[token[1]]
+        else:
+            literals.append((pos, ord(token)))
+            pos += 1
+    return pos, fields, literals
+
+
+def _month_ordinals(values, fmt):
+    """
+    (valid mask, year*12 + month - 1 ordinals since 1970) for strings in layout
+    `fmt`. Only the year and month digits are decoded; the rest of the layout
+    is checked through its separators and total length.
+    """
+    width, fields, literals = _layout(fmt)
+    text = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values, dtype=object)
+    # Fixed-width UCS-4 buffer; one extra character so longer values (trailing data) are rejected.
+    # Missing values become 'nan' and fail the layout check.
+    chars = np.asarray(text, dtype=f'U{width + 1}').view(np.uint32).reshape(len(text), width + 1)
+
+    ok = (chars[:, width] == 0) & (chars[:, width - 1] != 0)
+    for pos, char in literals:
+        ok &= chars[:, pos] == char
+
+    def number(start, n):
+        total = np.zeros(len(text), dtype=np.int64)
+        for pos in range(start, start + n):
+            digit = chars[:, pos].astype(np.int64) - 48
+            ok[:] &= (digit >= 0) & (digit <= 9)
+            total = total * 10 + digit
+        return total
+
+    year, month = number(fields['Y'], 4), number(fields['m'], 2)
+    ok &= (month >= 1) & (month <= 12)
+    return ok, (year - 1970) * 12 + month - 1
+
+
+def sniff_dialect(head):
+    """(delimiter, encoding) of a CSV from the first bytes of the file."""
+    for encoding in ENCODINGS:
+        try:
+            text = head.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            # The head may end mid-character
+            try:
+                text = head[:-3].decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+    lines = [line for line in text.splitlines()[:-1] or text.splitlines() if line.strip()]
+    if not lines:
+        return DELIMITERS[0], encoding
+    header = lines[0]
+    # Most frequent candidate in the header, preferring one with a stable count on the next lines
+    counts = {d: header.count(d) for d in DELIMITERS}
+    stable = {d: n for d, n in counts.items() if n and all(line.count(d) == n for line in lines[1:20])}
+    pool = stable or counts
+    delimiter = max(DELIMITERS, key=lambda d: pool.get(d, 0))
+    return (delimiter if pool.get(delimiter) else DELIMITERS[0]), encoding
+
+
+def detect_date_format(values):
+    """Fixed-width layout matched by most non-empty `values`, or None (free-form dates)."""
+    values = pd.Series(values).dropna().astype(str)
+    values = values[values.str.strip() != '']
+    if values.empty:
+        return None
+    best, best_share = None, 0.0
+    for fmt in DATE_FORMATS:
+        share = _month_ordinals(values, fmt)[0].mean()
+        if share > best_share:
+            best, best_share = fmt, share
+    return best if best_share >= MIN_FORMAT_MATCH else None
+
+
+def detect_billing_date(sample):
+    """
+    Authoritative billing-date column and its format for a sample frame: the
+    first of DATE_CANDIDATES with parseable values (else the first present).
+    """
+    present = [c for c in DATE_CANDIDATES if c in sample.columns]
+    for col in present:
+        fmt = detect_date_format(sample[col])
+        if fmt is not None:
+            return col, fmt
+    if present:
+        return present[0], None
+    return None, None
+
+
+def profile_frame(sample):
+    """Schema profile of an extract from a sample of its rows (stripped headers)."""
+    date_column, date_format = detect_billing_date(sample)
+    return {
+        'date_column': date_column,
+        'date_format': date_format
+    }
+
+
+def billing_months(df, profile):
+    """int16 billing-month index of every row, per the extract's schema profile."""
+    col = profile.get('date_column')
+    if col is None or col not in df.columns:
+        return pd.Series(np.full(len(df), MONTH_NA, dtype=np.int16), index=df.index)
+    fmt = profile.get('date_format')
+    if fmt is None:
+        # Free-form dates: full parse
+        dates = pd.to_datetime(df[col], dayfirst=True, errors='coerce')
+        ok = dates.notna().to_numpy()
+        ordinals = (dates.dt.year.fillna(1970).to_numpy(dtype=np.int64) - 1970) * 12 + dates.dt.month.fillna(1).to_numpy(dtype=np.int64) - 1
+    else:
+        ok, ordinals = _month_ordinals(df[col], fmt)
+    return pd.Series(np.where(ok, ordinals, MONTH_NA).astype(np.int16), index=df.index)
+
+
+def month_years(index):
+    """Calendar year of a month index (array-like); MONTH_NA maps to a negative year."""
+    return np.asarray(index, dtype=np.int64) // 12 + 1970
+
+
+def month_labels(index):
+    """Month index -> 'YYYY-MM' labels (the `Mes` format used across the reports)."""
+    index = np.asarray(index, dtype=np.int64)
+    unique, inverse = np.unique(index, return_inverse=True)
+    labels = np.array([f"{m // 12 + 1970:04d}-{m % 12 + 1:02d}" for m in unique], dtype=object)
+    return labels[inverse.reshape(-1)]
+
+
+def month_index(label):
+    """'YYYY-MM' -> month index."""
+    year, month = str(label).split('-')[:2]
+    return (int(year) - 1970) * 12 + int(month) - 1
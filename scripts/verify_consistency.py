@@ -6,6 +6,8 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from compare_policies import GlobalPolicyReport
+from data_cache import discover_extracts
+from result_store import ResultStore, default_path
 
 # DEBUG: Print the path of the imported module
 print(f"DEBUG: Importing GlobalPolicyReport from: {GlobalPolicyReport.__module__}")
@@ -22,24 +24,15 @@ def verify_consistency():
     print(f"{'Pais':<15} | {'Simulado 2024':<15} | {'Simulado 2025':<15} | {'Diferencia':<15} | {'Check Suma':<10}")
     print("-" * 80)
     
-    files = glob.glob(os.path.join(input_dir, "*.csv"))
+    # Precomputed results are reused unless the extract / factors / tiers changed
+    store = ResultStore(default_path(input_dir))
     
     grand_total_24 = 0
     grand_total_25 = 0
     
-    for file_path in files:
-        filename = os.path.basename(file_path)
-        parts = filename.split('_')
-        country_name = "Desconocido"
-        if len(parts) > 2:
-            country_parts = []
-            for p in parts[1:]:
-                if p.isdigit() and len(p) == 8: break
-                country_parts.append(p)
-            country_name = " ".join(country_parts)
-            
+    for country_name, file_path in discover_extracts(input_dir).items():
         # Run Simulation
-        df_res = report_gen.process_country(file_path, country_name, year_filter=2025)
+        df_res = report_gen.process_country(file_path, country_name, year_filter=2025, store=store)
         
         if not df_res.empty and 'Mes' in df_res.columns:
             # Convert 'Mes' to string before Period object for robustness
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
-import glob
 import os
 import sys
 
@@ -10,6 +10,15 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
 
 from compare_policies import GlobalPolicyReport
+from aggregation import ACCOUNT_GROUPINGS
+from policy import calibration_path, file_stamp, load_policy
+from breakeven import savings_components, solve as solve_breakeven
+from pricing import REFERENCE_APP_FEE
+from parallel import map_countries
+from data_cache import cache_key, discover_extracts, load_account_index
+from result_store import ResultStore, default_path
+from billing_workbooks import load_real_billing, real_billing_files
+from exports import EXPORT_FORMATS, export_frame
 
 # Configuración de la página
 st.set_page_config(page_title="Dashboard Financiero Voccare", layout="wide")
@@ -24,8 +33,12 @@ Ajuste los parámetros en la barra lateral para simular escenarios de descuento.
 # --- SIDEBAR: CONTROLES ---
 st.sidebar.header("⚙️ Configuración de Simulación")
 
+# Valores por defecto, tarifas y factores: config/policy.json
+policy = load_policy()
+
 if st.sidebar.button("🔄 Recalcular (Limpiar Caché)"):
     st.cache_data.clear()
+    st.cache_resource.clear()
     st.rerun()
 
 # Parámetro de Descuento App (Interactivo)
@@ -33,7 +46,7 @@ app_discount_pct = st.sidebar.slider(
     "Descuento por Uso de App (%)",
     min_value=0,
     max_value=50,
-    value=10,
+    value=int(policy.app_discount_pct),
     step=1,
     help="Porcentaje de descuento aplicado al costo de los Servicios Concluidos originados por App."
 )
@@ -41,76 +54,76 @@ app_discount_pct = st.sidebar.slider(
 app_fee = st.sidebar.number_input(
     "Fee Transaccional App ($)",
     min_value=0.0,
-    value=0.45,
+    value=policy.app_fee,
     step=0.05
 )
 
 # --- Selector de Fee Mensual ---
 include_base_fee_option = st.sidebar.radio(
-    "Incluir Fee Mensual ($3,150 USD)",
+    f"Incluir Fee Mensual (${policy.base_fee:,.0f} USD)",
     options=["Sí", "No"],
     index=0 # 'Sí' por defecto
 )
 
-base_fee_to_use = 3150.0 if include_base_fee_option == "Sí" else 0.0
+base_fee_to_use = policy.base_fee if include_base_fee_option == "Sí" else 0.0
 
 # Filtro de País y Año
 # Use absolute path relative to the script location (now root)
 base_dir = os.path.dirname(os.path.abspath(__file__))
 input_dir = os.path.join(base_dir, "Paises")
 
-files = glob.glob(os.path.join(input_dir, "*.zip"))
+country_map = discover_extracts(input_dir)
+
+# Firma de los datos de entrada: extractos (ruta, tamaño, mtime), archivo de política, archivo de
+# calibración y CSV de facturación real. Forma parte de la clave de los cachés, así un extracto nuevo,
+# un cambio de factores, una recalibración o una facturación regenerada invalidan los resultados sin
+# limpiar el caché a mano.
+def data_signature():
+    billing_files = real_billing_files(os.path.join(base_dir, "Facturacion"))
+    return (tuple(cache_key(f) for f in country_map.values()),
+            file_stamp(policy.source),
+            (policy.calibration or {}).get('version'),
+            file_stamp(calibration_path(policy.source, policy.calibration_file)),
+            tuple((f, file_stamp(f)) for f in billing_files.values()))
+
+DATA_SIGNATURE = data_signature()
 
 # DEBUG: Show path info in sidebar if no files found
-if not files:
+if not country_map:
     st.sidebar.error(f"No ZIP files found in: {input_dir}")
     st.sidebar.info(f"CWD: {os.getcwd()}")
 
-country_map = {}
-for f in files:
-    # Robust name extraction
-    filename = os.path.basename(f)
-    name_no_ext = os.path.splitext(filename)[0] # Remove .zip
-    parts = name_no_ext.split('_')
-    
-    # Filter: Skip 'ClientXX' (index 0 usually) and Date-like parts (8 digits)
-    clean_parts = []
-    for p in parts[1:]: # Skip first part (ClientXX)
-        if p.isdigit() and len(p) == 8:
-            continue # Skip date
-        clean_parts.append(p)
-        
-    c_name = " ".join(clean_parts)
-    country_map[c_name] = f
-
 selected_country = st.sidebar.selectbox(
     "Seleccionar País",
     options=["Todos (Global)"] + sorted(list(country_map.keys()))
 )
 
 # Filtro de Cuenta (Dinámico)
-account_filter = "Todas"
-if selected_country != "Todos (Global)":
-    f_path = country_map[selected_country]
+# cache_resource: el objeto cacheado se comparte entre reruns sin copiarlo (solo lectura)
+@st.cache_resource(max_entries=32)
+def load_accounts(file_path, data_sig=None):
+    """
+    Índice de cuentas persistido junto al caché del país (cuenta, filas).
+    `data_sig` (DATA_SIGNATURE) solo forma parte de la clave del caché.
+    """
     try:
-        # Read header to check for 'cuenta'
-        header = pd.read_csv(f_path, sep=';', nrows=0, compression='zip')
-        col_name = None
-        for c in header.columns:
-            if c.lower().strip() == 'cuenta':
-                col_name = c
-                break
-        
-        if col_name:
-            # Read unique accounts efficiently
-            acc_df = pd.read_csv(f_path, sep=';', usecols=[col_name], on_bad_lines='skip', compression='zip')
-            unique_accs = sorted(acc_df[col_name].dropna().astype(str).unique().tolist())
-            account_filter = st.sidebar.selectbox("Filtrar por Cuenta", ["Todas"] + unique_accs)
-        else:
-            st.sidebar.info("No se detectó columna 'cuenta' para desglose.")
-            
+        return load_account_index(file_path)
     except Exception as e:
-        pass # Silent fail on account read
+        print(f"Error loading accounts for {file_path}: {e}")
+        return pd.DataFrame(columns=['cuenta', 'rows'])
+
+account_filter = "Todas"
+if selected_country != "Todos (Global)":
+    acc_index = load_accounts(country_map[selected_country], DATA_SIGNATURE)
+    if not acc_index.empty:
+        acc_rows = dict(zip(acc_index['cuenta'], acc_index['rows']))
+        account_filter = st.sidebar.selectbox(
+            "Filtrar por Cuenta",
+            ["Todas"] + acc_index['cuenta'].tolist(),
+            format_func=lambda a: a if a == "Todas" else f"{a} ({acc_rows[a]:,} registros)"
+        )
+    else:
+        st.sidebar.info("No se detectó columna 'cuenta' para desglose.")
 
 selected_year = st.sidebar.selectbox(
     "Seleccionar Año",
@@ -118,29 +131,47 @@ selected_year = st.sidebar.selectbox(
     index=0
 )
 
-# --- CARGA DE DATOS (OPTIMIZADA) ---
-@st.cache_data
-def load_country_data(country_name, file_path):
-    """Carga y preprocesa los datos de un país. Se cachea para evitar relectura de disco."""
-    try:
-        df = pd.read_csv(file_path, sep=';', on_bad_lines='skip', compression='zip')
-        df.columns = df.columns.str.strip()
-        
-        # Date parsing optimizado
-        df['date_obj'] = pd.to_datetime(df['creacion_asistencia'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-        df['month'] = df['date_obj'].dt.to_period('M')
-        return df
-    except Exception as e:
-        print(f"Error loading {country_name}: {e}")
-        return pd.DataFrame()
-
-# --- LÓGICA DE CÁLCULO ---
-@st.cache_data
-def run_simulation(discount_val, fee_val, year_filter, acc_filter, base_fee_param, selected_country_param):
-    # Cache invalidation trigger: v2026.2 (Optimized)
-    report = GlobalPolicyReport(app_discount_pct=discount_val, app_fee=fee_val, base_fee=base_fee_param)
-    
-    all_results = []
+# Conteo de llamadas: suma de todas las filas o máximo por asistencia / expediente
+# (deduplicación precalculada en el fact store: cambiar de estrategia no recarga extractos)
+CALL_STRATEGY_OPTIONS = {
+    "Según política": None,
+    "Suma (todas las filas)": 'sum',
+    "Máx. por asistencia": 'max_asistencia',
+    "Máx. por expediente": 'max_expediente'
+}
+call_strategy_label = st.sidebar.selectbox(
+    "Conteo de Llamadas",
+    options=list(CALL_STRATEGY_OPTIONS),
+    index=0,
+    help="Factores de eficiencia calibrados sobre la suma de todas las filas."
+)
+call_strategy = CALL_STRATEGY_OPTIONS[call_strategy_label]
+
+# --- CAPA DE VOLUMEN (cacheada por país / año / cuenta) ---
+# Hosts con poca memoria: VOCCARE_STREAM_CHUNKSIZE=200000 lee los extractos por bloques
+# (memoria acotada por el tamaño de bloque) en vez de cargarlos completos.
+STREAM_CHUNKSIZE = int(os.environ.get('VOCCARE_STREAM_CHUNKSIZE', '0')) or None
+
+VOLUME_COLUMNS = ['Pais', 'Mes', 'SC Total', 'SC App', 'SC Voz', 'Adopcion (%)', 'Llamadas Validas',
+                  'Cancelado Posterior', 'Cancelado Momento']
+
+@st.cache_resource
+def get_result_store():
+    """Resultados persistidos entre sesiones (Paises/.cache/results.sqlite)."""
+    return ResultStore(default_path(input_dir))
+
+# Acotados: cada combinación de argumentos queda en memoria hasta salir de las últimas max_entries
+@st.cache_resource(max_entries=16)
+def load_volumes(year_filter, acc_filter, selected_country_param, call_strategy_param=None, data_sig=None):
+    """
+    Tabla mensual de volúmenes y errores por país ({país: mensaje}). No depende de descuento,
+    fee ni fee base. Compartida entre reruns sin copia: no modificar (price_table trabaja sobre
+    una copia). `data_sig` (DATA_SIGNATURE) solo forma parte de la clave del caché.
+    Sin llamadas a st.*: el caché no repetiría los mensajes en reruns servidos desde él.
+    """
+    # Factores de eficiencia / ratios no dependen de los parámetros de precio
+    report = GlobalPolicyReport()
+    account = None if acc_filter == "Todas" else acc_filter
     
     # Determinar qué países procesar
     countries_to_process = []
@@ -149,126 +180,68 @@ def run_simulation(discount_val, fee_val, year_filter, acc_filter, base_fee_para
     elif selected_country_param in country_map:
         countries_to_process = [(selected_country_param, country_map[selected_country_param])]
     
-    for c_name, f_path in countries_to_process:
-        try:
-            # 1. Cargar datos (Desde caché si ya se leyó)
-            df = load_country_data(c_name, f_path)
-            
-            if df.empty: continue
-            
-            # 2. Filtrar por Año
-            df_year = df[df['date_obj'].dt.year == year_filter].copy()
-            if df_year.empty: continue
-
-            # 3. Filtrar por Cuenta
-            if acc_filter != "Todas":
-                # Normalize column name check
-                acc_col = None
-                for c in df_year.columns:
-                    if c.lower().strip() == 'cuenta':
-                        acc_col = c
-                        break
-                if acc_col:
-                    df_year = df_year[df_year[acc_col].astype(str) == acc_filter]
-            
-            if df_year.empty: continue
-
-            app_types = ['APP', 'ANCLAJE APP SOA', 'ANCLAJE', 'ANCLAJE_APP', 'ANCLAJE_APP_SOA']
-            
-            for month, group in df_year.groupby('month'):
-                sc_df = group[group['estado_asistencia'] == 'CONCLUIDA']
-                total_sc = len(sc_df)
-                app_sc = sc_df[sc_df['tipo_asignacion'].astype(str).str.strip().isin(app_types)].shape[0]
-                voice_sc = total_sc - app_sc
-                
-                # NEW LOGIC: Valid Calls from CSV + Efficiency Factor
-                if 'cantidad_llamadas' in group.columns:
-                    raw_calls = pd.to_numeric(group['cantidad_llamadas'], errors='coerce').fillna(0).sum()
-                    eff_factor = report.get_efficiency_factor(c_name) # Use calibrated factor
-                    valid_calls = int(raw_calls * eff_factor)
-                else:
-                    lv_ratio = report.get_ratio(c_name)
-                    valid_calls = int(total_sc * lv_ratio) # Fallback
-
-                # Calculate Cancelled
-                cancelled_df = group[group['estado_asistencia'].astype(str).str.upper().str.contains('CANCEL')]
-                cp = 0
-                cm = 0
-                if not cancelled_df.empty:
-                    if 'usuario_que_asigna' in cancelled_df.columns:
-                         vals = cancelled_df['usuario_que_asigna'].astype(str).str.strip()
-                         is_assigned = ~vals.isin(['', 'nan', 'None']) & cancelled_df['usuario_que_asigna'].notna()
-                         cp = is_assigned.sum()
-                         cm = len(cancelled_df) - cp
-                    else:
-                         cm = len(cancelled_df)
-                
-                price_adj = report.get_price_adjust(c_name)
-
-                # 2024 Calculation
-                cost_sc_24 = report.calculate_tier_cost(total_sc, report.tiers_sc, price_adj)
-                cost_lv_24 = report.calculate_tier_cost(valid_calls, report.tiers_lv, price_adj)
-                bill_2024 = (report.base_fee * price_adj) + cost_sc_24 + cost_lv_24
-                
-                # 2026 Calculation (Dynamic)
-                base_sc_cost = report.calculate_tier_cost(total_sc, report.tiers_sc, price_adj)
-                discount_amount = 0
-                if total_sc > 0:
-                    app_share = (base_sc_cost * (app_sc / total_sc))
-                    discount_amount = app_share * (discount_val / 100.0)
-                
-                cost_sc_25 = base_sc_cost - discount_amount
-                cost_lv_25 = report.calculate_tier_cost(valid_calls, report.tiers_lv, price_adj)
-                
-                # Dynamic App Fee
-                ratio_fee = fee_val / 0.45
-                scaled_app_tiers = [(l, p * ratio_fee) for l, p in report.tiers_app]
-                cost_app_25 = report.calculate_tier_cost(app_sc, scaled_app_tiers, 1.0) 
-
-                bill_2025 = (report.base_fee * price_adj) + cost_sc_25 + cost_lv_25 + cost_app_25
-                
-                all_results.append({
-                    'Pais': c_name,
-                    'Mes': str(month),
-                    'SC Total': int(total_sc),
-                    'SC App': int(app_sc),
-                    'SC Voz': int(voice_sc),
-                    'Adopcion (%)': round((app_sc/total_sc*100), 1) if total_sc else 0,
-                    'Llamadas Validas': int(valid_calls),
-                    'Cancelado Posterior': int(cp),
-                    'Cancelado Momento': int(cm),
-                    
-                    # Detalles 2024
-                    '2024 SC': round(cost_sc_24, 2),
-                    '2024 LV': round(cost_lv_24, 2),
-                    'Factura 2024': round(bill_2024, 2),
-                    
-                    # Detalles 2026
-                    '2026 SC Base': round(base_sc_cost, 2),
-                    '2026 Desc.': round(discount_amount, 2),
-                    '2026 App Fee': round(cost_app_25, 2),
-                    '2026 LV': round(cost_lv_25, 2),
-                    'Factura 2026': round(bill_2025, 2),
-                    
-                    'Ahorro': round(bill_2024 - bill_2025, 2)
-                })
-                
-        except Exception as e:
-            print(f"Error processing {c_name}: {e}")
-            st.error(f"Error processing {c_name}: {e}") # Uncomment to see in UI
-            pass
-
-    if not all_results:
-        cols = ['Pais', 'Mes', 'SC Total', 'SC App', 'SC Voz', 'Adopcion (%)', 'Llamadas Validas', 
-                'Cancelado Posterior', 'Cancelado Momento', 
-                '2024 SC', '2024 LV', 'Factura 2024',
+    # Carga (store de resultados / caché Parquet) + filtro de cuenta/año + agregación mensual, en paralelo por país.
+    # Los resultados se unen en el orden de países, sin importar cuál termina primero.
+    results, errors = map_countries(
+        report.country_volumes,
+        [(c_name, (f_path, c_name, year_filter, account, False, STREAM_CHUNKSIZE, get_result_store(),
+                    call_strategy_param)) for c_name, f_path in countries_to_process]
+    )
+    for c_name, e in errors.items():
+        print(f"Error processing {c_name}: {e}")
+    errors = {c_name: str(e) for c_name, e in errors.items()}
+
+    all_volumes = [v for v in results.values() if not v.empty]
+    if not all_volumes:
+        return pd.DataFrame(columns=VOLUME_COLUMNS), errors
+    return pd.concat(all_volumes, ignore_index=True), errors
+
+@st.cache_resource(max_entries=8)
+def load_account_volumes(year_filter, selected_country_param, call_strategy_param=None, grouping=None,
+                         data_sig=None):
+    """
+    Cubo (país, mes, cuenta) de volúmenes: todas las cuentas en una sola pasada agrupada
+    (o por grupo de cuentas). Compartido entre reruns sin copia: no modificar.
+    `data_sig` (DATA_SIGNATURE) solo forma parte de la clave del caché.
+    """
+    report = GlobalPolicyReport()
+    if selected_country_param == "Todos (Global)":
+        countries_to_process = list(country_map.items())
+    else:
+        countries_to_process = [(c, f) for c, f in country_map.items() if c == selected_country_param]
+    results, errors = map_countries(
+        report.country_volumes,
+        [(c_name, (f_path, c_name, year_filter, None, False, STREAM_CHUNKSIZE, get_result_store(),
+                    call_strategy_param, True, grouping)) for c_name, f_path in countries_to_process]
+    )
+    for c_name, e in errors.items():
+        print(f"Error processing accounts of {c_name}: {e}")
+    all_volumes = [v for v in results.values() if not v.empty]
+    if not all_volumes:
+        return pd.DataFrame(columns=VOLUME_COLUMNS[:2] + ['cuenta'] + VOLUME_COLUMNS[2:])
+    return pd.concat(all_volumes, ignore_index=True)
+
+# --- CAPA DE PRECIOS (vectorizada, sin caché: solo re-precia la tabla mensual) ---
+def run_simulation(discount_val, fee_val, year_filter, acc_filter, base_fee_param, selected_country_param,
+                   call_strategy_param=None):
+    volumes, errors = load_volumes(year_filter, acc_filter, selected_country_param, call_strategy_param,
+                                   DATA_SIGNATURE)
+    # Fuera de la función cacheada: se muestran en cada rerun
+    for c_name, message in errors.items():
+        st.error(f"Error processing {c_name}: {message}")
+    
+    if volumes.empty:
+        cols = VOLUME_COLUMNS + ['2024 SC', '2024 LV', 'Factura 2024',
                 '2026 SC Base', '2026 Desc.', '2026 App Fee', '2026 LV', 'Factura 2026', 'Ahorro']
         return pd.DataFrame(columns=cols)
-            
-    return pd.DataFrame(all_results)
+    
+    report = GlobalPolicyReport(app_discount_pct=discount_val, app_fee=fee_val, base_fee=base_fee_param)
+    price_adj = volumes['Pais'].map(report.get_price_adjust).to_numpy(dtype=float)
+    return report.price_table(volumes, price_adj, label='2026')
 
 # Ejecutar simulación
-df = run_simulation(app_discount_pct, app_fee, selected_year, account_filter, base_fee_to_use, selected_country)
+df = run_simulation(app_discount_pct, app_fee, selected_year, account_filter, base_fee_to_use, selected_country,
+                    call_strategy)
 
 print(f"DEBUG: run_simulation finished. Fee={base_fee_to_use}, DF Shape={df.shape}")
 if df.empty:
@@ -316,127 +289,40 @@ else:
 if selected_months:
     df_view = df_view[df_view['Mes'].isin(selected_months)].copy()
 
-# --- INTEGRACIÓN FACTURACIÓN REAL (SOLO PR POR AHORA) ---
-if selected_country == "Puerto Rico":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_pr.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            # Merge
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
-elif selected_country == "Argentina":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_ar.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
-elif selected_country == "Dominicana":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_do.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
-elif selected_country == "Bolivia":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_bo.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
-elif selected_country == "Peru":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_pe.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
-elif selected_country == "Chile":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_cl.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
-elif selected_country == "Mexico":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_mx.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
-elif selected_country == "Ecuador":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_ec.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
-elif selected_country == "Costa Rica":
-    try:
-        real_bill_path = os.path.join(base_dir, "Facturacion", "facturacion_real_cr.csv")
-        if os.path.exists(real_bill_path):
-            df_real = pd.read_csv(real_bill_path)
-            df_real['Mes'] = df_real['Mes'].astype(str)
-            
-            df_view['Mes'] = df_view['Mes'].astype(str)
-            df_view = pd.merge(df_view, df_real, on='Mes', how='left')
-            df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
-    except Exception as e:
-        st.error(f"Error cargando facturación real: {e}")
+# --- INTEGRACIÓN FACTURACIÓN REAL (todos los países con facturacion_real_<cc>.csv) ---
+@st.cache_data
+def load_real_billing_table(files_signature):
+    """Tabla única (Pais, Mes, Facturacion Real). La firma (archivo, mtime) invalida el caché al editar un CSV."""
+    return load_real_billing(os.path.join(base_dir, "Facturacion"))
+
+try:
+    df_real = load_real_billing_table(DATA_SIGNATURE[-1])
+    # Solo si alguno de los países en vista tiene facturación real
+    if df_view['Pais'].isin(df_real['Pais']).any():
+        df_view['Mes'] = df_view['Mes'].astype(str)
+        df_view = pd.merge(df_view, df_real, on=['Pais', 'Mes'], how='left')
+        df_view['Facturacion Real'] = df_view['Facturacion Real'].fillna(0)
+except Exception as e:
+    st.error(f"Error cargando facturación real: {e}")
 
 # --- AJUSTE DE FEE EN FACTURACIÓN REAL ---
 if include_base_fee_option == "No" and 'Facturacion Real' in df_view.columns:
     # Asegurar que es numérico para evitar errores de resta
     df_view['Facturacion Real'] = pd.to_numeric(df_view['Facturacion Real'], errors='coerce').fillna(0)
     
-    # Restar el fee base (3150) de la facturación real para comparar "peras con peras"
-    df_view['Facturacion Real'] = df_view['Facturacion Real'].apply(lambda x: max(0, x - 3150) if x > 0 else 0)
+    # Restar el fee base (policy.base_fee) de la facturación real para comparar "peras con peras"
+    real = df_view['Facturacion Real'].to_numpy(dtype=float)
+    df_view['Facturacion Real'] = np.where(real > 0, np.maximum(0, real - policy.base_fee), 0)
+
+# --- EXPORTACIÓN (cacheada por estado de filtros y firma de datos) ---
+@st.cache_data(max_entries=12, show_spinner=False)
+def export_view(filter_state, fmt, _df):
+    """Vista exportada (bytes) por estado de filtros (incluye DATA_SIGNATURE) y formato; `_df` no se hashea."""
+    return export_frame(_df, fmt)
 
 # --- TABS PRINCIPALES ---
-tab_fin, tab_ops, tab_data = st.tabs(["💰 Financiero", "📈 Operativo", "📋 Datos Detallados"])
+tab_fin, tab_ops, tab_sweep, tab_acc, tab_data = st.tabs(["💰 Financiero", "📈 Operativo", "🎯 Sensibilidad",
+                                                           "🏢 Cuentas", "📋 Datos Detallados"])
 
 with tab_fin:
     # --- KPIs GLOBALES ---
@@ -553,6 +439,94 @@ with tab_ops:
     else:
         st.info("No hay datos operativos para mostrar con los filtros seleccionados.")
 
+with tab_sweep:
+    st.header("Sensibilidad: Descuento App x Fee Transaccional")
+
+    if not df_view.empty:
+        # Todas las combinaciones se precian en una sola evaluación vectorizada sobre la tabla mensual
+        sw1, sw2, sw3 = st.columns(3)
+        max_discount = sw1.slider("Descuento máximo (%)", min_value=5, max_value=100, value=50, step=5)
+        max_fee = sw2.number_input("Fee App máximo ($)", min_value=0.05, value=0.95, step=0.05)
+        fee_steps = sw3.slider("Pasos de fee", min_value=2, max_value=40, value=20)
+
+        discounts = np.arange(0, max_discount + 1, 1)
+        fees = np.round(np.linspace(0.0, max_fee, fee_steps), 4)
+        report_sweep = GlobalPolicyReport(app_discount_pct=app_discount_pct, app_fee=app_fee, base_fee=base_fee_to_use)
+        df_sweep = report_sweep.sweep(df_view, discounts, fees, [base_fee_to_use], total=True)
+
+        pivot = df_sweep.pivot(index='app_fee', columns='app_discount_pct', values='Ahorro')
+        fig_heat = px.imshow(
+            pivot.to_numpy(), x=pivot.columns, y=pivot.index, origin='lower', aspect='auto',
+            color_continuous_scale='RdBu', color_continuous_midpoint=0,
+            labels={'x': 'Descuento App (%)', 'y': 'Fee App ($)', 'color': 'Ahorro USD'},
+            title="Ahorro del Cliente (Factura 2024 - Factura 2026) en la Selección Actual"
+        )
+        st.plotly_chart(fig_heat, use_container_width=True)
+
+        # Curva de equilibrio (forma cerrada): el descuento neutro es lineal en el fee
+        comp = savings_components(report_sweep, df_view).sum()
+        neutral_per_fee = comp['app_cost_ref'] / REFERENCE_APP_FEE / comp['discount_per_pct'] if comp['discount_per_pct'] > 0 else np.nan
+        if np.isfinite(neutral_per_fee):
+            df_be = pd.DataFrame({'Fee App ($)': fees, 'Descuento Neutro (%)': fees * neutral_per_fee})
+            fig_be = px.line(df_be, x='Fee App ($)', y='Descuento Neutro (%)',
+                             title="Descuento que Iguala Factura 2026 con Factura 2024")
+            fig_be.add_scatter(x=[app_fee], y=[app_discount_pct], mode='markers', name='Parámetros actuales',
+                               marker=dict(size=12, symbol='x'))
+            st.plotly_chart(fig_be, use_container_width=True)
+        else:
+            st.info("Sin servicios App: no hay punto de equilibrio que calcular.")
+
+        # --- PUNTO DE EQUILIBRIO POR PAÍS / MES ---
+        st.subheader("⚖️ Punto de Equilibrio")
+        be1, be2 = st.columns(2)
+        target_savings = be1.number_input("Ahorro objetivo por grupo (USD)", value=0.0, step=500.0)
+        be_level = be2.radio("Nivel", ["País", "País y Mes"], horizontal=True)
+        df_be_table = solve_breakeven(report_sweep, df_view,
+                                      by=('Pais',) if be_level == "País" else ('Pais', 'Mes'),
+                                      target_savings=target_savings)
+        st.caption(f"Descuento neutro con fee de ${app_fee:.2f}; fee objetivo con descuento de {app_discount_pct}%.")
+        st.dataframe(df_be_table.style.format({'Descuento Neutro (%)': '{:.2f}', 'Fee Objetivo ($)': '{:.4f}',
+                                               'Ahorro Actual': '${:,.2f}'}, na_rep='—'))
+
+        with st.expander("Ver Cubo de Resultados"):
+            st.dataframe(df_sweep)
+    else:
+        st.info("No hay datos para la sensibilidad con los filtros seleccionados.")
+
+with tab_acc:
+    st.header("Ranking de Cuentas por Impacto en Factura")
+    
+    # Cada cuenta se precia por separado (como al elegirla en "Filtrar por Cuenta"), sin recalcular por cuenta
+    grouping_options = {"Ninguna (por cuenta)": None, **{label: name for name, (label, *_) in ACCOUNT_GROUPINGS.items()}}
+    ac1, ac2 = st.columns(2)
+    grouping_label = ac1.selectbox("Agrupar cuentas", options=list(grouping_options))
+    top_n = ac2.slider("Cuentas a mostrar", min_value=5, max_value=50, value=15, step=5)
+    
+    acc_volumes = load_account_volumes(selected_year, selected_country, call_strategy, grouping_options[grouping_label],
+                                       DATA_SIGNATURE)
+    acc_volumes = acc_volumes[acc_volumes['Mes'].isin(selected_months)]
+    if not acc_volumes.empty:
+        report_acc = GlobalPolicyReport(app_discount_pct=app_discount_pct, app_fee=app_fee, base_fee=base_fee_to_use)
+        ranking = report_acc.rank_accounts(acc_volumes)
+        
+        k1, k2, k3 = st.columns(3)
+        k1.metric("Cuentas", f"{len(ranking):,}")
+        k2.metric("Con ahorro", f"{int((ranking['Ahorro'] > 0).sum()):,}")
+        k3.metric("Con aumento", f"{int((ranking['Ahorro'] < 0).sum()):,}")
+        
+        # Mayor impacto absoluto (ahorro o aumento)
+        top = ranking.reindex(ranking['Ahorro'].abs().sort_values(ascending=False, kind='stable').index).head(top_n)
+        top = top.assign(Cuenta=top['cuenta'] + (" (" + top['Pais'] + ")" if selected_country == "Todos (Global)" else ""))
+        fig_rank = px.bar(top.iloc[::-1], x='Ahorro', y='Cuenta', orientation='h',
+                          color='Ahorro', color_continuous_scale='RdYlGn',
+                          hover_data=['Factura 2024', 'Factura 2026', 'Ahorro (%)', 'SC Total'],
+                          title=f"Top {len(top)} cuentas por impacto (Factura 2024 - Factura 2026)")
+        st.plotly_chart(fig_rank, use_container_width=True)
+        st.dataframe(ranking.style.format({'Factura 2024': '${:,.2f}', 'Factura 2026': '${:,.2f}',
+                                           'Ahorro': '${:,.2f}', 'Ahorro (%)': '{:.2f}%'}))
+    else:
+        st.info("No hay datos por cuenta con los filtros seleccionados.")
+
 with tab_data:
     # --- DATOS DETALLADOS ---
     st.subheader("📋 Tabla de Datos")
@@ -562,4 +536,25 @@ with tab_data:
                 df_view['Total Anual 2024'] = df_view.groupby('Pais')['Factura 2024'].transform('sum')
                 df_view['Total Anual 2026'] = df_view.groupby('Pais')['Factura 2026'].transform('sum')                
                 with st.expander("Ver Datos Detallados"):
-                    st.dataframe(df_view)
\ No newline at end of file
+                    st.dataframe(df_view)
+                
+                # --- EXPORTAR VISTA ACTUAL ---
+                # Serializa df_view ya calculado (sin recalcular); se genera al hacer clic, en otro hilo,
+                # y queda cacheado por estado de filtros: descargas repetidas son gratis.
+                filter_state = (selected_country, account_filter, selected_year, tuple(selected_months),
+                                app_discount_pct, app_fee, include_base_fee_option, call_strategy, DATA_SIGNATURE)
+                export_name = "global" if selected_country == "Todos (Global)" else selected_country.replace(" ", "_")
+                if account_filter != "Todas":
+                    export_name += "_" + "".join(ch if ch.isalnum() else "_" for ch in account_filter)
+                
+                st.markdown("**⬇️ Descargar vista actual**")
+                dl_cols = st.columns(len(EXPORT_FORMATS))
+                for dl_col, (fmt, (mime, ext)) in zip(dl_cols, EXPORT_FORMATS.items()):
+                    dl_col.download_button(
+                        f"{fmt.upper()}",
+                        data=lambda fmt=fmt, state=filter_state, view=df_view: export_view(state, fmt, view),
+                        file_name=f"voccare_{export_name}_{selected_year}.{ext}",
+                        mime=mime,
+                        on_click="ignore",
+                        key=f"download_{fmt}"
+                    )
\ No newline at end of file
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from aggregation import CALL_STRATEGIES, FACT_COLUMNS, MISSING_ACCOUNT, group_accounts, monthly_facts, stream_monthly_facts
+from data_cache import load_extract
+from schema_profile import month_index
+
+
+def extract_frame(categorical):
+    cuenta = ['MCS NORTE', None, 'ACME', 'MCS NORTE', None, 'ACME', None]
+    df = pd.DataFrame({
+        'month': np.array([month_index(m) for m in ['2025-01'] * 4 + ['2025-02'] * 3], dtype=np.int16),
+        'estado_asistencia': ['CONCLUIDA', 'CONCLUIDA', 'CANCELADA', 'CONCLUIDA', 'CONCLUIDA', 'CONCLUIDA', 'CANCELADA'],
+        'tipo_asignacion': ['APP', 'MANUAL', 'MANUAL', 'APP', 'APP', 'MANUAL', 'MANUAL'],
+        'usuario_que_asigna': ['u1', None, 'u2', 'u1', 'u3', None, None],
+        'cantidad_llamadas': np.array([3, 2, 1, 4, 5, 6, 7], dtype=np.int32),
+        'cuenta': cuenta,
+        'id_asistencia': np.array([1, 2, 2, 3, 4, 4, 5], dtype=np.int64),
+        'id_expediente': np.array([10, 10, 11, 12, 13, 13, 14], dtype=np.int64)
+    })
+    if categorical:
+        df['cuenta'] = df['cuenta'].astype('category')
+    return df
+
+
+@pytest.mark.parametrize('categorical', [True, False])
+def test_accounts_add_up_to_country_total_with_missing_cuenta(categorical):
+    df = extract_frame(categorical)
+    country = monthly_facts(df).set_index('Mes')[FACT_COLUMNS]
+    accounts = monthly_facts(df, by_account=True)
+
+    assert MISSING_ACCOUNT in set(accounts['cuenta'])
+    pd.testing.assert_frame_equal(accounts.groupby('Mes')[FACT_COLUMNS].sum(), country, check_dtype=False)
+
+    grouped = group_accounts(accounts, 'mcs')
+    assert set(grouped['cuenta']) == {'MCS', 'OTROS'}
+    pd.testing.assert_frame_equal(grouped.groupby('Mes')[FACT_COLUMNS].sum(), country, check_dtype=False)
+
+
+@pytest.mark.parametrize('categorical', [True, False])
+def test_missing_assigning_user_is_cancelled_at_the_moment(categorical):
+    df = extract_frame(categorical)
+    if categorical:
+        df['usuario_que_asigna'] = df['usuario_que_asigna'].astype('category')
+    facts = monthly_facts(df).set_index('Mes')
+
+    # 2025-01: cancelled by u2 (later); 2025-02: cancelled without assigning user (at the moment)
+    assert facts['Cancelado Posterior'].to_dict() == {'2025-01': 1, '2025-02': 0}
+    assert facts['Cancelado Momento'].to_dict() == {'2025-01': 0, '2025-02': 1}
+
+
+@pytest.mark.parametrize('strategy', list(CALL_STRATEGIES))
+@pytest.mark.parametrize('by_account', [False, True])
+def test_streaming_matches_full_load(tmp_path, strategy, by_account):
+    raw = extract_frame(categorical=False).drop(columns='month')
+    raw.insert(0, 'creacion_asistencia', ['2025-01-03 10:00:00'] * 4 + ['2025-02-07 09:30:00'] * 3)
+    # An id repeated across chunks in the same month / account (rows 4 and 6) and a row without id
+    raw.loc[6, 'id_asistencia'] = 4
+    raw['id_expediente'] = raw['id_expediente'].astype(object)
+    raw.loc[2, 'id_expediente'] = None
+    path = tmp_path / 'Client99_Test_20250301.csv'
+    raw.to_csv(path, sep=';', index=False)
+
+    full = monthly_facts(load_extract(str(path)), by_account=by_account)
+    streamed = stream_monthly_facts(str(path), by_account=by_account, chunksize=2, call_strategy=strategy)
+    pd.testing.assert_frame_equal(streamed, full[streamed.columns], check_dtype=False)
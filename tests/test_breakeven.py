@@ -0,0 +1,76 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from breakeven import solve
+from compare_policies import GlobalPolicyReport
+from pricing import price_bills
+
+
+@pytest.fixture(scope='module')
+def report():
+    return GlobalPolicyReport()
+
+
+def volume_table(rows):
+    return pd.DataFrame(rows, columns=['Pais', 'Mes', 'SC Total', 'SC App', 'Llamadas Validas'])
+
+
+VOLUMES = volume_table([
+    ('Mexico', '2025-01', 4200, 1300, 15000),
+    ('Mexico', '2025-02', 3900, 1450, 14200),
+    ('Argentina', '2025-01', 820, 160, 2600),
+    ('Argentina', '2025-02', 760, 240, 2400),
+])
+
+
+def bills(report, volumes, **kwargs):
+    price_adj = volumes['Pais'].map(report.get_price_adjust).to_numpy(dtype=float)
+    return price_bills(volumes['SC Total'].to_numpy(), volumes['SC App'].to_numpy(),
+                       volumes['Llamadas Validas'].to_numpy(), report.tiers_sc, report.tiers_lv, report.tiers_app,
+                       price_adj=price_adj, base_fee=report.base_fee, **kwargs)
+
+
+def test_neutral_discount_makes_both_bills_equal(report):
+    # solve() returns the groups sorted: align them back to the volume rows
+    neutral = VOLUMES.merge(solve(report, VOLUMES), on=['Pais', 'Mes'], how='left')['Descuento Neutro (%)']
+    assert neutral.notna().all()
+
+    p = bills(report, VOLUMES, app_discount_pct=neutral.to_numpy(), app_fee=report.app_fee)
+    np.testing.assert_allclose(p['bill_2026'], p['bill_2024'])
+
+
+def test_country_thresholds_hold_for_the_country_total(report):
+    solved = solve(report, VOLUMES, by=('Pais',), target_savings=100.0).set_index('Pais')
+    for country, volumes in VOLUMES.groupby('Pais'):
+        neutral = report.sweep(volumes, [solved.loc[country, 'Descuento Neutro (%)']], [report.app_fee], total=True)
+        assert neutral['Factura 2026'].iloc[0] == pytest.approx(neutral['Factura 2024'].iloc[0])
+
+        target = report.sweep(volumes, [report.app_discount_pct], [solved.loc[country, 'Fee Objetivo ($)']], total=True)
+        assert target['Ahorro'].iloc[0] == pytest.approx(100.0)
+
+
+def test_no_threshold_without_discountable_sc_cost_or_app_services(report):
+    volumes = volume_table([
+        # Under the 50 included services (as Honduras / Salvador): no SC cost to discount
+        ('Honduras', '2025-03', 8, 1, 0),
+        # No App services at all
+        ('Mexico', '2025-03', 900, 0, 3000),
+    ])
+    solved = solve(report, volumes)
+
+    assert solved['Descuento Neutro (%)'].isna().all()
+    assert solved['Fee Objetivo ($)'].iloc[0] == 0.0
+    assert np.isnan(solved['Fee Objetivo ($)'].iloc[1])
+
+
+def test_fee_target_out_of_reach_is_nan(report):
+    # With a zero App fee the savings are the whole discount: nothing reaches past it
+    discount = bills(report, VOLUMES, app_discount_pct=report.app_discount_pct, app_fee=report.app_fee)['discount'].sum()
+    assert solve(report, VOLUMES, by=(), target_savings=discount - 1.0)['Fee Objetivo ($)'].iloc[0] > 0
+    assert np.isnan(solve(report, VOLUMES, by=(), target_savings=discount + 1.0)['Fee Objetivo ($)'].iloc[0])
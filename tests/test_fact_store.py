@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import fact_store
+from aggregation import monthly_facts
+from data_cache import load_extract
+from fact_store import update_facts
+
+
+def write_drop(folder, date, rows):
+    raw = pd.DataFrame(rows, columns=['creacion_asistencia', 'estado_asistencia', 'tipo_asignacion',
+                                      'usuario_que_asigna', 'cantidad_llamadas', 'cuenta', 'id_asistencia'])
+    path = folder / f'Client99_Test_{date}.csv'
+    raw.to_csv(path, sep=';', index=False)
+    return str(path)
+
+
+ROWS = [
+    ('2025-01-03 10:00:00', 'CONCLUIDA', 'APP', 'u1', 3, 'ACME', 1),
+    ('2025-01-04 10:00:00', 'CANCELADA', 'MANUAL', 'u2', 1, 'ACME', 2),
+    ('2025-02-07 09:30:00', 'CONCLUIDA', 'MANUAL', None, 2, 'MCS NORTE', 3),
+    ('2025-03-02 08:00:00', 'CONCLUIDA', 'APP', 'u1', 4, None, 4),
+]
+
+
+def test_new_drop_only_reads_changed_and_open_months(tmp_path, monkeypatch):
+    update_facts(write_drop(tmp_path, '20250310', ROWS))
+
+    # February gets a late row; January is unchanged; March is the open month
+    rows = ROWS + [('2025-02-20 12:00:00', 'CANCELADA', 'APP', 'u3', 5, 'ACME', 5),
+                   ('2025-04-01 09:00:00', 'CONCLUIDA', 'APP', 'u1', 1, 'ACME', 6)]
+    path = write_drop(tmp_path, '20250315', rows)
+    load_extract(path)
+
+    loaded = []
+
+    def spy(*args, **kwargs):
+        loaded.append(sorted(kwargs.get('months') or []))
+        return load_extract(*args, **kwargs)
+    monkeypatch.setattr(fact_store, 'load_extract', spy)
+    state, months, accounts = update_facts(path)
+
+    assert state['refreshed'] == ['2025-02', '2025-03', '2025-04']
+    assert len(loaded) == 1 and len(loaded[0]) == 3
+    full = load_extract(path)
+    pd.testing.assert_frame_equal(months, monthly_facts(full), check_dtype=False)
+    expected = monthly_facts(full, by_account=True).sort_values(['Mes', 'cuenta'], kind='stable')
+    pd.testing.assert_frame_equal(accounts, expected.reset_index(drop=True), check_dtype=False)
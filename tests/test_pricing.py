@@ -0,0 +1,89 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from calculadora_nueva_politica import VoccareCalculator
+from policy import load_policy
+from pricing import TierSchedule, price_bills
+
+TIERS = load_policy().tiers
+# A table ending at a finite limit: volume above it is not billed
+FINITE_TIERS = [(100, 2.0), (250, 1.5), (400, 1.0)]
+
+
+def loop_cost(volume, tiers, adjustment_factor=1.0):
+    # The tier loop every calculator used before pricing.py
+    remaining = volume
+    total_cost = 0.0
+    current_tier_start = 0
+    for limit, price in tiers:
+        if remaining <= 0:
+            break
+        tier_capacity = limit - current_tier_start
+        count = min(remaining, tier_capacity)
+        total_cost += count * price * adjustment_factor
+        remaining -= count
+        current_tier_start = limit
+    return total_cost
+
+
+def boundary_volumes(tiers):
+    edges = [limit for limit, _ in tiers if np.isfinite(limit)]
+    volumes = {0, 1, 50, 2.5, edges[-1] * 10}
+    for edge in edges:
+        volumes.update({edge - 1, edge, edge + 1})
+    return sorted(v for v in volumes if v >= 0)
+
+
+@pytest.mark.parametrize('name', ['sc', 'lv', 'app', 'finite'])
+@pytest.mark.parametrize('adjustment', [1.0, 1.17])
+def test_cost_matches_tier_loop(name, adjustment):
+    tiers = FINITE_TIERS if name == 'finite' else TIERS[name]
+    schedule = TierSchedule(tiers)
+    volumes = boundary_volumes(tiers)
+
+    expected = [loop_cost(v, tiers, adjustment) for v in volumes]
+    assert [schedule.cost(v, adjustment) for v in volumes] == pytest.approx(expected)
+    np.testing.assert_allclose(schedule.cost(np.array(volumes), adjustment), expected)
+
+
+def test_cost_of_negative_volume_is_zero():
+    assert TierSchedule(TIERS['sc']).cost(-5) == 0.0
+
+
+def test_price_bills_matches_tier_loop():
+    sc_total = np.array([0, 50, 485, 1000, 1001, 20000], dtype=float)
+    sc_app = sc_total * 0.3
+    valid_calls = sc_total * 4
+    bills = price_bills(sc_total, sc_app, valid_calls, TIERS['sc'], TIERS['lv'], TIERS['app'],
+                        price_adj=1.1, app_discount_pct=10, app_fee=0.40)
+
+    for i, (total, app, calls) in enumerate(zip(sc_total, sc_app, valid_calls)):
+        base_sc = loop_cost(total, TIERS['sc'], 1.1)
+        cost_lv = loop_cost(calls, TIERS['lv'], 1.1)
+        discount = base_sc * (app / total if total else 0.0) * 0.10
+        cost_app = loop_cost(app, TIERS['app']) * 0.40 / 0.45
+        assert bills['bill_2024'][i] == pytest.approx(3150 * 1.1 + base_sc + cost_lv)
+        assert bills['bill_2026'][i] == pytest.approx(3150 * 1.1 + base_sc - discount + cost_lv + cost_app)
+
+
+@pytest.mark.parametrize('total, voice, expected', [
+    (30, 30, 0.0),
+    (485, 0, 0.0),
+    # Example 2 of the docstring: first 50 included, next 435 at 10.51
+    (485, 485, 435 * 10.51),
+    (1050, 1050, 450 * 10.51 + 500 * 9.28 + 50 * 8.04),
+    # Half of the 1000 chargeable slots are voice
+    (1050, 525, 450 * 10.51 + 50 * 9.28),
+])
+def test_service_cost_charges_slots_after_the_included_50(total, voice, expected):
+    calculator = VoccareCalculator('Mexico')
+    assert calculator.calculate_service_cost(total, voice) == pytest.approx(expected)
+
+    n = int(max(0, total - 50) * (voice / total))
+    schedule = TierSchedule(calculator.tiers_sc)
+    assert calculator.calculate_service_cost(total, voice) == pytest.approx(schedule.cost(50 + n) - schedule.cost(50))
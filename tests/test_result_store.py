@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'scripts'))
+
+from compare_policies import GlobalPolicyReport
+from policy import load_policy
+from result_store import ResultStore
+
+ROWS = [
+    ('2025-01-03 10:00:00', 'CONCLUIDA', 'APP', 'u1', 3, 'ACME', 1),
+    ('2025-01-04 10:00:00', 'CANCELADA', 'MANUAL', 'u2', 1, 'ACME', 2),
+    ('2025-02-07 09:30:00', 'CONCLUIDA', 'MANUAL', None, 2, 'ACME', 3),
+]
+
+
+def write_drop(folder, name, rows):
+    raw = pd.DataFrame(rows, columns=['creacion_asistencia', 'estado_asistencia', 'tipo_asignacion',
+                                      'usuario_que_asigna', 'cantidad_llamadas', 'cuenta', 'id_asistencia'])
+    path = folder / name
+    raw.to_csv(path, sep=';', index=False)
+    return str(path)
+
+
+@pytest.fixture
+def policy_file(tmp_path):
+    path = tmp_path / 'policy.json'
+    shutil.copy(os.path.join(ROOT, 'config', 'policy.json'), path)
+    return path
+
+
+def set_price_adjustment(policy_file, country, value):
+    definition = json.loads(policy_file.read_text(encoding='utf-8'))
+    definition['factor_sets']['price_adjustment']['countries'][country] = value
+    policy_file.write_text(json.dumps(definition), encoding='utf-8')
+    # Same size and mtime resolution must not hide the edit from load_policy
+    stamp = os.stat(policy_file).st_mtime_ns + 10 ** 9
+    os.utime(policy_file, ns=(stamp, stamp))
+
+
+def entries(store):
+    return int(store.stats()['entries'].sum())
+
+
+def test_policy_edits_and_new_drops_miss_the_store(tmp_path, policy_file):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    drop = write_drop(tmp_path, 'Client99_Test_20250301.csv', ROWS)
+
+    def run(path):
+        report = GlobalPolicyReport(policy=load_policy(str(policy_file)))
+        return report.process_country(path, 'Test', 2025, store=store)
+
+    first = run(drop)
+    assert not first.empty and entries(store) == 1
+    pd.testing.assert_frame_equal(run(drop), first)
+    assert entries(store) == 1
+
+    # Another country's factor is not part of this country's key
+    set_price_adjustment(policy_file, 'Mexico', 1.2)
+    run(drop)
+    assert entries(store) == 1
+
+    set_price_adjustment(policy_file, 'Test', 1.5)
+    adjusted = run(drop)
+    assert entries(store) == 2
+    assert (adjusted['Factura 2025'] > first['Factura 2025']).all()
+
+    # Same content under a new drop name hits; a drop with new rows misses
+    run(write_drop(tmp_path, 'Client99_Test_20250315.csv', ROWS))
+    assert entries(store) == 2
+    run(write_drop(tmp_path, 'Client99_Test_20250320.csv',
+                   ROWS + [('2025-02-10 11:00:00', 'CONCLUIDA', 'APP', 'u1', 4, 'ACME', 4)]))
+    assert entries(store) == 3